@@ -0,0 +1,38 @@
+"""
+Running independent blocking work concurrently from async views.
+
+Django's async ORM methods (aget, aaggregate, ...) hand every query to the
+request's one sync thread, so awaiting several of them with asyncio.gather
+still runs them one after another. parallel() gives each callable a worker
+thread, and with it a database connection, of its own (connections are
+per thread), so independent aggregates really do run at once: the
+database drivers release the GIL while a query executes.
+
+Each worker's queries count toward the request's Server-Timing and
+metrics, and its connection is closed or kept per CONN_MAX_AGE when it
+finishes, as at the end of a request. A worker's connection only sees
+committed data, which is all a read path needs.
+"""
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+
+from .instrumentation import recording
+
+
+def _worker(function):
+    def run():
+        try:
+            with recording():
+                return function()
+        finally:
+            close_old_connections()
+    return run
+
+
+async def parallel(*functions):
+    """Run the zero-argument callables `functions` at once; their results, in order."""
+    return await asyncio.gather(*(
+        sync_to_async(_worker(function), thread_sensitive=False)() for function in functions
+    ))
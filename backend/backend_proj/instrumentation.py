@@ -0,0 +1,295 @@
+"""
+Per-request performance instrumentation.
+
+RequestMetricsMiddleware times every request and breaks it down into
+
+* db         SQL statements run and the time spent in them
+* serialize  DRF serializers turning objects into data (SparseFieldsMixin
+             serializers; includes any lazy SQL they trigger)
+* render     the renderer encoding that data (TimedJSONRenderer)
+* view       from URL resolution to the view's response, which includes
+             the three above
+* total      the whole request as this middleware saw it
+
+and sends them back in a Server-Timing header, so the browser's network
+panel shows where a slow request went. A streamed response is timed up to
+the point it starts streaming. The middleware runs natively under both
+WSGI and ASGI, so it adds no thread hop in front of async views.
+
+Each request also lands in per-route histograms (route = URL name, e.g.
+variants-list, sales-analytics), exposed in Prometheus text format at
+/api/metrics. The cost is a few perf_counter() calls per request and per
+SQL statement, so it is meant to stay on in production; REQUEST_METRICS
+= False removes the middleware entirely. Like the local-memory cache the
+histograms live in each process: with several gunicorn workers every
+scrape reads whichever worker answered, so scrape each worker or run the
+figures through a shared collector if exact totals matter.
+"""
+import bisect
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.http import HttpResponse
+from rest_framework.renderers import JSONRenderer
+
+# Histogram bucket upper bounds, in seconds
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+UNMATCHED = 'unmatched'  # 404s, so unknown paths cannot blow up the label set
+
+_current = ContextVar('request_metrics', default=None)
+
+
+class RequestRecord:
+    __slots__ = ('queries', 'sql', 'spans', 'depth', 'view_started', 'lock')
+
+    def __init__(self):
+        self.queries = 0
+        self.sql = 0.0
+        self.spans = {}
+        self.depth = {}
+        self.view_started = None
+        self.lock = threading.Lock()  # async views may run queries on several threads at once
+
+    def __call__(self, execute, sql, params, many, context):
+        # Installed with connection.execute_wrapper()
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            with self.lock:
+                self.sql += elapsed
+                self.queries += 1
+
+
+@contextmanager
+def recording(using='default'):
+    """
+    Count the queries this thread runs toward the current request. The
+    middleware covers the request's own thread; use this in worker threads
+    (see backend_proj.concurrency).
+    """
+    record = _current.get()
+    if record is None:
+        yield
+        return
+    with connections[using].execute_wrapper(record):
+        yield
+
+
+@asynccontextmanager
+async def execute_wrapper(wrapper, using='default'):
+    """
+    connection.execute_wrapper() for async code. The ORM runs a request's
+    queries on its sync thread, whose connection is not the event loop's,
+    so `wrapper` goes on that thread's connection.
+    """
+    wrappers = await sync_to_async(lambda: connections[using].execute_wrappers)()
+    wrappers.append(wrapper)
+    try:
+        yield
+    finally:
+        wrappers.remove(wrapper)
+
+
+@contextmanager
+def timed(name):
+    """
+    Add the time spent inside the block to the current request's `name`
+    span. Nested blocks of the same name count once.
+    """
+    record = _current.get()
+    if record is None or record.depth.get(name):
+        yield
+        return
+    record.depth[name] = 1
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record.spans[name] = record.spans.get(name, 0.0) + time.perf_counter() - started
+        record.depth[name] = 0
+
+
+class Histogram:
+    __slots__ = ('counts', 'count', 'sum')
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)  # the last slot is +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(BUCKETS, value)] += 1
+        self.count += 1
+        self.sum += value
+
+
+class Registry:
+    """Per-route request figures for /api/metrics."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.durations = {}  # (route, method) -> Histogram
+            self.responses = {}  # (route, method, status) -> count
+            self.totals = {}     # (route, method) -> {'queries', 'db', 'serialize', 'render'}
+
+    def observe(self, route, method, status, seconds, record):
+        key = (route, method)
+        with self._lock:
+            histogram = self.durations.get(key)
+            if histogram is None:
+                histogram = self.durations[key] = Histogram()
+                self.totals[key] = {'queries': 0, 'db': 0.0, 'serialize': 0.0, 'render': 0.0}
+            histogram.observe(seconds)
+            status_key = (route, method, status)
+            self.responses[status_key] = self.responses.get(status_key, 0) + 1
+            totals = self.totals[key]
+            totals['queries'] += record.queries
+            totals['db'] += record.sql
+            totals['serialize'] += record.spans.get('serialize', 0.0)
+            totals['render'] += record.spans.get('render', 0.0)
+
+    def exposition(self):
+        """The figures in Prometheus text format."""
+        with self._lock:
+            durations = {key: (list(h.counts), h.count, h.sum) for key, h in self.durations.items()}
+            responses = dict(self.responses)
+            totals = {key: dict(value) for key, value in self.totals.items()}
+
+        lines = [
+            '# HELP http_request_duration_seconds Time to produce a response, by route.',
+            '# TYPE http_request_duration_seconds histogram',
+        ]
+        for (route, method), (counts, count, total) in sorted(durations.items()):
+            labels = f'route="{route}",method="{method}"'
+            cumulative = 0
+            for bound, bucket in zip(BUCKETS + ('+Inf',), counts):
+                cumulative += bucket
+                lines.append(f'http_request_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'http_request_duration_seconds_sum{{{labels}}} {total:.6f}')
+            lines.append(f'http_request_duration_seconds_count{{{labels}}} {count}')
+
+        lines += [
+            '# HELP http_responses_total Responses sent, by route and status code.',
+            '# TYPE http_responses_total counter',
+        ]
+        for (route, method, status), count in sorted(responses.items()):
+            lines.append(f'http_responses_total{{route="{route}",method="{method}",status="{status}"}} {count}')
+
+        for name, field, help_text in (
+            ('http_request_db_queries_total', 'queries', 'SQL statements run, by route.'),
+            ('http_request_db_seconds_total', 'db', 'Time spent in SQL, by route.'),
+            ('http_request_serialize_seconds_total', 'serialize', 'Time spent in DRF serializers, by route.'),
+            ('http_request_render_seconds_total', 'render', 'Time spent rendering response bodies, by route.'),
+        ):
+            lines += [f'# HELP {name} {help_text}', f'# TYPE {name} counter']
+            for (route, method), value in sorted(totals.items()):
+                value = value[field]
+                value = value if field == 'queries' else f'{value:.6f}'
+                lines.append(f'{name}{{route="{route}",method="{method}"}} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+
+def route_name(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return UNMATCHED
+    return match.view_name or UNMATCHED
+
+
+def server_timing(record, view, total):
+    """Server-Timing header value; durations in milliseconds."""
+    parts = [f'db;desc="{record.queries} queries";dur={record.sql * 1000:.2f}']
+    for name in ('serialize', 'render'):
+        if name in record.spans:
+            parts.append(f'{name};dur={record.spans[name] * 1000:.2f}')
+    if view is not None:
+        parts.append(f'view;dur={view * 1000:.2f}')
+    parts.append(f'total;dur={total * 1000:.2f}')
+    return ', '.join(parts)
+
+
+class RequestMetricsMiddleware:
+    """Goes first in MIDDLEWARE so `total` covers the rest of the stack."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'REQUEST_METRICS', True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+            # A sync process_view would cost a thread hop per request
+            self.process_view = self.aprocess_view
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        record = RequestRecord()
+        token = _current.set(record)
+        started = time.perf_counter()
+        try:
+            with connections['default'].execute_wrapper(record):
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, record, started)
+
+    async def __acall__(self, request):
+        record = RequestRecord()
+        token = _current.set(record)
+        started = time.perf_counter()
+        try:
+            async with execute_wrapper(record):
+                response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, record, started)
+
+    def finish(self, request, response, record, started):
+        finished = time.perf_counter()
+        total = finished - started
+        view = finished - record.view_started if record.view_started is not None else None
+        response['Server-Timing'] = server_timing(record, view, total)
+        registry.observe(route_name(request), request.method, response.status_code, total, record)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        record = _current.get()
+        if record is not None:
+            record.view_started = time.perf_counter()
+
+    async def aprocess_view(self, request, view_func, view_args, view_kwargs):
+        record = _current.get()
+        if record is not None:
+            record.view_started = time.perf_counter()
+
+
+class TimedJSONRenderer(JSONRenderer):
+    """JSONRenderer that reports its time as the `render` span."""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        with timed('render'):
+            return super().render(data, accepted_media_type, renderer_context)
+
+
+def metrics(request):
+    """Prometheus scrape endpoint."""
+    return HttpResponse(registry.exposition(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,20 @@
+from rest_framework.pagination import CursorPagination
+
+
+class CreatedAtCursorPagination(CursorPagination):
+    """
+    Keyset pagination for list endpoints.
+
+    Pages are addressed by an opaque cursor over the ordering column rather
+    than an OFFSET, so fetching page N costs the same as page 1 and rows
+    inserted while a client is paging do not shift or duplicate results.
+    Clients may ask for a smaller or larger page with ?page_size=.
+    """
+    ordering = ('-created_at', '-id')
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+
+
+class IdCursorPagination(CreatedAtCursorPagination):
+    """For tables whose created_at is nullable (rows predating the column)."""
+    ordering = '-id'
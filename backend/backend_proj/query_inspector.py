@@ -0,0 +1,178 @@
+"""
+N+1 and slow-query detection for development, staging and tests.
+
+Every SQL statement a request runs is fingerprinted: its text with the
+parameters left out, literals replaced by ? and IN lists of any length
+folded into one, so "SELECT ... WHERE sale_id = 1" and "... = 2" are the
+same query. At the end of the request the inspector reports
+
+* repeats: a fingerprint run QUERY_INSPECTOR_REPEATS or more times, the
+  signature of a per-row lookup (a missing select_related /
+  prefetch_related, a serializer field or admin column touching a
+  relation, a create() in a loop);
+* slow queries: any single statement over QUERY_INSPECTOR_SLOW_MS.
+
+Each finding names where the query came from: the serializer field being
+rendered when there is one ("SaleSerializer.items"), and the innermost
+frame of project code. Findings are logged as warnings on the
+"backend_proj.queries" logger; with QUERY_INSPECTOR_RAISE they raise
+QueryPatternError instead, so a test that exercises an endpoint fails as
+soon as the endpoint starts issuing per-row queries.
+
+QueryInspectorMiddleware does this for every request when
+QUERY_INSPECTOR_ENABLED is set (QUERY_INSPECTOR=1 in the environment; off
+by default). inspect() does the same around any block of code, e.g. a
+management command or a test.
+"""
+import logging
+import os
+import re
+import sys
+import time
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from .instrumentation import execute_wrapper
+
+logger = logging.getLogger('backend_proj.queries')
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Other execute_wrappers sit between the query and its caller
+_SKIP_FILES = {
+    os.path.abspath(__file__),
+    os.path.join(PROJECT_ROOT, 'backend_proj', 'instrumentation.py'),
+}
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'(?<![\w"])-?\d+(?:\.\d+)?\b')
+_IN_LIST = re.compile(r'\bIN\s*\((?:\s*(?:%s|\?)\s*,?)+\)', re.IGNORECASE)
+_SAVEPOINT_NAME = re.compile(r'"s\d+_x\d+"')
+_SPACE = re.compile(r'\s+')
+
+
+class QueryPatternError(AssertionError):
+    """Raised at the end of an inspected block with QUERY_INSPECTOR_RAISE on."""
+
+
+def fingerprint(sql):
+    """`sql` with literals and parameters as ?, and IN lists of any length folded into IN (...)."""
+    sql = _STRING.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    sql = _SAVEPOINT_NAME.sub('?', sql)
+    sql = _IN_LIST.sub('IN (...)', sql.replace('%s', '?'))
+    return _SPACE.sub(' ', sql).strip()
+
+
+def _setting(name, default):
+    return getattr(settings, f'QUERY_INSPECTOR_{name}', default)
+
+
+def origin():
+    """
+    Where the query currently executing came from: the serializer field
+    being rendered (if any) and the innermost frame in project code.
+    """
+    from rest_framework.fields import Field
+
+    field = None
+    location = None
+    frame = sys._getframe(1)
+    while frame is not None:
+        if field is None and frame.f_code.co_name in ('to_representation', 'get_attribute'):
+            owner = frame.f_locals.get('self')
+            # The innermost field being rendered, named after the serializer declaring it
+            if isinstance(owner, Field) and owner.field_name and owner.parent is not None:
+                field = f'{type(owner.parent).__name__}.{owner.field_name}'
+        if location is None:
+            filename = os.path.abspath(frame.f_code.co_filename)
+            if filename.startswith(PROJECT_ROOT) and filename not in _SKIP_FILES and 'site-packages' not in filename:
+                location = f'{os.path.relpath(filename, PROJECT_ROOT)}:{frame.f_lineno} in {frame.f_code.co_name}'
+        if field is not None and location is not None:
+            break
+        frame = frame.f_back
+    return ', '.join(part for part in (field, location) if part) or 'unknown'
+
+
+class QueryInspector:
+    """execute_wrapper that fingerprints and times each statement."""
+
+    def __init__(self, repeats=None, slow_ms=None):
+        self.repeats = repeats if repeats is not None else _setting('REPEATS', 5)
+        self.slow = (slow_ms if slow_ms is not None else _setting('SLOW_MS', 100)) / 1000
+        self.seen = {}  # fingerprint -> [count, origin of the second run]
+        self.slow_queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            key = fingerprint(sql)
+            entry = self.seen.get(key)
+            if entry is None:
+                self.seen[key] = [1, None]
+            else:
+                entry[0] += 1
+                if entry[1] is None:
+                    # The first repeat is what points at the loop
+                    entry[1] = origin()
+            if elapsed >= self.slow:
+                self.slow_queries.append((key, elapsed, origin()))
+
+    def findings(self):
+        found = [
+            f'{count} x {key} (from {where})'
+            for key, (count, where) in self.seen.items() if count >= self.repeats
+        ]
+        found += [f'slow query, {elapsed * 1000:.0f} ms: {key} (from {where})' for key, elapsed, where in self.slow_queries]
+        return found
+
+    def report(self, label, raise_errors=None):
+        found = self.findings()
+        if not found:
+            return
+        raise_errors = _setting('RAISE', False) if raise_errors is None else raise_errors
+        message = f'{label}: ' + '; '.join(found)
+        if raise_errors:
+            raise QueryPatternError(message)
+        for finding in found:
+            logger.warning('%s: %s', label, finding)
+
+
+@contextmanager
+def inspect(label='queries', using='default', repeats=None, slow_ms=None, raise_errors=None):
+    """Inspect every statement run on `using` inside the block; report when it exits cleanly."""
+    inspector = QueryInspector(repeats, slow_ms)
+    with connections[using].execute_wrapper(inspector):
+        yield inspector
+    inspector.report(label, raise_errors)
+
+
+class QueryInspectorMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not _setting('ENABLED', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with inspect(f'{request.method} {request.path}'):
+            return self.get_response(request)
+
+    async def __acall__(self, request):
+        inspector = QueryInspector()
+        async with execute_wrapper(inspector):
+            response = await self.get_response(request)
+        inspector.report(f'{request.method} {request.path}')
+        return response
@@ -0,0 +1,71 @@
+"""
+Query plans for the statements Django runs, and which tables they read in
+full.
+
+Used by the query-plan regression tests to catch a hot query that has
+fallen back to scanning a whole table (a dropped index, or a filter no
+index can serve). Only SELECT, UPDATE and DELETE statements have a plan
+worth checking; anything else is skipped.
+
+* SQLite: EXPLAIN QUERY PLAN. "SCAN <table>" without "USING ... INDEX"
+  walks the whole table.
+* PostgreSQL: EXPLAIN (FORMAT JSON) with enable_seqscan off, so the
+  planner uses an index whenever one can serve the query at all, however
+  small the table; a Seq Scan that is left means none can.
+"""
+import json
+import re
+
+from django.db import connection, transaction
+
+EXPLAINABLE = ('SELECT', 'UPDATE', 'DELETE', 'WITH')
+
+# "SCAN sales_sale", "SCAN TABLE sales_sale AS T1" (SQLite < 3.36)
+SQLITE_TABLE_SCAN = re.compile(r'^SCAN (?:TABLE )?(\w+)(?: AS \w+)?$')
+
+
+def explainable(sql):
+    return sql.lstrip().split(None, 1)[0].upper() in EXPLAINABLE
+
+
+def explain(sql):
+    """The plan for `sql` (a statement with its parameters already inlined) as text lines."""
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+            return [row[3] for row in cursor.fetchall()]
+        if connection.vendor == 'postgresql':
+            with transaction.atomic():
+                cursor.execute('SET LOCAL enable_seqscan = off')
+                cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}')
+                plan = cursor.fetchone()[0]
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            return _postgres_lines(plan[0]['Plan'])
+    raise NotImplementedError(f'No query plans for {connection.vendor}')
+
+
+def _postgres_lines(node, depth=0):
+    line = '  ' * depth + node['Node Type']
+    if 'Relation Name' in node:
+        line += f" on {node['Relation Name']}"
+    if 'Index Name' in node:
+        line += f" using {node['Index Name']}"
+    lines = [line]
+    for child in node.get('Plans', []):
+        lines.extend(_postgres_lines(child, depth + 1))
+    return lines
+
+
+def full_scans(plan):
+    """Tables a plan (from explain()) reads in full."""
+    tables = []
+    for line in plan:
+        line = line.strip()
+        if connection.vendor == 'sqlite':
+            match = SQLITE_TABLE_SCAN.match(line)
+            if match:
+                tables.append(match.group(1))
+        elif line.startswith('Seq Scan on '):
+            tables.append(line.split()[3])
+    return tables
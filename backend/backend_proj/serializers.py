@@ -0,0 +1,38 @@
+from rest_framework import serializers
+
+from .instrumentation import timed
+
+
+class SparseFieldsMixin:
+    """
+    Lets read requests project a subset of fields with ?fields=id,name.
+
+    Only the top-level serializer of a response is projected; nested
+    serializers and write requests always see the full field set.
+
+    Also reports the time spent serializing as the Server-Timing
+    `serialize` span (see backend_proj.instrumentation).
+    """
+
+    def to_representation(self, instance):
+        with timed('serialize'):
+            return super().to_representation(instance)
+
+    def get_fields(self):
+        fields = super().get_fields()
+        request = self.context.get('request')
+        if request is None or request.method not in ('GET', 'HEAD') or not self._is_root():
+            return fields
+
+        requested = request.query_params.get('fields')
+        if not requested:
+            return fields
+
+        wanted = {name.strip() for name in requested.split(',') if name.strip()}
+        return {name: field for name, field in fields.items() if name in wanted} or fields
+
+    def _is_root(self):
+        parent = self.parent
+        if isinstance(parent, serializers.ListSerializer):
+            parent = parent.parent
+        return parent is None
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/6.0/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -42,9 +43,12 @@ INSTALLED_APPS = [
     'corsheaders',
     'inventory',
     'sales',
+    'jobs',
 ]
 
 MIDDLEWARE = [
+    'backend_proj.instrumentation.RequestMetricsMiddleware',
+    'backend_proj.query_inspector.QueryInspectorMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -83,6 +87,14 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # Several tills write at once: WAL lets readers carry on during a
+            # checkout, and IMMEDIATE takes the write lock at BEGIN so two
+            # checkouts queue up instead of both reading the same stock.
+            'init_command': 'PRAGMA journal_mode=WAL;',
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
     }
 }
 
@@ -141,4 +153,79 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.AllowAny', # Set to AllowAny for initial dev/setup
     ],
+    'DEFAULT_PAGINATION_CLASS': 'backend_proj.pagination.CreatedAtCursorPagination',
+    'PAGE_SIZE': 50,
+    'DEFAULT_RENDERER_CLASSES': [
+        'backend_proj.instrumentation.TimedJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+}
+
+# Server-Timing header on every response and per-route histograms at
+# /api/metrics (backend_proj.instrumentation). Cheap enough to leave on.
+REQUEST_METRICS = True
+
+# N+1 and slow-query warnings per request (backend_proj.query_inspector).
+# Off unless QUERY_INSPECTOR=1 is in the environment: it fingerprints every
+# statement and walks the stack on repeats, which production should not pay
+# for. Set RAISE to turn findings into errors.
+QUERY_INSPECTOR_ENABLED = os.environ.get('QUERY_INSPECTOR', '') == '1'
+QUERY_INSPECTOR_REPEATS = 5  # same query this many times in one request
+QUERY_INSPECTOR_SLOW_MS = 100
+QUERY_INSPECTOR_RAISE = False
+
+# Django cache framework. Local memory is per process: with several gunicorn
+# workers point this (or ANALYTICS_CACHE) at a shared backend such as
+# django.core.cache.backends.db.DatabaseCache or Redis so they agree on the
+# analytics data version. Bulk changes (reset, import, rollup rebuild, purge)
+# reach every process through the database whatever the backend (jobs.generation).
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        # Room for a few years of cached GST report days besides everything else
+        'OPTIONS': {'MAX_ENTRIES': 5000},
+    }
 }
+
+# Cached /api/sales/analytics/ responses (sales.analytics)
+ANALYTICS_CACHE = 'default'
+ANALYTICS_CACHE_TTL = 300  # seconds; entries are also dropped when a sale/return commits
+
+# Per-day figures behind /api/reports/gst/ (sales.gst), kept in ANALYTICS_CACHE.
+# Only closed days are cached, and those no longer change.
+GST_REPORT_CACHE_TTL = 60 * 60 * 24 * 31  # seconds
+
+# In-process LRU cache behind /api/variants/by-barcode/<code>/
+VARIANT_CACHE_SIZE = 10000
+VARIANT_CACHE_TTL = 30  # seconds
+
+# Invoice / return numbering (sales.sequences)
+STORE_CODE = ''  # Prefix for multi-store setups, e.g. 'S1' -> S1INV-2627-00042
+INVOICE_NUMBER_BLOCK_SIZE = 1  # 1 = gap-free; N > 1 = each worker reserves N numbers at a time
+
+# POST /api/sales/batch/ (sales.ingest)
+SALE_BATCH_MAX_SIZE = 500
+SALE_BATCH_CHUNK_SIZE = 50  # sales per transaction
+
+# Delta catalog sync (/api/catalog/sync/, see inventory/sync.py)
+SYNC_TOKEN_OVERLAP = 5  # seconds re-sent on the next sync to cover late commits
+SYNC_TOMBSTONE_RETENTION_DAYS = 30  # older tokens get a full sync
+
+# Low-stock list (/api/inventory/low-stock/, inventory.reorder). A variant is
+# low when its stock would last LOW_STOCK_COVER_DAYS or less at its recent
+# sales rate, or is at or below LOW_STOCK_THRESHOLD units whatever the rate.
+LOW_STOCK_THRESHOLD = 5
+LOW_STOCK_COVER_DAYS = 7
+REORDER_TARGET_DAYS = 30  # suggested orders bring stock up to this many days of sales
+
+# Bulk deletes (sales.purge): the data reset and `manage.py purge_sales`
+PURGE_BATCH_SIZE = 500  # sales per transaction when purging
+# GST records must be kept for 72 months after the annual return's due date
+SALES_RETENTION_DAYS = 8 * 365
+
+# Background jobs (jobs.queue), run by `manage.py run_worker`
+JOB_WORKER_PROCESSES = 2  # jobs run at once, each in its own process
+JOB_POLL_INTERVAL = 1.0  # seconds between looks at an empty queue
+# How long a process trusts the generations of cached data it last read
+# (jobs.generation) before reading them again: one indexed query at most this often
+DATA_GENERATION_RECHECK = 1.0  # seconds
@@ -2,20 +2,37 @@ from django.contrib import admin
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from rest_framework.routers import DefaultRouter
-from inventory.views import CategoryViewSet, ProductViewSet, ProductVariantViewSet, reset_database
-from sales.views import SaleViewSet, ReturnViewSet
+from inventory.views import CategoryViewSet, ProductViewSet, ProductVariantViewSet, reset_database, catalog_sync, low_stock, \
+    catalog_sync_async, variant_by_barcode_async
+from sales.views import SaleViewSet, ReturnViewSet, export_sales, export_returns, gst_report, rebuild_rollups, \
+    analytics_async
+from jobs.views import JobViewSet
 from rest_framework.authtoken.views import obtain_auth_token
+from backend_proj.instrumentation import metrics
 
+# Basenames match the URL prefixes, so URL names (and metrics routes) read variants-list, sales-analytics...
 router = DefaultRouter()
-router.register(r'categories', CategoryViewSet)
-router.register(r'products', ProductViewSet)
-router.register(r'variants', ProductVariantViewSet)
-router.register(r'sales', SaleViewSet)
-router.register(r'returns', ReturnViewSet)
+router.register(r'categories', CategoryViewSet, basename='categories')
+router.register(r'products', ProductViewSet, basename='products')
+router.register(r'variants', ProductVariantViewSet, basename='variants')
+router.register(r'sales', SaleViewSet, basename='sales')
+router.register(r'returns', ReturnViewSet, basename='returns')
+router.register(r'jobs', JobViewSet, basename='jobs')
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include(router.urls)),
-    path('api/reset-database/', reset_database),
-    path('api-token-auth/', obtain_auth_token),
+    path('api/reset-database/', reset_database, name='reset-database'),
+    path('api/catalog/sync/', catalog_sync, name='catalog-sync'),
+    path('api/inventory/low-stock/', low_stock, name='inventory-low-stock'),
+    path('api/exports/sales.csv', export_sales, name='exports-sales'),
+    path('api/exports/returns.csv', export_returns, name='exports-returns'),
+    path('api/reports/gst/', gst_report, name='reports-gst'),
+    path('api/reports/rollups/rebuild/', rebuild_rollups, name='reports-rollups-rebuild'),
+    path('api/metrics', metrics, name='metrics'),
+    # Async (ASGI) read paths: same parameters and payloads as their sync counterparts
+    path('api/async/sales/analytics/', analytics_async, name='async-sales-analytics'),
+    path('api/async/catalog/sync/', catalog_sync_async, name='async-catalog-sync'),
+    path('api/async/variants/by-barcode/<str:code>/', variant_by_barcode_async, name='async-variants-by-barcode'),
+    path('api-token-auth/', obtain_auth_token, name='api-token-auth'),
 ]
@@ -0,0 +1,120 @@
+"""
+Benchmark: 12-month analytics series, per-month raw aggregates vs one
+grouped rollup query per table.
+
+Seeds a throwaway test database with a year of sales and prints query
+count and median latency for both approaches:
+
+    cd backend && python -m benchmarks.analytics_series [--sales-per-day 40]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend_proj.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.db import connection  # noqa: E402
+from django.db.models import Count, Sum  # noqa: E402
+from django.test.utils import CaptureQueriesContext  # noqa: E402
+from django.utils import timezone  # noqa: E402
+
+from inventory.models import Category, Product, ProductVariant  # noqa: E402
+from sales import rollups  # noqa: E402
+from sales.analytics import series, trailing_months  # noqa: E402
+from sales.models import Return, Sale, SaleItem  # noqa: E402
+
+
+def seed(sales_per_day):
+    category = Category.objects.create(name='Sarees')
+    product = Product.objects.create(category=category, name='Pure Silk Saree')
+    variants = ProductVariant.objects.bulk_create([
+        ProductVariant(product=product, size='Free Size', color=f'Colour {i}', barcode=f'BENCH{i:04d}',
+                       price_retail=Decimal('1500.00'), gst_rate=Decimal('5.00'), stock_quantity=10 ** 6)
+        for i in range(50)
+    ])
+
+    # created_at is auto_now_add; switch that off so history can be back-dated
+    created_at = Sale._meta.get_field('created_at')
+    created_at.auto_now_add = False
+    try:
+        now = timezone.now()
+        sales = [
+            Sale(invoice_number=f'BENCH-{day}-{n}', payment_mode=random.choice(['CASH', 'CARD', 'UPI']),
+                 total_amount=Decimal('3150.00'), gst_total=Decimal('150.00'),
+                 created_at=now - timedelta(days=day, minutes=n))
+            for day in range(365) for n in range(sales_per_day)
+        ]
+        Sale.objects.bulk_create(sales, batch_size=2000)
+    finally:
+        created_at.auto_now_add = True
+
+    SaleItem.objects.bulk_create([
+        SaleItem(sale=sale, variant=random.choice(variants), quantity=1,
+                 unit_price=Decimal('1500.00'), total_price=Decimal('1500.00'))
+        for sale in Sale.objects.only('id') for _ in range(2)
+    ], batch_size=2000)
+    rollups.rebuild()
+    return len(sales)
+
+
+def legacy_monthly():
+    """The pre-rollup loop: two raw aggregates per calendar month."""
+    data = []
+    month_start = timezone.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    for _ in range(12):
+        next_start = (month_start + timedelta(days=32)).replace(day=1)
+        month_sales = Sale.objects.filter(created_at__gte=month_start, created_at__lt=next_start) \
+            .aggregate(revenue=Sum('total_amount'), count=Count('id'))
+        month_returns = Return.objects.filter(created_at__gte=month_start, created_at__lt=next_start) \
+            .aggregate(refunds=Sum('refund_amount'))
+        data.append((month_start, month_sales, month_returns))
+        month_start = (month_start - timedelta(days=1)).replace(day=1)
+    return data
+
+
+def grouped_monthly():
+    return series(*trailing_months(12), granularity='month')
+
+
+def measure(fn, repeat):
+    with CaptureQueriesContext(connection) as ctx:
+        fn()
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - started) * 1000)
+    return len(ctx.captured_queries), statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--sales-per-day', type=int, default=40)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0)
+    try:
+        count = seed(args.sales_per_day)
+        print(f'Seeded {count} sales over 365 days')
+        print(f"{'approach':<28}{'queries':>8}{'median ms':>12}")
+        for name, fn in (('per-month raw aggregates', legacy_monthly), ('grouped rollup series', grouped_monthly)):
+            queries, median_ms = measure(fn, args.repeat)
+            print(f'{name:<28}{queries:>8}{median_ms:>12.2f}')
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+if __name__ == '__main__':
+    main()
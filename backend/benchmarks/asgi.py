@@ -0,0 +1,193 @@
+"""
+Benchmark: the read-heavy endpoints (analytics, catalog sync, barcode
+lookup) as sync views under WSGI against their async variants under ASGI.
+
+By default a throwaway test database is seeded with sales.seeding and both
+versions are called in-process, one request at a time, with the caches
+emptied before each call so every request does its database work: this
+shows what running the analytics parts concurrently saves per request.
+
+With --wsgi and --asgi the same read mix is sent over HTTP to two running
+servers on the same database (filled by `manage.py seed_scale`), with
+--concurrency requests in flight, and throughput is compared. The sync
+paths go to the WSGI server and the /api/async/ paths to the ASGI one;
+analytics ranges are drawn at random (the same draws for both) so most
+requests miss the per-process cache:
+
+    cd backend && python -m benchmarks.asgi --scale 100k
+    cd backend && gunicorn backend_proj.wsgi:application -w 4 -b 127.0.0.1:8000 &
+    cd backend && gunicorn backend_proj.asgi:application -w 4 -k uvicorn_worker.UvicornWorker -b 127.0.0.1:8001 &
+    cd backend && python -m benchmarks.asgi --wsgi http://127.0.0.1:8000 --asgi http://127.0.0.1:8001 --concurrency 16
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone as dt_timezone
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend_proj.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.core.cache import cache  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.test import AsyncClient, Client  # noqa: E402
+
+from benchmarks.load import ClientTransport, HttpTransport, git_commit, percentile, print_report, summarise  # noqa: E402
+from inventory.cache import variant_cache  # noqa: E402
+from sales import seeding  # noqa: E402
+
+# Relative frequency of each operation in the HTTP mix
+MIX = {
+    'analytics': 3,
+    'catalog_sync': 1,
+    'barcode_scan': 6,
+}
+
+
+def paths(operation, rng, barcodes):
+    """(sync path, async path) for one request."""
+    if operation == 'analytics':
+        query = f'?days={rng.randint(1, 365)}'
+        return '/api/sales/analytics/' + query, '/api/async/sales/analytics/' + query
+    if operation == 'catalog_sync':
+        return '/api/catalog/sync/', '/api/async/catalog/sync/'
+    code = rng.choice(barcodes)
+    return f'/api/variants/by-barcode/{code}/', f'/api/async/variants/by-barcode/{code}/'
+
+
+def in_process(requests, rng, barcodes):
+    """Median / p95 ms per operation, sync view vs async view, cold caches."""
+    sync_client, async_client = Client(), AsyncClient()
+
+    def cold():
+        cache.clear()
+        variant_cache.clear()
+
+    def time_sync(path):
+        cold()
+        started = time.perf_counter()
+        response = sync_client.get(path)
+        assert response.status_code == 200, (path, response.status_code)
+        return (time.perf_counter() - started) * 1000
+
+    async def time_async(path):
+        cold()
+        started = time.perf_counter()
+        response = await async_client.get(path)
+        assert response.status_code == 200, (path, response.status_code)
+        return (time.perf_counter() - started) * 1000
+
+    async def run_async(batch):
+        return [await time_async(path) for path in batch]
+
+    results = {}
+    for operation in MIX:
+        batch = [paths(operation, rng, barcodes) for _ in range(requests)]
+        sync_ms = [time_sync(sync_path) for sync_path, _ in batch]
+        async_ms = asyncio.run(run_async([async_path for _, async_path in batch]))
+        results[operation] = {
+            mode: {f'p{pct}_ms': round(percentile(samples, pct), 2) for pct in (50, 95)}
+            for mode, samples in (('wsgi', sync_ms), ('asgi', async_ms))
+        }
+    return results
+
+
+def print_in_process(results):
+    print(f"{'operation':<16}{'sync p50':>10}{'async p50':>11}{'sync p95':>10}{'async p95':>11}")
+    for operation, modes in results.items():
+        print(f"{operation:<16}{modes['wsgi']['p50_ms']:>10.2f}{modes['asgi']['p50_ms']:>11.2f}"
+              f"{modes['wsgi']['p95_ms']:>10.2f}{modes['asgi']['p95_ms']:>11.2f}")
+
+
+def over_http(base_url, use_async, requests, concurrency, seed, barcodes):
+    """summarise() of `requests` mixed reads against `base_url`."""
+    rng = random.Random(seed)
+    transport = HttpTransport(base_url)
+    plan = []
+    for _ in range(requests):
+        operation = rng.choices(list(MIX), weights=list(MIX.values()))[0]
+        plan.append((operation, paths(operation, rng, barcodes)[1 if use_async else 0]))
+
+    def one(item):
+        operation, path = item
+        started = time.perf_counter()
+        status, _, _ = transport.request('GET', path)
+        return operation, (time.perf_counter() - started) * 1000, status, None
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        samples = list(pool.map(one, plan))
+    return summarise(samples, time.perf_counter() - started)
+
+
+def sample_barcodes(transport):
+    status, content, _ = transport.request('GET', '/api/variants/?page_size=500')
+    if status != 200:
+        raise SystemExit(f'GET /api/variants/ returned {status}')
+    barcodes = [row['barcode'] for row in json.loads(content)['results']]
+    if not barcodes:
+        raise SystemExit('No variants to work with: seed the database first (manage.py seed_scale).')
+    return barcodes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--scale', default='10000', help=f"Sales to seed: {', '.join(seeding.SCALES)} or a number")
+    parser.add_argument('--variants', type=int, default=5000, help='Variants to seed')
+    parser.add_argument('--requests', type=int, default=None,
+                        help='Requests per operation in-process (default 50), in total over HTTP (default 2000)')
+    parser.add_argument('--wsgi', help='Base URL of the WSGI server')
+    parser.add_argument('--asgi', help='Base URL of the ASGI server')
+    parser.add_argument('--concurrency', type=int, default=8, help='Parallel requests (over HTTP)')
+    parser.add_argument('--seed', type=int, default=1, help='Random seed for the data and the request mix')
+    parser.add_argument('--output', help='Write the results as JSON to this file')
+    args = parser.parse_args()
+    if bool(args.wsgi) != bool(args.asgi):
+        parser.error('--wsgi and --asgi go together')
+
+    result = {
+        'commit': git_commit(),
+        'started_at': datetime.now(dt_timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'django': django.get_version(),
+    }
+    if args.wsgi:
+        requests = args.requests or 2000
+        barcodes = sample_barcodes(HttpTransport(args.wsgi))
+        result.update(mode='http', requests=requests, concurrency=args.concurrency)
+        for name, url, use_async in (('wsgi', args.wsgi, False), ('asgi', args.asgi, True)):
+            print(f'{name.upper()} {url}')
+            result[name] = over_http(url, use_async, requests, args.concurrency, args.seed, barcodes)
+            print_report(result[name])
+        print(f"throughput {result['wsgi']['throughput_rps']} (WSGI) -> {result['asgi']['throughput_rps']} (ASGI) requests/s")
+    else:
+        requests = args.requests or 50
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0)
+        try:
+            seeded = seeding.seed(seeding.parse_scale(args.scale), variants=args.variants,
+                                  random_seed=args.seed, log=print)
+            barcodes = sample_barcodes(ClientTransport())
+            result.update(mode='client', database=connection.vendor, requests=requests, seeded=seeded)
+            result['operations'] = in_process(requests, random.Random(args.seed), barcodes)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+        print_in_process(result['operations'])
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2)
+        print(f'Results written to {args.output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+"""
+Benchmark: search-as-you-type, icontains across the product join (what
+?search= does) vs the catalog search index (inventory.search).
+
+Seeds a throwaway test database with a clothing catalog and prints the
+median latency per query for both:
+
+    cd backend && python -m benchmarks.catalog_search [--variants 200000]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from decimal import Decimal
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend_proj.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.db import connection  # noqa: E402
+from django.db.models import Q  # noqa: E402
+
+from inventory import search  # noqa: E402
+from inventory.models import Category, Product, ProductVariant  # noqa: E402
+
+CATEGORIES = ['Ethnic Wear', 'Western Wear', 'Menswear', 'Kidswear', 'Winter Wear']
+STYLES = ['Anarkali', 'Straight', 'A-Line', 'Printed', 'Embroidered', 'Chikankari', 'Slim Fit', 'Regular Fit']
+GARMENTS = ['Kurti', 'Kurta', 'Saree', 'Lehenga', 'Shirt', 'Jeans', 'Dupatta', 'Jacket', 'Palazzo', 'Sherwani']
+BRANDS = ['Biba', 'Fabindia', 'W', 'Manyavar', 'Levis', 'Raymond', 'Aurelia', 'Global Desi']
+SIZES = ['XS', 'S', 'M', 'L', 'XL', 'XXL', '28', '30', '32', '34', '36']
+COLORS = ['Red', 'Maroon', 'Navy Blue', 'Black', 'White', 'Mustard', 'Peach', 'Olive Green', 'Pink', 'Grey']
+
+QUERIES = ['ku', 'kurt', 'anarkali kurti', 'biba red', 'navy blue xl', 'kurthi', 'sherwni', 'SKU0123']
+
+
+def seed(variant_count):
+    rng = random.Random(42)
+    categories = [Category.objects.create(name=name) for name in CATEGORIES]
+    products = Product.objects.bulk_create([
+        Product(category=rng.choice(categories), name=f'{rng.choice(STYLES)} {rng.choice(GARMENTS)}',
+                brand=rng.choice(BRANDS))
+        for n in range(variant_count // 20 + 1)
+    ], batch_size=2000)
+    ProductVariant.objects.bulk_create([
+        ProductVariant(product=products[n // 20], size=SIZES[n % len(SIZES)],
+                       color=COLORS[n // len(SIZES) % len(COLORS)], barcode=f'SKU{n:07d}',
+                       price_retail=Decimal('999.00'), gst_rate=Decimal('5.00'), stock_quantity=10)
+        for n in range(variant_count)
+    ], batch_size=5000)
+    # bulk_create skips the signals that keep the index current
+    return search.rebuild()
+
+
+def icontains(query):
+    matches = Q()
+    for word in query.split():
+        matches &= Q(barcode__icontains=word) | Q(product__name__icontains=word)
+    return list(ProductVariant.objects.filter(matches).values_list('id', flat=True)[:20])
+
+
+def indexed(query):
+    return search.search(query, limit=20)
+
+
+def measure(fn, query, repeat):
+    hits = len(fn(query))
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn(query)
+        timings.append((time.perf_counter() - started) * 1000)
+    return hits, statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--variants', type=int, default=200000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0)
+    try:
+        started = time.perf_counter()
+        rows = seed(args.variants)
+        print(f'Seeded {args.variants} variants, {rows} index rows in {time.perf_counter() - started:.1f}s')
+        print(f"{'query':<18}{'icontains hits':>16}{'ms':>9}{'index hits':>12}{'ms':>9}")
+        for query in QUERIES:
+            old_hits, old_ms = measure(icontains, query, args.repeat)
+            new_hits, new_ms = measure(indexed, query, args.repeat)
+            print(f'{query:<18}{old_hits:>16}{old_ms:>9.2f}{new_hits:>12}{new_ms:>9.2f}')
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+if __name__ == '__main__':
+    main()
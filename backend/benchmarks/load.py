@@ -0,0 +1,321 @@
+"""
+Benchmark: end-to-end load through the real URLconf with a till-like mix
+of barcode scans, checkouts, returns, list views and analytics.
+
+By default a throwaway test database is seeded with sales.seeding and
+requests go through Django's test client in-process, so queries per
+request are counted too. With --url the same mix is sent over HTTP to a
+running server (e.g. gunicorn against a database filled by
+`manage.py seed_scale`); query counts are then not available.
+
+Prints p50/p95/p99 latency, throughput and queries per request for each
+operation and can write them as JSON; --compare diffs two such files,
+e.g. from two commits:
+
+    cd backend && python -m benchmarks.load --scale 100k --requests 5000 --output after.json
+    cd backend && python -m benchmarks.load --url http://127.0.0.1:8000 --concurrency 8
+    cd backend && python -m benchmarks.load --compare before.json after.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from urllib.parse import urlencode
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone as dt_timezone
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend_proj.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.db import connection  # noqa: E402
+from django.test import Client  # noqa: E402
+from django.test.utils import CaptureQueriesContext  # noqa: E402
+
+from sales import seeding  # noqa: E402
+
+# Relative frequency of each operation in the mix
+MIX = {
+    'barcode_scan': 40,
+    'checkout': 15,
+    'sale_return': 3,
+    'sales_list': 12,
+    'returns_list': 5,
+    'variants_list': 10,
+    'sale_lookup': 7,
+    'analytics': 5,
+    'gst_report': 3,
+    'low_stock': 2,
+}
+
+PERCENTILES = (50, 95, 99)
+
+
+class ClientTransport:
+    """In-process requests through the test client, counting queries."""
+
+    def __init__(self):
+        self.client = Client()
+
+    def request(self, method, path, body=None):
+        with CaptureQueriesContext(connection) as ctx:
+            if method == 'GET':
+                response = self.client.get(path)
+            else:
+                response = self.client.post(path, json.dumps(body), content_type='application/json')
+            content = b''.join(response.streaming_content) if response.streaming else response.content
+        return response.status_code, content, len(ctx.captured_queries)
+
+
+class HttpTransport:
+    """Requests over HTTP to a running server."""
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+
+    def request(self, method, path, body=None):
+        data = json.dumps(body).encode() if body is not None else None
+        request = urllib.request.Request(self.base_url + path, data=data, method=method,
+                                         headers={'Content-Type': 'application/json'})
+        try:
+            with urllib.request.urlopen(request, timeout=60) as response:
+                return response.status, response.read(), None
+        except urllib.error.HTTPError as exc:
+            return exc.code, exc.read(), None
+
+
+class Workload:
+    """
+    Picks operations from MIX and builds their requests from ids sampled up
+    front. next() and checked_out() are called under `lock`.
+    """
+
+    def __init__(self, transport, rng):
+        self.transport = transport
+        self.rng = rng
+        self.lock = threading.Lock()
+        self.variants = self._sample('/api/variants/?page_size=500', ('id', 'barcode'))
+        sales = self._sample('/api/sales/?page_size=200', ('invoice_number', 'customer_phone'))
+        self.invoices = [(sale['invoice_number'], sale['customer_phone']) for sale in sales]
+        # Lines from checkouts made during the run, to return later
+        self.returnable = []
+        if not self.variants:
+            raise SystemExit('No variants to work with: seed the database first (manage.py seed_scale).')
+
+    def _sample(self, path, fields):
+        status, content, _ = self.transport.request('GET', path)
+        if status != 200:
+            raise SystemExit(f'GET {path} returned {status}')
+        payload = json.loads(content)
+        rows = payload['results'] if isinstance(payload, dict) else payload
+        return [{field: row.get(field) for field in fields} for row in rows]
+
+    def next(self):
+        operation = self.rng.choices(list(MIX), weights=list(MIX.values()))[0]
+        if operation == 'sale_return' and not self.returnable:
+            operation = 'checkout'
+        if operation == 'sale_lookup' and not self.invoices:
+            operation = 'sales_list'
+        return operation, getattr(self, operation)()
+
+    def barcode_scan(self):
+        return 'GET', f"/api/variants/by-barcode/{self.rng.choice(self.variants)['barcode']}/", None
+
+    def checkout(self):
+        lines = self.rng.sample(self.variants, min(len(self.variants), self.rng.randint(1, 4)))
+        return 'POST', '/api/sales/', {
+            'payment_mode': self.rng.choice(['CASH', 'UPI', 'CARD']),
+            'items': [{'variant': line['id'], 'quantity': 1, 'unit_price': '0'} for line in lines],
+        }
+
+    def checked_out(self, content):
+        sale = json.loads(content)
+        self.returnable.append((sale['id'], sale['items'][0]['id']))
+
+    def sale_return(self):
+        sale_id, line_id = self.returnable.pop()
+        return 'POST', '/api/returns/', {
+            'original_sale': sale_id, 'reason': 'WRONG_SIZE', 'items': [{'sale_item': line_id, 'quantity': 1}],
+        }
+
+    def sales_list(self):
+        return 'GET', '/api/sales/?page_size=50', None
+
+    def returns_list(self):
+        return 'GET', '/api/returns/?page_size=50', None
+
+    def variants_list(self):
+        return 'GET', '/api/variants/?page_size=50', None
+
+    def sale_lookup(self):
+        invoice, phone = self.rng.choice(self.invoices)
+        if phone and self.rng.random() < 0.5:
+            return 'GET', f"/api/sales/?{urlencode({'customer_phone': phone})}", None
+        return 'GET', f"/api/sales/?{urlencode({'invoice_number': invoice})}", None
+
+    def analytics(self):
+        return 'GET', f"/api/sales/analytics/?days={self.rng.choice([7, 30, 90])}", None
+
+    def gst_report(self):
+        return 'GET', f"/api/reports/gst/?days={self.rng.choice([30, 90])}", None
+
+    def low_stock(self):
+        return 'GET', '/api/inventory/low-stock/', None
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarise(samples, elapsed):
+    """Per-operation and overall stats from (operation, ms, status, queries) samples."""
+    def stats(rows):
+        latencies = [ms for _, ms, _, _ in rows]
+        queries = [count for _, _, _, count in rows if count is not None]
+        result = {
+            'requests': len(rows),
+            'errors': sum(1 for _, _, status, _ in rows if status >= 400),
+            'mean_ms': round(sum(latencies) / len(latencies), 2),
+            'queries_per_request': round(sum(queries) / len(queries), 2) if queries else None,
+        }
+        result.update({f'p{pct}_ms': round(percentile(latencies, pct), 2) for pct in PERCENTILES})
+        return result
+
+    by_operation = {}
+    for sample in samples:
+        by_operation.setdefault(sample[0], []).append(sample)
+    return {
+        'elapsed_seconds': round(elapsed, 2),
+        'throughput_rps': round(len(samples) / elapsed, 1) if elapsed else None,
+        'overall': stats(samples),
+        'operations': {name: stats(rows) for name, rows in sorted(by_operation.items())},
+    }
+
+
+def run(workload, requests, concurrency, warmup):
+    def one(record):
+        with workload.lock:
+            operation, (method, path, body) = workload.next()
+        started = time.perf_counter()
+        status, content, queries = workload.transport.request(method, path, body)
+        ms = (time.perf_counter() - started) * 1000
+        if operation == 'checkout' and status == 201:
+            with workload.lock:
+                workload.checked_out(content)
+        return (operation, ms, status, queries) if record else None
+
+    for _ in range(warmup):
+        one(False)
+    started = time.perf_counter()
+    if concurrency > 1:
+        with ThreadPoolExecutor(concurrency) as pool:
+            samples = list(pool.map(lambda _: one(True), range(requests)))
+    else:
+        samples = [one(True) for _ in range(requests)]
+    return summarise(samples, time.perf_counter() - started)
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                               check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_report(result):
+    print(f"{'operation':<16}{'requests':>9}{'errors':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'queries':>9}")
+    rows = list(result['operations'].items()) + [('overall', result['overall'])]
+    for name, stats in rows:
+        queries = stats['queries_per_request']
+        print(f"{name:<16}{stats['requests']:>9}{stats['errors']:>8}{stats['p50_ms']:>9.2f}"
+              f"{stats['p95_ms']:>9.2f}{stats['p99_ms']:>9.2f}{'-' if queries is None else queries:>9}")
+    print(f"{result['throughput_rps']} requests/s over {result['elapsed_seconds']}s")
+
+
+def compare(before_path, after_path):
+    with open(before_path) as f:
+        before = json.load(f)
+    with open(after_path) as f:
+        after = json.load(f)
+    print(f"{before.get('commit') or before_path} -> {after.get('commit') or after_path}")
+    print(f"{'operation':<16}{'p50 ms':>18}{'p95 ms':>18}{'p99 ms':>18}{'queries':>14}")
+    names = sorted(set(before['operations']) | set(after['operations'])) + ['overall']
+
+    def cell(old, new, width):
+        if old is None or new is None:
+            return f"{'-':>{width}}"
+        change = f' ({(new - old) / old * 100:+.0f}%)' if old else ''
+        return f'{new:>{width - len(change)}.2f}{change}' if isinstance(new, float) else f'{new:>{width}}'
+
+    for name in names:
+        old = before['overall'] if name == 'overall' else before['operations'].get(name)
+        new = after['overall'] if name == 'overall' else after['operations'].get(name)
+        if old is None or new is None:
+            print(f'{name:<16}  only in {"after" if old is None else "before"}')
+            continue
+        print(f'{name:<16}' + ''.join(cell(old[key], new[key], 18) for key in ('p50_ms', 'p95_ms', 'p99_ms'))
+              + cell(old['queries_per_request'], new['queries_per_request'], 14))
+    print(f"throughput {before['throughput_rps']} -> {after['throughput_rps']} requests/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--scale', default='1k', help=f"Sales to seed: {', '.join(seeding.SCALES)} or a number")
+    parser.add_argument('--variants', type=int, default=5000, help='Variants to seed')
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--warmup', type=int, default=100)
+    parser.add_argument('--url', help='Send requests to this running server instead of seeding a test database')
+    parser.add_argument('--concurrency', type=int, default=1, help='Parallel requests (with --url)')
+    parser.add_argument('--seed', type=int, default=1, help='Random seed for the data and the request mix')
+    parser.add_argument('--output', help='Write the results as JSON to this file')
+    parser.add_argument('--compare', nargs=2, metavar=('BEFORE', 'AFTER'), help='Diff two JSON result files')
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    rng = random.Random(args.seed)
+    result = {
+        'commit': git_commit(),
+        'started_at': datetime.now(dt_timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'requests': args.requests,
+    }
+    if args.url:
+        result.update(mode='http', url=args.url, concurrency=args.concurrency)
+        result.update(run(Workload(HttpTransport(args.url), rng), args.requests, args.concurrency, args.warmup))
+    else:
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0)
+        try:
+            seeded = seeding.seed(seeding.parse_scale(args.scale), variants=args.variants,
+                                  random_seed=args.seed, log=print)
+            result.update(mode='client', database=connection.vendor, concurrency=1, seeded=seeded)
+            result.update(run(Workload(ClientTransport(), rng), args.requests, 1, args.warmup))
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    print_report(result)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2)
+        print(f'Results written to {args.output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""
+Benchmark: data reset through the ORM deletion collector against the raw
+bulk deletes in sales.purge, and a retention purge of the older half of
+the sales.
+
+Seeds a throwaway test database with sales.seeding before each run and
+prints rows removed, seconds, query count and peak resident memory:
+
+    cd backend && python -m benchmarks.reset [--scale 100k] [--variants 5000]
+"""
+import argparse
+import os
+import resource
+import sys
+import time
+from datetime import timedelta
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend_proj.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.db import connection  # noqa: E402
+from django.test.utils import CaptureQueriesContext  # noqa: E402
+from django.utils import timezone  # noqa: E402
+
+from inventory.models import Category, Product, ProductVariant  # noqa: E402
+from sales import purge, seeding  # noqa: E402
+from sales.models import DailyReturnRollup, DailySalesRollup, Return, Sale  # noqa: E402
+
+
+def collector_reset():
+    """The reset as it was: queryset.delete() per model."""
+    removed = 0
+    for model in (Return, Sale, DailySalesRollup, DailyReturnRollup, ProductVariant, Product, Category):
+        removed += model.objects.all().delete()[0]
+    return removed
+
+
+def measure(label, function):
+    started = time.perf_counter()
+    with CaptureQueriesContext(connection) as ctx:
+        rows = function()
+    elapsed = time.perf_counter() - started
+    # ru_maxrss is in KiB on Linux; it only grows, so compare runs in this order
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f'{label:<22}{rows:>10} rows{elapsed:>9.2f}s{len(ctx.captured_queries):>8} queries{peak:>9.0f} MiB peak')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--scale', default='10k', help=f"Sales to seed: {', '.join(seeding.SCALES)} or a number")
+    parser.add_argument('--variants', type=int, default=2000, help='Variants to seed')
+    parser.add_argument('--days', type=int, default=365, help='Days of history to spread the sales over')
+    args = parser.parse_args()
+
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0)
+    try:
+        def seed():
+            seeding.seed(seeding.parse_scale(args.scale), variants=args.variants, days=args.days, random_seed=1)
+
+        # Cheapest first: the peak RSS figure is a high-water mark
+        seed()
+        cutoff = timezone.localdate() - timedelta(days=args.days // 2)
+        measure('purge (half)', lambda: purge.purge_sales(cutoff)['rows'])
+        measure('reset (bulk delete)', lambda: purge.reset()['rows'])
+        seed()
+        measure('reset (collector)', collector_reset)
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""
+Benchmark: bulk variant import (inventory.importer) from a generated CSV.
+
+Imports the sheet twice into a throwaway test database, first as new
+variants and then as an update of every row, and prints rows/sec, query
+count and peak resident memory after each pass. With SQLite the test
+database lives in memory, so RSS grows with the data imported; the importer
+itself holds one chunk at a time.
+
+    cd backend && python -m benchmarks.variant_import [--rows 20000]
+"""
+import argparse
+import csv
+import os
+import sys
+import tempfile
+import resource
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend_proj.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.db import connection  # noqa: E402
+from django.test.utils import CaptureQueriesContext  # noqa: E402
+
+from inventory import importer  # noqa: E402
+
+CATEGORIES = ['Sarees', 'Kurtis', 'Coord Sets', 'Bottom Wear', 'Blouses']
+SIZES = ['XS', 'S', 'M', 'L', 'XL', 'XXL', 'Free Size']
+COLORS = ['Red', 'Maroon', 'Navy', 'Black', 'White', 'Mustard', 'Peach', 'Olive', 'Pink', 'Grey']
+
+
+def write_sheet(path, rows, price):
+    with open(path, 'w', newline='') as sheet:
+        writer = csv.writer(sheet)
+        writer.writerow(['category', 'product', 'brand', 'size', 'color', 'barcode',
+                         'price_cost', 'price_retail', 'gst_rate', 'stock_quantity'])
+        for n in range(rows):
+            product = n // (len(SIZES) * len(COLORS))
+            writer.writerow([
+                CATEGORIES[product % len(CATEGORIES)], f'Style {product}', 'House Brand',
+                SIZES[n % len(SIZES)], COLORS[n // len(SIZES) % len(COLORS)], f'IMP{n:07d}',
+                price // 2, price, 5, 10,
+            ])
+
+
+def run(path):
+    started = time.perf_counter()
+    with CaptureQueriesContext(connection) as ctx, open(path, 'rb') as stream:
+        report = importer.import_variants(importer.read_csv(stream))
+    elapsed = time.perf_counter() - started
+    # ru_maxrss is in KiB on Linux
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    return report, elapsed, len(ctx.captured_queries), peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rows', type=int, default=20000)
+    args = parser.parse_args()
+
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0)
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'sheet.csv')
+            print(f"{'pass':<8}{'rows':>8}{'created':>9}{'updated':>9}{'rows/s':>10}{'queries':>9}{'RSS MB':>9}")
+            for name, price in (('insert', 999), ('update', 1099)):
+                write_sheet(path, args.rows, price)
+                report, elapsed, queries, peak = run(path)
+                print(f'{name:<8}{report.rows:>8}{report.created:>9}{report.updated:>9}'
+                      f'{report.rows / elapsed:>10.0f}{queries:>9}{peak / 2 ** 20:>9.1f}')
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+if __name__ == '__main__':
+    main()
@@ -9,7 +9,7 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend_proj.settings')
 django.setup()
 
 from inventory.models import Category, Product, ProductVariant
-from sales.models import Sale, SaleItem, Return
+from sales.models import Sale, SaleItem, Return, DailySalesRollup, DailyReturnRollup
 
 def clear_all_data():
     print("⚠️  STARTING DATABASE SCRIPT...")
@@ -22,6 +22,8 @@ def clear_all_data():
     # Note: Deleting Sales deletes SaleItems (CASCADE)
     print(f"   Deleting {Sale.objects.count()} Sales...")
     Sale.objects.all().delete()
+    DailySalesRollup.objects.all().delete()
+    DailyReturnRollup.objects.all().delete()
 
     # 3. Delete Inventory
     print(f"   Deleting {ProductVariant.objects.count()} Variants...")
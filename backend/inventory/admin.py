@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Category, Product, ProductVariant
+from .models import Category, InventoryMovement, Product, ProductVariant
 
 class ProductVariantInline(admin.TabularInline):
     model = ProductVariant
@@ -19,3 +19,21 @@ class CategoryAdmin(admin.ModelAdmin):
 class ProductVariantAdmin(admin.ModelAdmin):
     list_display = ('product', 'size', 'color', 'price_retail', 'stock_quantity', 'barcode')
     search_fields = ('barcode', 'product__name')
+
+@admin.register(InventoryMovement)
+class InventoryMovementAdmin(admin.ModelAdmin):
+    """Read-only: the ledger is append-only, corrections are new adjustments."""
+    list_display = ('created_at', 'variant', 'kind', 'quantity', 'reference')
+    list_filter = ('kind',)
+    list_select_related = ('variant__product',)
+    search_fields = ('variant__barcode', 'reference')
+    date_hierarchy = 'created_at'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
@@ -0,0 +1,102 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import transaction
+
+from jobs import generation
+
+
+class VariantCache:
+    """
+    Bounded in-process LRU cache of serialized variants keyed by barcode.
+
+    Entries are dropped by the inventory signals whenever a variant (or its
+    parent product) is saved or deleted. They are tracked by variant id as
+    well, so a variant whose barcode was edited does not leave a stale entry
+    behind under the old code. The TTL bounds how long a stock change made
+    by another gunicorn worker can stay invisible to this process. Bulk
+    changes (reset, sheet import), which may run in the job worker, start a
+    new 'catalog' generation (jobs.generation) and the whole cache is
+    dropped when it sees one.
+    """
+
+    def __init__(self, max_size=10000, ttl=30):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._barcodes_by_id = {}
+        self._lock = threading.Lock()
+        self._generation = None
+
+    def get(self, barcode):
+        self._follow(generation.current('catalog'))
+        return self._get(barcode)
+
+    async def aget(self, barcode):
+        self._follow(await generation.acurrent('catalog'))
+        return self._get(barcode)
+
+    def _follow(self, catalog):
+        with self._lock:
+            if catalog != self._generation:
+                self._data.clear()
+                self._barcodes_by_id.clear()
+                self._generation = catalog
+
+    def _get(self, barcode):
+        with self._lock:
+            entry = self._data.get(barcode)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                self._pop(barcode)
+                return None
+            self._data.move_to_end(barcode)
+            return value
+
+    def set(self, barcode, value):
+        with self._lock:
+            self._data[barcode] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(barcode)
+            self._barcodes_by_id[value['id']] = barcode
+            while len(self._data) > self.max_size:
+                self._pop(next(iter(self._data)))
+
+    def invalidate(self, *variant_ids):
+        with self._lock:
+            for variant_id in variant_ids:
+                barcode = self._barcodes_by_id.get(variant_id)
+                if barcode is not None:
+                    self._pop(barcode)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._barcodes_by_id.clear()
+
+    def _pop(self, barcode):
+        _, value = self._data.pop(barcode)
+        self._barcodes_by_id.pop(value['id'], None)
+
+    def __len__(self):
+        return len(self._data)
+
+
+variant_cache = VariantCache(
+    max_size=getattr(settings, 'VARIANT_CACHE_SIZE', 10000),
+    ttl=getattr(settings, 'VARIANT_CACHE_TTL', 30),
+)
+
+
+def invalidate_variants(*variant_ids):
+    """
+    Drop cached variants now, and again once the surrounding transaction
+    commits so a concurrent scan cannot re-cache the pre-commit row in
+    between. Call this after queryset.update() on ProductVariant, which
+    bypasses the post_save signal.
+    """
+    variant_cache.invalidate(*variant_ids)
+    transaction.on_commit(lambda: variant_cache.invalidate(*variant_ids))
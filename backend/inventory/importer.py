@@ -0,0 +1,412 @@
+"""
+Bulk variant import from a supplier sheet (CSV or XLSX).
+
+Rows are streamed from the file and handled a chunk at a time, so memory
+stays flat however long the sheet is. Per chunk:
+
+* each row is checked on its own; bad rows are reported with their sheet
+  row number and skipped, the rest carry on;
+* categories (by slug) and products (by name, ignoring case) are resolved
+  with one query each, and the missing ones created with one bulk insert each;
+* variants are upserted by barcode with one executemany of a single
+  INSERT ... ON CONFLICT, inside one transaction, and stock changes go to
+  the ledger the same way.
+
+A barcode already on file is updated in place; a row repeated later in the
+sheet overrides the earlier one. Only the optional columns present in the
+header are written, so a sheet without stock_quantity leaves stock alone.
+
+Columns (header names are case-insensitive):
+
+    category, product, size, color, barcode, price_retail   required
+    brand, description, price_cost, gst_rate, stock_quantity optional
+"""
+import csv
+import functools
+import io
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.db import connection, transaction
+from django.db.models.constants import OnConflict
+from django.db.models.functions import Lower
+from django.utils import timezone
+from django.utils.text import slugify
+
+from jobs import generation
+
+from . import ledger, search
+from .cache import invalidate_variants
+from .models import Category, InventoryMovement, Product, ProductVariant
+
+REQUIRED = ('category', 'product', 'size', 'color', 'barcode', 'price_retail')
+
+ALIASES = {
+    'product_name': 'product',
+    'name': 'product',
+    'colour': 'color',
+    'mrp': 'price_retail',
+    'price': 'price_retail',
+    'cost': 'price_cost',
+    'gst': 'gst_rate',
+    'stock': 'stock_quantity',
+    'quantity': 'stock_quantity',
+}
+
+# Variant columns an upsert may overwrite, by sheet column
+UPDATABLE = {
+    'price_cost': 'price_cost',
+    'gst_rate': 'gst_rate',
+    'stock_quantity': 'stock_quantity',
+}
+
+CHUNK_SIZE = 1000
+MAX_REPORTED_ERRORS = 1000
+
+
+class ImportFormatError(ValueError):
+    """The file cannot be read as a variant sheet at all."""
+
+
+def _column(name):
+    name = str(name or '').strip().lower().replace(' ', '_')
+    return ALIASES.get(name, name)
+
+
+def read_csv(stream):
+    """Yield (row number, {column: value}) from a CSV text or binary stream."""
+    if not isinstance(stream, io.TextIOBase):
+        stream = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    reader = csv.reader(stream)
+    header = [_column(name) for name in next(reader, [])]
+    for number, values in enumerate(reader, start=2):
+        if any(value.strip() for value in values):
+            yield number, dict(zip(header, values + [''] * (len(header) - len(values))))
+
+
+def read_xlsx(stream):
+    """Yield (row number, {column: value}) from the first sheet of an XLSX workbook."""
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise ImportFormatError('Reading .xlsx files needs openpyxl (pip install openpyxl).')
+    try:
+        workbook = load_workbook(stream, read_only=True, data_only=True)
+    except Exception as exc:
+        raise ImportFormatError(f'Not a readable .xlsx workbook: {exc}')
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = [_column(name) for name in next(rows, ())]
+        for number, values in enumerate(rows, start=2):
+            if any(value not in (None, '') for value in values):
+                values = ['' if value is None else str(value) for value in values]
+                yield number, dict(zip(header, values + [''] * (len(header) - len(values))))
+    finally:
+        workbook.close()
+
+
+READERS = {
+    'csv': read_csv,
+    'xlsx': read_xlsx,
+}
+
+
+def count_rows(stream, extension):
+    """
+    Rows below the header, for progress, without parsing them: the line
+    count of a CSV, the used range of an XLSX sheet (None if the workbook
+    does not record it). Blank rows count, so this can run high.
+    """
+    if extension == 'xlsx':
+        try:
+            from openpyxl import load_workbook
+            workbook = load_workbook(stream, read_only=True)
+        except Exception:
+            return None  # read_xlsx reports what is wrong with the file
+        try:
+            rows = workbook.worksheets[0].max_row
+        finally:
+            workbook.close()
+        return max(rows - 1, 0) if rows else None
+    data = stream.read()
+    lines = data.count(b'\n') + (0 if not data or data.endswith(b'\n') else 1)
+    return max(lines - 1, 0)
+
+
+def format_for(filename):
+    extension = filename.rsplit('.', 1)[-1].lower() if '.' in filename else ''
+    if extension not in READERS:
+        raise ImportFormatError(f"Unsupported file type '.{extension}', expected .csv or .xlsx.")
+    return extension
+
+
+def _decimal(value, field, errors, minimum=Decimal('0'), maximum=None):
+    try:
+        number = Decimal(value.strip())
+    except (InvalidOperation, AttributeError):
+        errors[field] = 'A valid number is required.'
+        return None
+    if not number.is_finite() or number < minimum or (maximum is not None and number > maximum):
+        errors[field] = f'Must be between {minimum} and {maximum}.' if maximum is not None \
+            else f'Must be at least {minimum}.'
+        return None
+    return number.quantize(Decimal('0.01'))
+
+
+def clean_row(row, columns):
+    """Return (values, errors) for one sheet row."""
+    errors = {}
+    values = {}
+    for field in REQUIRED:
+        value = (row.get(field) or '').strip()
+        if not value:
+            errors[field] = 'This field is required.'
+        values[field] = value
+    values['product'] = values['product'].title()  # as ProductSerializer.validate_name
+
+    if values['price_retail']:
+        values['price_retail'] = _decimal(values['price_retail'], 'price_retail', errors)
+    for field in ('brand', 'description'):
+        values[field] = (row.get(field) or '').strip() or None
+    if 'price_cost' in columns:
+        values['price_cost'] = _decimal(row.get('price_cost') or '0', 'price_cost', errors)
+    if 'gst_rate' in columns:
+        values['gst_rate'] = _decimal(row.get('gst_rate') or '0', 'gst_rate', errors, maximum=Decimal('100'))
+    if 'stock_quantity' in columns:
+        raw = (row.get('stock_quantity') or '0').strip()
+        try:
+            # XLSX hands integers over as floats ("12.0")
+            quantity = Decimal(raw)
+            if quantity != quantity.to_integral_value() or quantity < 0:
+                raise InvalidOperation
+            values['stock_quantity'] = int(quantity)
+        except InvalidOperation:
+            errors['stock_quantity'] = 'A whole number of 0 or more is required.'
+
+    # The column limits, checked here so one long cell fails its row and not the chunk
+    for field, max_length in (('category', 100), ('product', 200), ('brand', 100),
+                              ('size', 100), ('color', 100), ('barcode', 100)):
+        if len(values[field] or '') > max_length:
+            errors[field] = f'At most {max_length} characters.'
+    if 'category' not in errors and not _slug_fits(values['category']):
+        errors['category'] = 'Too long to make a category slug.'
+    return values, errors
+
+
+@functools.lru_cache(maxsize=1024)
+def _slug_fits(category):
+    # A sheet names a handful of categories on thousands of rows
+    return len(slugify(category)) <= Category._meta.get_field('slug').max_length
+
+
+class ImportReport:
+    def __init__(self):
+        self.rows = 0
+        self.created = 0
+        self.updated = 0
+        self.error_count = 0
+        self.errors = []
+
+    def error(self, number, errors):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'row': number, 'errors': errors})
+
+    def as_dict(self):
+        return {
+            'rows': self.rows,
+            'created': self.created,
+            'updated': self.updated,
+            'error_count': self.error_count,
+            'errors': self.errors,
+        }
+
+
+def import_variants(rows, chunk_size=CHUNK_SIZE, dry_run=False, progress=None):
+    """
+    Upsert variants from `rows`, an iterable of (row number, {column: value})
+    as produced by read_csv / read_xlsx. Returns an ImportReport. With
+    dry_run every chunk is rolled back, so only the report is kept.
+    `progress` is called with the rows done after each chunk commits.
+    """
+    report = ImportReport()
+    rows = iter(rows)
+    first = next(rows, None)
+    if first is None:
+        return report
+    columns = set(first[1])
+    missing = [field for field in REQUIRED if field not in columns]
+    if missing:
+        raise ImportFormatError(f"Missing column(s): {', '.join(missing)}.")
+
+    rows = _prepend(first, rows)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            break
+        report.rows += len(chunk)
+        with transaction.atomic():
+            _import_chunk(chunk, columns, report)
+            if dry_run:
+                transaction.set_rollback(True)
+        if progress is not None:
+            progress(report.rows)
+    if not dry_run and (report.created or report.updated):
+        # Imports run as jobs: drop the variants other processes have cached
+        generation.bump('catalog')
+    return report
+
+
+def _prepend(item, rest):
+    yield item
+    yield from rest
+
+
+def _import_chunk(chunk, columns, report):
+    cleaned = {}
+    for number, row in chunk:
+        values, errors = clean_row(row, columns)
+        if errors:
+            report.error(number, errors)
+        else:
+            # A later row for the same barcode wins
+            cleaned.pop(values['barcode'], None)
+            cleaned[values['barcode']] = (number, values)
+    if not cleaned:
+        return
+
+    categories = _resolve_categories({values['category'] for _, values in cleaned.values()})
+    products, new_products = _resolve_products(
+        {values['product']: values for _, values in cleaned.values()}, categories
+    )
+    # Before the upsert, while new products have no variants to reindex
+    search.index_products([product.id for product in new_products])
+
+    # (product, size, colour) is unique too: refuse a row that would give an
+    # existing variant a second barcode, rather than failing the whole chunk
+    taken = {
+        (product_id, size, color): barcode
+        for product_id, size, color, barcode in ProductVariant.objects.filter(
+            product_id__in={products[values['product']].id for _, values in cleaned.values()}
+        ).values_list('product_id', 'size', 'color', 'barcode')
+    }
+    # Stock on file before the upsert, locked so the ledger records the true change
+    on_file = ProductVariant.objects.filter(barcode__in=list(cleaned))
+    if 'stock_quantity' in columns:
+        on_file = on_file.select_for_update()
+    existing = {barcode: (pk, stock) for barcode, pk, stock in on_file.values_list('barcode', 'id', 'stock_quantity')}
+
+    variants = {}
+    for barcode, (number, values) in cleaned.items():
+        key = (products[values['product']].id, values['size'], values['color'])
+        if taken.get(key, barcode) != barcode:
+            report.error(number, {'barcode': (
+                f"{values['product']} {values['size']}/{values['color']} already has barcode {taken[key]}."
+            )})
+            continue
+        taken[key] = barcode
+        variants[barcode] = values
+
+    _upsert(variants, products, [field for column, field in UPDATABLE.items() if column in columns])
+    report.created += sum(1 for barcode in variants if barcode not in existing)
+    report.updated += sum(1 for barcode in variants if barcode in existing)
+
+    # The upsert sends no signals: refresh the search index and barcode cache
+    ids = {barcode: existing[barcode][0] for barcode in variants if barcode in existing}
+    if len(ids) < len(variants):
+        ids.update(ProductVariant.objects.filter(barcode__in=[barcode for barcode in variants if barcode not in ids])
+                   .values_list('barcode', 'id'))
+    variant_ids = list(ids.values())
+    search.index_variants(variant_ids)
+    invalidate_variants(*variant_ids)
+    if 'stock_quantity' in columns:
+        _record_stock(variants, ids, existing)
+
+
+def _upsert(variants, products, sheet_fields):
+    """
+    Insert or update ({barcode: values}) by barcode, writing `sheet_fields`
+    besides product, size, colour and retail price. What
+    bulk_create(update_conflicts=True) does, as one executemany of a single
+    statement: the ORM compiles a placeholder and prepares a value for every
+    cell, which took most of an import's time.
+    """
+    from_sheet = {'product', 'size', 'color', 'barcode', 'price_retail', *sheet_fields}
+    stamp = timezone.now()
+    fields = [field for field in ProductVariant._meta.concrete_fields if not field.primary_key]
+    # Per column: where the value comes from, or the value itself, prepared once per chunk
+    sources = [
+        field.name if field.name in from_sheet else
+        field.get_db_prep_save(stamp if field.name in ('created_at', 'updated_at') else field.get_default(),
+                               connection)
+        for field in fields
+    ]
+    sheet = [index for index, field in enumerate(fields) if field.name in from_sheet]
+    rows = []
+    for values in variants.values():
+        row = list(sources)
+        for index in sheet:
+            name = sources[index]
+            row[index] = products[values[name]].id if name == 'product' else values[name]
+        rows.append(row)
+
+    quote = connection.ops.quote_name
+    update = [field.column for field in fields if field.name in from_sheet - {'barcode'} or field.name == 'updated_at']
+    conflict = connection.ops.on_conflict_suffix_sql(fields, OnConflict.UPDATE, update, ['barcode'])
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f"INSERT INTO {quote(ProductVariant._meta.db_table)} ({', '.join(quote(f.column) for f in fields)}) "
+            f"VALUES ({', '.join(['%s'] * len(fields))}) {conflict}",
+            rows,
+        )
+
+
+def _record_stock(variants, ids, existing):
+    """Ledger the sheet's stock: raised stock as a receipt, lowered as an adjustment."""
+    received, adjusted = {}, {}
+    for barcode, values in variants.items():
+        change = values['stock_quantity'] - existing.get(barcode, (None, 0))[1]
+        (received if change > 0 else adjusted)[ids[barcode]] = change
+    ledger.record(received, InventoryMovement.RECEIPT, 'import')
+    ledger.record(adjusted, InventoryMovement.ADJUSTMENT, 'import')
+
+
+def _resolve_categories(names):
+    """{name: Category} for `names`, creating missing ones. Matched by slug, like Category.save."""
+    slugs = {name: slugify(name) for name in names}
+    found = Category.objects.in_bulk(set(slugs.values()), field_name='slug')
+    missing = {slug: name for name, slug in slugs.items() if slug not in found}
+    if missing:
+        Category.objects.bulk_create(
+            [Category(name=name, slug=slug) for slug, name in missing.items()], ignore_conflicts=True
+        )
+        found.update(Category.objects.in_bulk(list(missing), field_name='slug'))
+    return {name: found[slug] for name, slug in slugs.items()}
+
+
+def _resolve_products(rows_by_name, categories):
+    """
+    ({name: Product}, [created products]) for the products named in a chunk.
+    Matched ignoring case, as ProductSerializer.validate_name keeps names unique.
+    """
+    found = {}
+    on_file = Product.objects.annotate(lower_name=Lower('name')) \
+        .filter(lower_name__in=[name.lower() for name in rows_by_name]).order_by('id')
+    for product in on_file:
+        found.setdefault(product.lower_name, product)
+    found = {name: found[name.lower()] for name in rows_by_name if name.lower() in found}
+    created = [
+        Product(
+            category=categories[values['category']],
+            name=name,
+            brand=values['brand'],
+            description=values['description'],
+        )
+        for name, values in rows_by_name.items() if name not in found
+    ]
+    if created:
+        Product.objects.bulk_create(created)
+        # Not every backend hands back primary keys from bulk_create
+        created = list(Product.objects.filter(name__in=[product.name for product in created]))
+        found.update((product.name, product) for product in created)
+    return found, created
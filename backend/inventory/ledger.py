@@ -0,0 +1,163 @@
+"""
+Stock movement ledger.
+
+Every change to stock_quantity is also written as an InventoryMovement, a
+signed quantity with its kind and reference:
+
+* SALE / RETURN   by SaleSerializer / ReturnSerializer, one bulk insert per
+                  invoice or return, inside the same transaction;
+* ADJUSTMENT      hand edits through ProductVariant.save (admin, variants
+                  PUT/PATCH), as the difference from the locked row;
+* RECEIPT         a new variant's opening stock, and stock raised by a
+                  supplier sheet import (lowered by one is an ADJUSTMENT).
+
+Nightly, take_snapshots() writes a StockSnapshot for each variant that moved
+since the last run: its stock at the end of the day and the id of the last
+movement counted. Stock at any date is then the latest snapshot on or
+before it plus the movements after that snapshot's watermark, a bounded
+index range, instead of a replay of the variant's whole history. The same
+expression over every variant at once reconciles the ledger against
+stock_quantity in one query (reconcile(), `manage.py reconcile_stock`).
+
+Variants that existed before the ledger start from an opening snapshot of
+the stock they had then; dates before a variant's first snapshot or
+movement are not covered, and stock_on() refuses them.
+"""
+from datetime import datetime, time, timedelta
+
+from django.db import connection
+from django.db.models import F, IntegerField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import InventoryMovement, ProductVariant, StockSnapshot
+
+BATCH_SIZE = 1000
+
+
+def record(quantities, kind, reference=''):
+    """
+    Append one movement per variant in `quantities` ({variant_id: signed
+    units}), as one executemany of a single INSERT: bulk_create would build
+    and prepare a model per movement, a large share of a sheet import.
+    """
+    opts = InventoryMovement._meta
+    stamp = opts.get_field('created_at').get_db_prep_save(timezone.now(), connection)
+    rows = [(variant_id, kind, quantity, reference, stamp) for variant_id, quantity in quantities.items() if quantity]
+    if not rows:
+        return
+    quote = connection.ops.quote_name
+    columns = ', '.join(quote(opts.get_field(name).column)
+                        for name in ('variant', 'kind', 'quantity', 'reference', 'created_at'))
+    with connection.cursor() as cursor:
+        cursor.executemany(f'INSERT INTO {quote(opts.db_table)} ({columns}) VALUES (%s, %s, %s, %s, %s)', rows)
+
+
+def stock_before_save(variant, update_fields=None):
+    """
+    The stock `variant` has in the database, locked until the save commits;
+    0 for a new variant and None when the save does not write stock.
+    """
+    if update_fields is not None and 'stock_quantity' not in update_fields:
+        return None
+    if variant._state.adding:
+        return 0
+    previous = ProductVariant.objects.select_for_update().filter(pk=variant.pk) \
+        .values_list('stock_quantity', flat=True).first()
+    return previous or 0
+
+
+def record_edit(variant, previous, created=False):
+    """Record a saved variant's stock change from `previous`: opening stock when `created`."""
+    if created:
+        record({variant.pk: variant.stock_quantity}, InventoryMovement.RECEIPT, 'opening stock')
+    else:
+        record({variant.pk: variant.stock_quantity - previous}, InventoryMovement.ADJUSTMENT, 'edit')
+
+
+def _day_end(day):
+    return timezone.make_aware(datetime.combine(day + timedelta(days=1), time.min))
+
+
+def take_snapshots(day=None):
+    """
+    Snapshot, as of the end of `day` (yesterday by default; only closed
+    days), every variant with movements since the previous run. Returns the
+    number of snapshots written; a day not after the last run writes none.
+    """
+    day = day or timezone.localdate() - timedelta(days=1)
+    if day >= timezone.localdate():
+        raise ValueError('Only closed days can be snapshotted.')
+    last = StockSnapshot.objects.order_by('-date', '-movement_id').values_list('date', 'movement_id').first()
+    if last is not None and last[0] >= day:
+        return 0
+    since = last[1] if last is not None else 0
+    cutoff = InventoryMovement.objects.filter(created_at__lt=_day_end(day)) \
+        .order_by('-created_at', '-id').values_list('id', flat=True).first()
+    if cutoff is None or cutoff <= since:
+        return 0
+
+    moved = dict(
+        InventoryMovement.objects.filter(id__gt=since, id__lte=cutoff)
+        .values('variant_id').annotate(total=Sum('quantity')).order_by().values_list('variant_id', 'total')
+    )
+    latest = StockSnapshot.objects.filter(variant=OuterRef('pk')).order_by('-date').values('quantity')[:1]
+    variant_ids = sorted(moved)
+    written = 0
+    for start in range(0, len(variant_ids), BATCH_SIZE):
+        previous = ProductVariant.objects.filter(id__in=variant_ids[start:start + BATCH_SIZE]) \
+            .annotate(quantity=Coalesce(Subquery(latest), Value(0))).values_list('id', 'quantity')
+        written += len(StockSnapshot.objects.bulk_create([
+            StockSnapshot(variant_id=variant_id, date=day, quantity=quantity + moved[variant_id], movement_id=cutoff)
+            for variant_id, quantity in previous
+        ]))
+    return written
+
+
+def with_ledger_stock(queryset, day=None):
+    """
+    Annotate variants with `ledger_quantity`: their stock per the ledger,
+    now or at the end of `day`.
+    """
+    snapshots = StockSnapshot.objects.filter(variant=OuterRef('pk'))
+    movements = InventoryMovement.objects.filter(variant=OuterRef('pk'), id__gt=OuterRef('snapshot_movement_id'))
+    if day is not None:
+        snapshots = snapshots.filter(date__lte=day)
+        movements = movements.filter(created_at__lt=_day_end(day))
+    snapshots = snapshots.order_by('-date')
+    return queryset.annotate(
+        snapshot_quantity=Coalesce(Subquery(snapshots.values('quantity')[:1]), Value(0)),
+        snapshot_movement_id=Coalesce(Subquery(snapshots.values('movement_id')[:1]), Value(0)),
+        ledger_quantity=F('snapshot_quantity') + Coalesce(Subquery(
+            movements.values('variant').annotate(total=Sum('quantity')).values('total'),
+            output_field=IntegerField(),
+        ), Value(0)),
+    )
+
+
+def stock_on(variant_id, day):
+    """
+    Stock of one variant at the end of `day`, or None if there is no such
+    variant. Raises ValueError for a day before its ledger starts.
+    """
+    first_snapshot = StockSnapshot.objects.filter(variant=OuterRef('pk')).order_by('date').values('date')[:1]
+    first_movement = InventoryMovement.objects.filter(variant=OuterRef('pk')).order_by('id').values('created_at')[:1]
+    row = with_ledger_stock(ProductVariant.objects.filter(pk=variant_id), day) \
+        .annotate(first_snapshot=Subquery(first_snapshot), first_movement=Subquery(first_movement)) \
+        .values_list('ledger_quantity', 'first_snapshot', 'first_movement').first()
+    if row is None:
+        return None
+    quantity, first_snapshot, first_movement = row
+    starts = [start for start in (first_snapshot, first_movement and timezone.localdate(first_movement)) if start]
+    if not starts or day < min(starts):
+        raise ValueError(f'Stock is recorded from {min(starts)} on.' if starts else 'No stock is recorded yet.')
+    return quantity
+
+
+def reconcile():
+    """Variants whose stock_quantity disagrees with the ledger, as (id, barcode, stock, ledger), in one query."""
+    return list(
+        with_ledger_stock(ProductVariant.objects.all())
+        .exclude(stock_quantity=F('ledger_quantity'))
+        .order_by('id').values_list('id', 'barcode', 'stock_quantity', 'ledger_quantity')
+    )
@@ -0,0 +1,40 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory import importer
+
+
+class Command(BaseCommand):
+    help = 'Create or update product variants from a supplier sheet (.csv or .xlsx), matched by barcode'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV or XLSX file; see inventory/importer.py for the columns')
+        parser.add_argument('--format', choices=sorted(importer.READERS), help='Default: from the file extension')
+        parser.add_argument('--chunk-size', type=int, default=importer.CHUNK_SIZE)
+        parser.add_argument('--dry-run', action='store_true', help='Validate and report without saving')
+        parser.add_argument('--json', action='store_true', help='Print the full report as JSON')
+
+    def handle(self, *args, **options):
+        try:
+            file_format = options['format'] or importer.format_for(options['path'])
+            with open(options['path'], 'rb') as stream:
+                report = importer.import_variants(
+                    importer.READERS[file_format](stream),
+                    chunk_size=options['chunk_size'],
+                    dry_run=options['dry_run'],
+                )
+        except (OSError, importer.ImportFormatError) as exc:
+            raise CommandError(str(exc))
+
+        if options['json']:
+            self.stdout.write(json.dumps(report.as_dict(), indent=2))
+            return
+        for error in report.errors:
+            details = '; '.join(f'{field}: {message}' for field, message in error['errors'].items())
+            self.stderr.write(f"Row {error['row']}: {details}")
+        prefix = 'Dry run: would have created' if options['dry_run'] else 'Created'
+        self.stdout.write(self.style.SUCCESS(
+            f'{prefix} {report.created} and updated {report.updated} variants from {report.rows} rows '
+            f'({report.error_count} rejected).'
+        ))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory import search
+
+
+class Command(BaseCommand):
+    help = 'Re-create the catalog search index from the category, product and variant tables'
+
+    def handle(self, *args, **options):
+        if not search.available():
+            raise CommandError('This database has no catalog search index (needs SQLite FTS5 or PostgreSQL pg_trgm)')
+        rows = search.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Indexed {rows} catalog rows.'))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory import ledger
+
+
+class Command(BaseCommand):
+    help = 'Compare every variant\'s stock_quantity with the movement ledger'
+
+    def handle(self, *args, **options):
+        mismatches = ledger.reconcile()
+        for variant_id, barcode, stock, expected in mismatches:
+            self.stdout.write(f'{barcode} (id {variant_id}): stock {stock}, ledger {expected} ({stock - expected:+d})')
+        if mismatches:
+            raise CommandError(f'{len(mismatches)} variant(s) disagree with the ledger.')
+        self.stdout.write(self.style.SUCCESS('Stock matches the ledger.'))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from inventory import reorder
+
+
+class Command(BaseCommand):
+    help = 'Slide the 7/30-day sales velocity and reorder points to today (run daily, e.g. from cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rebuild', action='store_true',
+                            help='Re-create the daily sales ledger from sale and return lines first')
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            variants = reorder.rebuild()
+        else:
+            variants = reorder.refresh()
+        self.stdout.write(self.style.SUCCESS(f'Reorder points refreshed for {variants} variants.'))
@@ -0,0 +1,20 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory import ledger
+
+
+class Command(BaseCommand):
+    help = 'Snapshot the stock of every variant that moved since the last run (run nightly, e.g. from cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', type=date.fromisoformat,
+                            help='Closed day to snapshot, YYYY-MM-DD (default: yesterday)')
+
+    def handle(self, *args, **options):
+        try:
+            written = ledger.take_snapshots(options['date'])
+        except ValueError as exc:
+            raise CommandError(str(exc))
+        self.stdout.write(self.style.SUCCESS(f'{written} stock snapshots written.'))
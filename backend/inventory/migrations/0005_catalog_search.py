@@ -0,0 +1,22 @@
+from django.db import migrations
+
+from inventory import search
+
+
+def create_index(apps, schema_editor):
+    search.create_index(schema_editor)
+
+
+def drop_index(apps, schema_editor):
+    search.drop_index(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0004_catalog_sync'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
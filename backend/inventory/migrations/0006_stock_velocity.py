@@ -0,0 +1,104 @@
+# Generated by Django 5.2.18 on 2026-10-17 23:31
+
+from datetime import datetime, time, timedelta
+
+import django.db.models.deletion
+import django.db.models.expressions
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+
+def backfill(apps, schema_editor):
+    # inventory.reorder.rebuild() inlined against the historical models, so
+    # later changes to the live models and code cannot break this migration
+    ProductVariant = apps.get_model('inventory', 'ProductVariant')
+    VariantSalesDay = apps.get_model('inventory', 'VariantSalesDay')
+    SaleItem = apps.get_model('sales', 'SaleItem')
+    ReturnItem = apps.get_model('sales', 'ReturnItem')
+
+    today = timezone.localdate()
+    tz = timezone.get_current_timezone()
+    start = timezone.make_aware(datetime.combine(today - timedelta(days=29), time.min), tz)
+    units = {}
+    for row in SaleItem.objects.filter(sale__created_at__gte=start) \
+            .annotate(day=TruncDate('sale__created_at', tzinfo=tz)) \
+            .values('variant_id', 'day').annotate(units=Sum('quantity')).order_by():
+        units[row['variant_id'], row['day']] = row['units']
+    for row in ReturnItem.objects.filter(return_order__created_at__gte=start) \
+            .annotate(day=TruncDate('return_order__created_at', tzinfo=tz)) \
+            .values('sale_item__variant_id', 'day').annotate(units=Sum('quantity')).order_by():
+        key = (row['sale_item__variant_id'], row['day'])
+        units[key] = units.get(key, 0) - row['units']
+    units = {key: count for key, count in units.items() if count}
+    VariantSalesDay.objects.bulk_create(
+        [VariantSalesDay(variant_id=variant_id, date=day, units=count) for (variant_id, day), count in units.items()],
+        batch_size=500,
+    )
+
+    # The columns are new, so only variants with sales in the window need writing
+    totals = {}
+    for (variant_id, day), count in units.items():
+        week, month = totals.get(variant_id, (0, 0))
+        totals[variant_id] = (week + count if day > today - timedelta(days=7) else week, month + count)
+    cover = getattr(settings, 'LOW_STOCK_COVER_DAYS', 7)
+    ProductVariant.objects.bulk_update([
+        # ceil(max(u7 / 7, u30 / 30) * cover)
+        ProductVariant(id=variant_id, units_7d=week, units_30d=month,
+                       reorder_point=-(-max(week * 30, month * 7, 0) * cover // (7 * 30)))
+        for variant_id, (week, month) in totals.items()
+    ], ['units_7d', 'units_30d', 'reorder_point'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0005_catalog_search'),
+        ('sales', '0007_hot_lookup_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VariantSalesDay',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(db_index=True)),
+                ('units', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='productvariant',
+            name='reorder_point',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='productvariant',
+            name='units_30d',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='productvariant',
+            name='units_7d',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='productvariant',
+            index=models.Index(fields=['stock_quantity'], name='inventory_variant_stock_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='productvariant',
+            index=models.Index(django.db.models.expressions.CombinedExpression(models.F('stock_quantity'), '-', models.F('reorder_point')), name='inventory_variant_cover_idx'),
+        ),
+        migrations.AddField(
+            model_name='variantsalesday',
+            name='variant',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sales_days', to='inventory.productvariant'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='variantsalesday',
+            unique_together={('variant', 'date')},
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.18 on 2026-10-17 23:38
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def opening_snapshots(apps, schema_editor):
+    # The ledger starts from the stock every variant has today
+    ProductVariant = apps.get_model('inventory', 'ProductVariant')
+    StockSnapshot = apps.get_model('inventory', 'StockSnapshot')
+    today = timezone.localdate()
+    StockSnapshot.objects.bulk_create((
+        StockSnapshot(variant_id=variant_id, date=today, quantity=stock)
+        for variant_id, stock in ProductVariant.objects.exclude(stock_quantity=0).values_list('id', 'stock_quantity')
+    ), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0006_stock_velocity'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InventoryMovement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('SALE', 'Sale'), ('RETURN', 'Return'), ('ADJUSTMENT', 'Adjustment'), ('RECEIPT', 'Receipt')], max_length=10)),
+                ('quantity', models.IntegerField(help_text='Units in (+) or out (-)')),
+                ('reference', models.CharField(blank=True, help_text='Invoice / return number, or the source', max_length=100)),
+                ('created_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+                ('variant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='movements', to='inventory.productvariant')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='StockSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(db_index=True)),
+                ('quantity', models.IntegerField()),
+                ('movement_id', models.BigIntegerField(default=0)),
+                ('variant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='snapshots', to='inventory.productvariant')),
+            ],
+            options={
+                'unique_together': {('variant', 'date')},
+            },
+        ),
+        migrations.RunPython(opening_snapshots, migrations.RunPython.noop),
+    ]
@@ -1,9 +1,11 @@
-from django.db import models
+from django.db import models, transaction
+from django.utils import timezone
 from django.utils.text import slugify
 
 class Category(models.Model):
     name = models.CharField(max_length=100)
     slug = models.SlugField(unique=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True, null=True, blank=True, db_index=True)
 
     def save(self, *args, **kwargs):
         if not self.slug:
@@ -22,7 +24,7 @@ class Product(models.Model):
     description = models.TextField(blank=True, null=True)
     brand = models.CharField(max_length=100, blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
-    updated_at = models.DateTimeField(auto_now=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     def __str__(self):
         return self.name
@@ -39,10 +41,123 @@ class ProductVariant(models.Model):
     gst_rate = models.DecimalField(max_digits=5, decimal_places=2, default=0.00, help_text="GST Percentage (e.g. 18.00)")
     stock_quantity = models.PositiveIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True, null=True, blank=True)
-    updated_at = models.DateTimeField(auto_now=True, null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True, null=True, blank=True, db_index=True)
+
+    # Units sold (net of returns) over the last 7 and 30 days, and the stock
+    # level below which the variant runs out within LOW_STOCK_COVER_DAYS.
+    # Maintained by inventory.reorder.
+    units_7d = models.IntegerField(default=0, editable=False)
+    units_30d = models.IntegerField(default=0, editable=False)
+    reorder_point = models.PositiveIntegerField(default=0, editable=False)
+
+    VELOCITY_FIELDS = ('units_7d', 'units_30d', 'reorder_point')
 
     class Meta:
         unique_together = ('product', 'size', 'color')
+        indexes = [
+            models.Index(fields=['stock_quantity'], name='inventory_variant_stock_idx'),
+            # Stock left above the reorder point: <= 0 means running out. Any
+            # stock or velocity change moves a variant in or out of the range.
+            models.Index(models.F('stock_quantity') - models.F('reorder_point'), name='inventory_variant_cover_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        # Hand edits (admin, variants PUT) and new variants' opening stock go
+        # into the movement ledger; see inventory/ledger.py
+        from . import ledger
+
+        created = self._state.adding
+        if not created and not args and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            # The velocity columns belong to inventory.reorder: an instance read
+            # before a refresh must not write the old figures back
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.VELOCITY_FIELDS
+            ]
+        with transaction.atomic():
+            previous = ledger.stock_before_save(self, kwargs.get('update_fields'))
+            super().save(*args, **kwargs)
+            if previous is not None:
+                ledger.record_edit(self, previous, created)
 
     def __str__(self):
         return f"{self.product.name} ({self.size}/{self.color}) - {self.barcode}"
+
+
+class CatalogTombstone(models.Model):
+    """Records a deleted catalog row so syncing terminals can drop it too"""
+    KINDS = [
+        ('category', 'Category'),
+        ('product', 'Product'),
+        ('variant', 'Product Variant'),
+        ('wipe', 'Whole catalog'),
+    ]
+
+    kind = models.CharField(max_length=10, choices=KINDS)
+    object_id = models.BigIntegerField(default=0)
+    deleted_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.kind} {self.object_id} deleted {self.deleted_at}"
+
+
+class VariantSalesDay(models.Model):
+    """Units of a variant sold on a local date, net of that day's returns (inventory.reorder)"""
+    variant = models.ForeignKey(ProductVariant, related_name='sales_days', on_delete=models.CASCADE)
+    date = models.DateField(db_index=True)
+    units = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('variant', 'date')
+
+    def __str__(self):
+        return f"{self.variant_id} on {self.date}: {self.units}"
+
+
+class VelocityRefresh(models.Model):
+    """A day inventory.reorder slid the velocity windows to; refreshed_at is unset while the job is queued"""
+    date = models.DateField(unique=True)
+    refreshed_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.date}: {self.refreshed_at or 'queued'}"
+
+
+class InventoryMovement(models.Model):
+    """One signed change to a variant's stock (inventory.ledger). Append-only."""
+    SALE = 'SALE'
+    RETURN = 'RETURN'
+    ADJUSTMENT = 'ADJUSTMENT'
+    RECEIPT = 'RECEIPT'
+    KIND_CHOICES = [
+        (SALE, 'Sale'),
+        (RETURN, 'Return'),
+        (ADJUSTMENT, 'Adjustment'),
+        (RECEIPT, 'Receipt'),
+    ]
+
+    variant = models.ForeignKey(ProductVariant, related_name='movements', on_delete=models.CASCADE)
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    quantity = models.IntegerField(help_text="Units in (+) or out (-)")
+    reference = models.CharField(max_length=100, blank=True, help_text="Invoice / return number, or the source")
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def __str__(self):
+        return f"{self.kind} {self.quantity:+d} of {self.variant_id} ({self.reference})"
+
+
+class StockSnapshot(models.Model):
+    """
+    A variant's stock at the end of `date`: every movement with an id up to
+    `movement_id` applied (inventory.ledger).
+    """
+    variant = models.ForeignKey(ProductVariant, related_name='snapshots', on_delete=models.CASCADE)
+    date = models.DateField(db_index=True)
+    quantity = models.IntegerField()
+    movement_id = models.BigIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('variant', 'date')
+
+    def __str__(self):
+        return f"{self.variant_id} on {self.date}: {self.quantity}"
@@ -0,0 +1,207 @@
+"""
+Low-stock and reorder engine driven by sales velocity.
+
+Each checkout and return adds its units to VariantSalesDay (one upsert per
+document, net of returns) and recomputes, for the variants it touched
+only, three columns on ProductVariant:
+
+* units_7d / units_30d  units sold over the last 7 / 30 local days;
+* reorder_point         stock needed for LOW_STOCK_COVER_DAYS at the faster
+                        of the 7- and 30-day daily rates, rounded up.
+
+A variant is low on stock when stock_quantity <= reorder_point (it runs
+out within the cover period) or stock_quantity <= LOW_STOCK_THRESHOLD.
+Both sides are indexed, the first through an expression index on
+stock_quantity - reorder_point, so the low-stock list is an index range
+read however large the catalog is, and every stock change (checkout,
+return, edit, import) moves a variant in or out of it with no extra work.
+
+Windows slide with the calendar, so once a day refresh() recomputes the
+variants that still have sales in the window (only those can have
+changed) and prunes ledger days that have left it. It is a write over
+every such variant, so it never runs on a request: `manage.py
+refresh_stock_velocity` does it from cron (or rebuilds everything from
+sales history with --rebuild), and the first low-stock request of a day
+that finds no refresh recorded queues it as a background job
+(schedule_refresh). The day each refresh ran is kept in VelocityRefresh,
+so every process agrees on it.
+"""
+import math
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F, IntegerField, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Greatest, TruncDate
+from django.utils import timezone
+
+from .models import ProductVariant, VariantSalesDay, VelocityRefresh
+
+WINDOW_DAYS = 30
+SHORT_WINDOW_DAYS = 7
+BATCH_SIZE = 500
+REFRESH_TASK = 'inventory.refresh_stock_velocity'
+
+
+def _threshold():
+    return getattr(settings, 'LOW_STOCK_THRESHOLD', 5)
+
+
+def _cover_days():
+    return getattr(settings, 'LOW_STOCK_COVER_DAYS', 7)
+
+
+def _target_days():
+    return getattr(settings, 'REORDER_TARGET_DAYS', 30)
+
+
+def _units_since(since):
+    return Coalesce(Subquery(
+        VariantSalesDay.objects.filter(variant=OuterRef('pk'), date__gte=since)
+        .values('variant').annotate(total=Sum('units')).values('total'),
+        output_field=IntegerField(),
+    ), Value(0))
+
+
+def recompute(variant_ids, today=None):
+    """Refresh units_7d, units_30d and reorder_point for `variant_ids` from the ledger."""
+    today = today or timezone.localdate()
+    variant_ids = list(variant_ids)
+    units_7d = _units_since(today - timedelta(days=SHORT_WINDOW_DAYS - 1))
+    units_30d = _units_since(today - timedelta(days=WINDOW_DAYS - 1))
+    # ceil(max(u7 / 7, u30 / 30) * cover) in integer arithmetic
+    scale = SHORT_WINDOW_DAYS * WINDOW_DAYS
+    demand = Greatest(units_7d * WINDOW_DAYS, units_30d * SHORT_WINDOW_DAYS, Value(0)) * _cover_days()
+    for start in range(0, len(variant_ids), BATCH_SIZE):
+        ProductVariant.objects.filter(id__in=variant_ids[start:start + BATCH_SIZE]).update(
+            units_7d=units_7d,
+            units_30d=units_30d,
+            reorder_point=(demand + Value(scale - 1)) / Value(scale),
+        )
+
+
+def record_units(quantities, day):
+    """
+    Add `quantities` ({variant_id: units}, negative for returns) to `day`
+    and recompute those variants. Call inside the sale / return transaction.
+    """
+    quantities = {variant_id: units for variant_id, units in quantities.items() if units}
+    if not quantities:
+        return
+    table = VariantSalesDay._meta.db_table
+    rows = ', '.join(['(%s, %s, %s)'] * len(quantities))
+    params = [value for variant_id, units in sorted(quantities.items()) for value in (variant_id, day, units)]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {table} (variant_id, date, units) VALUES {rows} '
+            f'ON CONFLICT (variant_id, date) DO UPDATE SET units = {table}.units + excluded.units',
+            params,
+        )
+    recompute(quantities)
+
+
+def _refreshed(today):
+    VelocityRefresh.objects.update_or_create(date=today, defaults={'refreshed_at': timezone.now()})
+    VelocityRefresh.objects.filter(date__lt=today).delete()
+
+
+def refresh(today=None):
+    """Slide the windows to `today`: recompute variants in the ledger, prune days that left it."""
+    today = today or timezone.localdate()
+    since = today - timedelta(days=WINDOW_DAYS - 1)
+    with transaction.atomic():
+        # Every variant with figures still has ledger rows, at least until this prune
+        variant_ids = set(VariantSalesDay.objects.values_list('variant_id', flat=True).distinct())
+        VariantSalesDay.objects.filter(date__lt=since).delete()
+        recompute(variant_ids, today)
+    _refreshed(today)
+    return len(variant_ids)
+
+
+def schedule_refresh():
+    """
+    Queue today's refresh() as a background job unless it has run or been
+    queued already. One indexed read when it has; True when this call queued it.
+    """
+    from jobs import queue
+
+    today = timezone.localdate()
+    if VelocityRefresh.objects.filter(date=today).exists():
+        return False
+    try:
+        with transaction.atomic():
+            # The unique date lets one request through
+            VelocityRefresh.objects.create(date=today)
+            queue.enqueue(REFRESH_TASK)
+    except IntegrityError:
+        return False
+    return True
+
+
+def rebuild(today=None):
+    """Re-create the ledger for the current window from sale and return lines, and every variant's figures."""
+    from sales.models import ReturnItem, SaleItem
+
+    today = today or timezone.localdate()
+    since = today - timedelta(days=WINDOW_DAYS - 1)
+    tz = timezone.get_current_timezone()
+    start = timezone.make_aware(datetime.combine(since, time.min), tz)
+
+    units = {}
+    for row in SaleItem.objects.filter(sale__created_at__gte=start) \
+            .annotate(day=TruncDate('sale__created_at', tzinfo=tz)) \
+            .values('variant_id', 'day').annotate(units=Sum('quantity')).order_by():
+        units[row['variant_id'], row['day']] = row['units']
+    for row in ReturnItem.objects.filter(return_order__created_at__gte=start) \
+            .annotate(day=TruncDate('return_order__created_at', tzinfo=tz)) \
+            .values('sale_item__variant_id', 'day').annotate(units=Sum('quantity')).order_by():
+        key = (row['sale_item__variant_id'], row['day'])
+        units[key] = units.get(key, 0) - row['units']
+
+    with transaction.atomic():
+        # Variants with figures but no sales left in the window go back to zero
+        variant_ids = set(ProductVariant.objects.exclude(units_7d=0, units_30d=0, reorder_point=0)
+                          .values_list('id', flat=True))
+        VariantSalesDay.objects.all().delete()
+        VariantSalesDay.objects.bulk_create(
+            [VariantSalesDay(variant_id=variant_id, date=day, units=count)
+             for (variant_id, day), count in units.items() if count],
+            batch_size=BATCH_SIZE,
+        )
+        variant_ids.update(variant_id for variant_id, _ in units)
+        recompute(variant_ids, today)
+    _refreshed(today)
+    return len(variant_ids)
+
+
+def low_stock(threshold=None):
+    """
+    Variants at or below their reorder point or `threshold` units
+    (LOW_STOCK_THRESHOLD by default), least cover first.
+    """
+    threshold = _threshold() if threshold is None else threshold
+    return ProductVariant.objects.prefetch_related('product') \
+        .annotate(cover=F('stock_quantity') - F('reorder_point')) \
+        .filter(Q(cover__lte=0) | Q(stock_quantity__lte=threshold)) \
+        .order_by('cover', 'stock_quantity', 'id')
+
+
+def describe(variant):
+    """Velocity figures and a suggested order quantity for one low-stock variant."""
+    daily_rate = max(variant.units_7d / SHORT_WINDOW_DAYS, variant.units_30d / WINDOW_DAYS, 0)
+    # Enough for REORDER_TARGET_DAYS, and never short of clearing the flat threshold
+    target = max(math.ceil(daily_rate * _target_days()), _threshold() + 1)
+    return {
+        'id': variant.id,
+        'barcode': variant.barcode,
+        'product_name': variant.product.name,
+        'size': variant.size,
+        'color': variant.color,
+        'stock_quantity': variant.stock_quantity,
+        'units_7d': variant.units_7d,
+        'units_30d': variant.units_30d,
+        'daily_rate': round(daily_rate, 2),
+        'days_of_cover': round(variant.stock_quantity / daily_rate, 1) if daily_rate else None,
+        'reorder_point': variant.reorder_point,
+        'suggested_order': max(target - variant.stock_quantity, 0),
+    }
@@ -0,0 +1,321 @@
+"""
+Ranked catalog search over product name, brand, category, size, colour and
+barcode.
+
+The index holds one row per variant plus one per product (so products
+without variants are still found), keyed by variant id and by -product id:
+
+* SQLite: an FTS5 virtual table. Each query word is a prefix match ("kur"
+  finds Kurti) and results are ranked with bm25, product name weighted
+  highest. A word with no prefix match in the index vocabulary is swapped
+  for the closest indexed words, so "kurthi" still finds Kurti.
+* PostgreSQL: a plain table with a pg_trgm GIN index, matched with the
+  word-similarity operator and ranked by similarity, which handles prefixes
+  and typos in one go.
+
+Other databases, or a PostgreSQL where pg_trgm cannot be installed, get no
+index: available() is False and the search endpoint falls back to icontains.
+
+Signals in inventory.signals keep the index in step with Category, Product
+and ProductVariant saves and deletes. Code that writes searchable fields
+without signals (bulk_create, queryset.update, raw SQL) must call
+index_variants / index_products itself.
+"""
+import bisect
+import difflib
+import re
+import time
+
+from django.db import DatabaseError, connection, transaction
+
+TABLE = 'inventory_catalog_search'
+VOCAB_TABLE = 'inventory_catalog_search_vocab'
+
+# FTS5 columns in declaration order, with their bm25 weights
+SQLITE_COLUMNS = ('name', 'brand', 'category', 'size', 'color', 'barcode')
+SQLITE_WEIGHTS = (10.0, 4.0, 3.0, 2.0, 2.0, 1.0)
+
+MAX_WORDS = 8
+FUZZY_CUTOFF = 0.75
+FUZZY_MATCHES = 3
+VOCAB_TTL = 60  # seconds
+RANK_WINDOW = 2000
+
+_vocab = {'terms': {}, 'loaded_at': None}
+_available = {}
+
+
+def _rows_sql(variant_filter='WHERE 1 = 1', product_filter='WHERE 1 = 1'):
+    """Index rows: (key, product_id, variant_id, name, brand, category, size, color, barcode)."""
+    return f"""
+        SELECT v.id, p.id, v.id, p.name, COALESCE(p.brand, ''), c.name, v.size, v.color, v.barcode
+        FROM inventory_productvariant v
+        JOIN inventory_product p ON p.id = v.product_id
+        JOIN inventory_category c ON c.id = p.category_id
+        {variant_filter}
+        UNION ALL
+        SELECT -p.id, p.id, 0, p.name, COALESCE(p.brand, ''), c.name, '', '', ''
+        FROM inventory_product p
+        JOIN inventory_category c ON c.id = p.category_id
+        {product_filter}
+    """
+
+
+def _insert(cursor, vendor, variant_filter='WHERE 1 = 1', product_filter='WHERE 1 = 1', params=()):
+    rows = _rows_sql(variant_filter, product_filter)
+    if vendor == 'sqlite':
+        cursor.execute(
+            f"INSERT INTO {TABLE} (rowid, product_id, variant_id, {', '.join(SQLITE_COLUMNS)}) {rows}",
+            params,
+        )
+    else:
+        cursor.execute(
+            f"INSERT INTO {TABLE} (id, product_id, variant_id, document) "
+            f"SELECT key, product_id, variant_id, "
+            f"lower(concat_ws(' ', name, brand, category, size, color, barcode)) "
+            f"FROM ({rows}) AS s(key, product_id, variant_id, name, brand, category, size, color, barcode)",
+            params,
+        )
+
+
+def create_index(schema_editor):
+    """Create and fill the index. Used by migration 0005_catalog_search."""
+    db = schema_editor.connection
+    with db.cursor() as cursor:
+        if db.vendor == 'sqlite':
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE {TABLE} USING fts5("
+                f"{', '.join(SQLITE_COLUMNS)}, product_id UNINDEXED, variant_id UNINDEXED, "
+                "tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+            )
+            cursor.execute(f"CREATE VIRTUAL TABLE {VOCAB_TABLE} USING fts5vocab({TABLE}, 'row')")
+            # Make ORDER BY rank use the weighted bm25
+            weights = ', '.join(str(weight) for weight in SQLITE_WEIGHTS)
+            cursor.execute(f"INSERT INTO {TABLE} ({TABLE}, rank) VALUES ('rank', 'bm25({weights})')")
+        elif db.vendor == 'postgresql':
+            try:
+                with transaction.atomic(using=db.alias):
+                    cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+            except DatabaseError:
+                # Not allowed to install the extension: run without an index
+                return
+            cursor.execute(
+                f"CREATE TABLE {TABLE} (id bigint PRIMARY KEY, product_id bigint NOT NULL, "
+                "variant_id bigint NOT NULL, document text NOT NULL)"
+            )
+            cursor.execute(f"CREATE INDEX {TABLE}_trgm ON {TABLE} USING gin (document gin_trgm_ops)")
+        else:
+            return
+        _insert(cursor, db.vendor)
+
+
+def drop_index(schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f'DROP TABLE IF EXISTS {VOCAB_TABLE}')
+        cursor.execute(f'DROP TABLE IF EXISTS {TABLE}')
+
+
+def available():
+    """True when the current database has a search index."""
+    key = (connection.alias, connection.settings_dict['NAME'])
+    if key not in _available:
+        _available[key] = connection.vendor in ('sqlite', 'postgresql') and \
+            TABLE in connection.introspection.table_names()
+    return _available[key]
+
+
+def _placeholders(values):
+    return ', '.join(['%s'] * len(values))
+
+
+def _delete_keys(cursor, keys):
+    # This process sees its own changes in fuzzy matching straight away
+    _vocab['loaded_at'] = None
+    if keys:
+        column = 'rowid' if connection.vendor == 'sqlite' else 'id'
+        cursor.execute(f'DELETE FROM {TABLE} WHERE {column} IN ({_placeholders(keys)})', keys)
+
+
+def index_variants(variant_ids):
+    """(Re)index the given variants."""
+    variant_ids = list(variant_ids)
+    if not variant_ids or not available():
+        return
+    with connection.cursor() as cursor:
+        _delete_keys(cursor, variant_ids)
+        _insert(cursor, connection.vendor,
+                variant_filter=f'WHERE v.id IN ({_placeholders(variant_ids)})',
+                product_filter='WHERE 1 = 0',
+                params=variant_ids)
+
+
+def index_products(product_ids):
+    """(Re)index the given products and all their variants."""
+    from .models import ProductVariant
+
+    product_ids = list(product_ids)
+    if not product_ids or not available():
+        return
+    variant_ids = list(ProductVariant.objects.filter(product_id__in=product_ids).values_list('id', flat=True))
+    with connection.cursor() as cursor:
+        _delete_keys(cursor, variant_ids + [-pk for pk in product_ids])
+        _insert(cursor, connection.vendor,
+                variant_filter=f'WHERE v.product_id IN ({_placeholders(product_ids)})',
+                product_filter=f'WHERE p.id IN ({_placeholders(product_ids)})',
+                params=product_ids + product_ids)
+
+
+def remove_variants(variant_ids):
+    if available():
+        with connection.cursor() as cursor:
+            _delete_keys(cursor, list(variant_ids))
+
+
+def remove_products(product_ids):
+    if available():
+        with connection.cursor() as cursor:
+            _delete_keys(cursor, [-pk for pk in product_ids])
+
+
+def rebuild():
+    """Re-create every index row from the catalog tables."""
+    if not available():
+        return 0
+    _vocab['loaded_at'] = None
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE}')
+        _insert(cursor, connection.vendor)
+        cursor.execute(f'SELECT COUNT(*) FROM {TABLE}')
+        return cursor.fetchone()[0]
+
+
+def _words(query):
+    return re.findall(r'\w+', query.lower())[:MAX_WORDS]
+
+
+def search(query, limit=20, kind='variant'):
+    """
+    Ids of the variants (kind='variant') or products (kind='product')
+    matching `query`, best match first. Empty when there is no index.
+    """
+    words = _words(query)
+    if not words or not available():
+        return []
+    if connection.vendor == 'sqlite':
+        ids = _sqlite_search(' '.join(f'"{word}"*' for word in words), limit, kind)
+        if not ids:
+            expanded = _sqlite_fuzzy(words)
+            if expanded:
+                ids = _sqlite_search(expanded, limit, kind)
+        return ids
+    return _postgres_search(words, limit, kind)
+
+
+def _sqlite_search(match, limit, kind):
+    with connection.cursor() as cursor:
+        # bm25 costs a pass over every matching row. For broad prefixes
+        # ("ku") only the newest RANK_WINDOW matches are ranked: finding
+        # the window's edge is a walk down the doclist, far cheaper, and
+        # the plain rowid bound lets FTS5 start the ranking pass there.
+        # This suits search-as-you-type; ?search= on the list endpoints
+        # stays a complete icontains.
+        cursor.execute(
+            f"SELECT rowid FROM {TABLE} WHERE {TABLE} MATCH %s ORDER BY rowid DESC LIMIT 1 OFFSET %s",
+            [match, RANK_WINDOW - 1],
+        )
+        edge = cursor.fetchone()
+        window = f'AND rowid >= {int(edge[0])}' if edge and edge[0] > 0 else ''
+        if kind != 'product':
+            cursor.execute(
+                f"SELECT variant_id FROM {TABLE} WHERE {TABLE} MATCH %s AND variant_id != 0 {window} "
+                "ORDER BY rank LIMIT %s",
+                [match, limit],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+        # A product ranks by its best row (itself or any of its variants)
+        cursor.execute(
+            f"SELECT product_id, MIN(rank) FROM (SELECT product_id, rank FROM {TABLE} "
+            f"WHERE {TABLE} MATCH %s {window}) GROUP BY product_id ORDER BY MIN(rank) LIMIT %s",
+            [match, limit],
+        )
+        best = dict(cursor.fetchall())
+        if window:
+            # Product rows (negative rowids) fall outside the window; they
+            # are few, so rank them in a query of their own
+            cursor.execute(
+                f"SELECT product_id, rank FROM {TABLE} WHERE {TABLE} MATCH %s AND rowid < 0 "
+                "ORDER BY rank LIMIT %s",
+                [match, limit],
+            )
+            for product_id, rank in cursor.fetchall():
+                best[product_id] = min(rank, best.get(product_id, rank))
+        return sorted(best, key=best.get)[:limit]
+
+
+def _vocabulary():
+    """
+    Indexed words of three or more letters, as sorted lists keyed by first
+    letter. Barcodes and sizes are left out; typos in them are not
+    corrected. Reloaded at most every VOCAB_TTL seconds.
+    """
+    now = time.monotonic()
+    if _vocab['loaded_at'] is None or now - _vocab['loaded_at'] > VOCAB_TTL:
+        terms = {}
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT term FROM {VOCAB_TABLE} WHERE length(term) >= 3 AND term NOT GLOB '*[^a-z]*' ORDER BY term"
+            )
+            for (term,) in cursor.fetchall():
+                terms.setdefault(term[0], []).append(term)
+        _vocab['terms'] = terms
+        _vocab['loaded_at'] = now
+    return _vocab['terms']
+
+
+def _has_prefix(terms, word):
+    index = bisect.bisect_left(terms, word)
+    return index < len(terms) and terms[index].startswith(word)
+
+
+def _close_words(vocabulary, word):
+    """Indexed words close to `word`, or [] if it is a prefix of one. Assumes the first letter is right."""
+    terms = vocabulary.get(word[0], [])
+    if len(word) < 3 or _has_prefix(terms, word):
+        return []
+    terms = [term for term in terms if abs(len(term) - len(word)) <= 2]
+    return difflib.get_close_matches(word, terms, FUZZY_MATCHES, FUZZY_CUTOFF)
+
+
+def _sqlite_fuzzy(words):
+    """FTS5 query with misspelt words replaced by their closest indexed words, or None."""
+    vocabulary = _vocabulary()
+    parts = []
+    changed = False
+    for word in words:
+        close = _close_words(vocabulary, word)
+        if close:
+            changed = True
+            parts.append('(' + ' OR '.join(f'"{term}"' for term in close) + ')')
+        else:
+            parts.append(f'"{word}"*')
+    return ' '.join(parts) if changed else None
+
+
+def _postgres_search(words, limit, kind):
+    matches = ' AND '.join(['%s <%% document'] * len(words))
+    score = ' + '.join(['word_similarity(%s, document)'] * len(words))
+    with connection.cursor() as cursor:
+        if kind == 'product':
+            cursor.execute(
+                f"SELECT product_id FROM {TABLE} WHERE {matches} "
+                f"GROUP BY product_id ORDER BY MAX({score}) DESC LIMIT %s",
+                words + words + [limit],
+            )
+        else:
+            cursor.execute(
+                f"SELECT variant_id FROM {TABLE} WHERE variant_id <> 0 AND {matches} "
+                f"ORDER BY {score} DESC LIMIT %s",
+                words + words + [limit],
+            )
+        return [row[0] for row in cursor.fetchall()]
@@ -1,4 +1,5 @@
 from rest_framework import serializers
+from backend_proj.serializers import SparseFieldsMixin
 from .models import Category, Product, ProductVariant
 
 class CategorySerializer(serializers.ModelSerializer):
@@ -6,14 +7,14 @@ class CategorySerializer(serializers.ModelSerializer):
         model = Category
         fields = '__all__'
 
-class ProductVariantSerializer(serializers.ModelSerializer):
+class ProductVariantSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     product_name = serializers.ReadOnlyField(source='product.name')
 
     class Meta:
         model = ProductVariant
         fields = ['id', 'product', 'product_name', 'size', 'color', 'barcode', 'price_retail', 'stock_quantity', 'gst_rate', 'created_at']
 
-class ProductSerializer(serializers.ModelSerializer):
+class ProductSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     variants = ProductVariantSerializer(many=True, read_only=True)
     category_name = serializers.ReadOnlyField(source='category.name')
 
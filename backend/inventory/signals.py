@@ -0,0 +1,67 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import search
+from .cache import invalidate_variants
+from .models import Category, Product, ProductVariant
+from .sync import record_deletion
+
+
+@receiver([post_save, post_delete], sender=ProductVariant)
+def invalidate_variant(sender, instance, **kwargs):
+    invalidate_variants(instance.pk)
+
+
+@receiver(post_save, sender=Product)
+def invalidate_product_variants(sender, instance, created, **kwargs):
+    # Cached variants embed the product name
+    if not created:
+        invalidate_variants(*instance.variants.values_list('id', flat=True))
+
+
+@receiver(post_delete, sender=Category)
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=ProductVariant)
+def record_tombstone(sender, instance, **kwargs):
+    kind = {Category: 'category', Product: 'product', ProductVariant: 'variant'}[sender]
+    record_deletion(kind, instance.pk)
+
+
+# Fields that feed the search index; saves touching none of them skip reindexing
+SEARCHED_FIELDS = {
+    Category: {'name'},
+    Product: {'name', 'brand', 'category', 'category_id'},
+    ProductVariant: {'size', 'color', 'barcode', 'product', 'product_id'},
+}
+
+
+def _searched_fields_changed(sender, update_fields):
+    return update_fields is None or bool(SEARCHED_FIELDS[sender] & set(update_fields))
+
+
+@receiver(post_save, sender=ProductVariant)
+def index_variant(sender, instance, update_fields=None, **kwargs):
+    if _searched_fields_changed(sender, update_fields):
+        search.index_variants([instance.pk])
+
+
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, update_fields=None, **kwargs):
+    if _searched_fields_changed(sender, update_fields):
+        search.index_products([instance.pk])
+
+
+@receiver(post_save, sender=Category)
+def index_category(sender, instance, created, update_fields=None, **kwargs):
+    if not created and _searched_fields_changed(sender, update_fields):
+        search.index_products(instance.products.values_list('id', flat=True))
+
+
+@receiver(post_delete, sender=ProductVariant)
+def unindex_variant(sender, instance, **kwargs):
+    search.remove_variants([instance.pk])
+
+
+@receiver(post_delete, sender=Product)
+def unindex_product(sender, instance, **kwargs):
+    search.remove_products([instance.pk])
@@ -0,0 +1,87 @@
+"""
+Atomic stock mutations.
+
+Stock is only ever changed with single UPDATE statements that compute the
+new value in the database (F() expressions), never by reading a variant,
+adjusting it in Python and saving it back. Decrements are conditional on
+enough stock being left, so two tills selling the last piece cannot both
+succeed and neither can overwrite the other's change.
+"""
+from functools import reduce
+from operator import or_
+
+from django.db.models import Case, F, IntegerField, Q, When
+from django.utils import timezone
+from rest_framework import serializers
+from rest_framework.exceptions import ErrorDetail
+
+from .cache import invalidate_variants
+from .models import ProductVariant
+
+
+class InsufficientStock(serializers.ValidationError):
+    """One or more lines asked for more than is on the shelf."""
+    default_code = 'insufficient_stock'
+
+    def __init__(self, short_lines):
+        self.short_lines = short_lines
+        message = "Insufficient stock for " + "; ".join(
+            f"{line['name']} (requested {line['requested']}, available {line['available']})"
+            for line in short_lines
+        )
+        super().__init__(message, code=self.default_code)
+        # Keep quantities as numbers rather than letting DRF stringify them
+        self.detail = {
+            'error': ErrorDetail(message, code=self.default_code),
+            'short_lines': short_lines,
+        }
+
+
+def _by_variant(quantities, expression):
+    return Case(
+        *(When(id=variant_id, then=expression(quantity)) for variant_id, quantity in quantities.items()),
+        output_field=IntegerField(),
+    )
+
+
+def decrement_stock(quantities, variants):
+    """
+    Take `quantities` ({variant_id: qty}) off the shelf in one statement.
+
+    `variants` maps the same ids to ProductVariant instances and is only used
+    to name short lines. Raises InsufficientStock listing every line that
+    could not be fulfilled; the caller's transaction must then roll back,
+    since the lines that did fit have already been decremented.
+    """
+    stamp = timezone.now()
+    updated = ProductVariant.objects.filter(
+        reduce(or_, (Q(id=variant_id, stock_quantity__gte=quantity) for variant_id, quantity in quantities.items()))
+    ).update(
+        stock_quantity=_by_variant(quantities, lambda quantity: F('stock_quantity') - quantity),
+        updated_at=stamp,
+    )
+
+    if updated != len(quantities):
+        # Rows carrying our timestamp were decremented; the rest were short
+        current = ProductVariant.objects.filter(id__in=quantities).exclude(updated_at=stamp)
+        raise InsufficientStock([
+            {
+                'variant': variant_id,
+                'barcode': variants[variant_id].barcode,
+                'name': str(variants[variant_id]),
+                'requested': quantities[variant_id],
+                'available': stock,
+            }
+            for variant_id, stock in current.order_by('id').values_list('id', 'stock_quantity')
+        ])
+
+    invalidate_variants(*quantities)
+
+
+def increment_stock(quantities):
+    """Put `quantities` ({variant_id: qty}) back on the shelf in one statement."""
+    ProductVariant.objects.filter(id__in=quantities).update(
+        stock_quantity=_by_variant(quantities, lambda quantity: F('stock_quantity') + quantity),
+        updated_at=timezone.now(),
+    )
+    invalidate_variants(*quantities)
@@ -0,0 +1,176 @@
+"""
+Delta catalog sync for terminals that keep a local copy of the catalog.
+
+A terminal calls GET /api/catalog/sync/ once for everything, then
+?since=<token> with the token from its previous response to get only the
+categories, products and variants changed since, plus the ids deleted
+since (from CatalogTombstone). Rows come back as column lists + row arrays
+instead of one object per row, which keeps large payloads small.
+
+Tokens are an encoded timestamp. The token handed out is backdated by
+SYNC_TOKEN_OVERLAP, so a row written by a transaction that committed just
+after the response was built is still picked up next time; clients upsert
+by id, so seeing a row twice is harmless.
+
+The ETag is the newest change anywhere in the catalog. Each of those
+lookups is a MAX over an indexed column, so an up-to-date terminal sending
+If-None-Match costs a handful of index reads and a 304. It is only offered
+once the newest change is older than the caller's token: a change inside
+the overlap window may sit behind a transaction that has not committed yet.
+
+achanges() / aetag() are the same for the async view, with each section's
+read on its own connection at once (backend_proj.concurrency).
+"""
+from datetime import datetime, timedelta, timezone as dt_timezone
+from functools import partial
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import Max
+from django.utils import timezone
+from rest_framework import serializers
+
+from backend_proj.concurrency import parallel
+
+from .models import CatalogTombstone, Category, Product, ProductVariant
+
+COLUMNS = {
+    'categories': ('id', 'name', 'slug'),
+    'products': ('id', 'category', 'name', 'brand', 'description'),
+    'variants': ('id', 'product', 'size', 'color', 'barcode', 'price_retail', 'gst_rate', 'stock_quantity'),
+}
+
+MODELS = {
+    'categories': Category,
+    'products': Product,
+    'variants': ProductVariant,
+}
+
+# Tombstone kind for each section
+KINDS = {
+    'categories': 'category',
+    'products': 'product',
+    'variants': 'variant',
+}
+
+
+def _overlap():
+    return timedelta(seconds=getattr(settings, 'SYNC_TOKEN_OVERLAP', 5))
+
+
+def _retention():
+    return timedelta(days=getattr(settings, 'SYNC_TOMBSTONE_RETENTION_DAYS', 30))
+
+
+def encode_token(moment):
+    return str(int(moment.timestamp() * 1_000_000))
+
+
+def decode_token(token):
+    try:
+        return datetime.fromtimestamp(int(token) / 1_000_000, tz=dt_timezone.utc)
+    except (TypeError, ValueError, OverflowError, OSError):
+        raise serializers.ValidationError({'since': 'Invalid sync token.'})
+
+
+def _latest(model, field='updated_at'):
+    return model.objects.aggregate(latest=Max(field))['latest']
+
+
+def _version(latest):
+    latest = [moment for moment in latest if moment is not None]
+    return encode_token(max(latest)) if latest else None
+
+
+def catalog_version():
+    """Token of the most recent change to the catalog, or None when empty."""
+    return _version([_latest(model) for model in MODELS.values()] + [_latest(CatalogTombstone, 'deleted_at')])
+
+
+async def acatalog_version():
+    """catalog_version(), with the lookups run concurrently."""
+    return _version(await parallel(
+        *(partial(_latest, model) for model in MODELS.values()),
+        partial(_latest, CatalogTombstone, 'deleted_at'),
+    ))
+
+
+def _etag(version, token):
+    if version is None or not token or decode_token(token) < decode_token(version):
+        return None
+    return version
+
+
+def etag(token=None):
+    return _etag(catalog_version(), token)
+
+
+async def aetag(token=None):
+    return _etag(await acatalog_version(), token)
+
+
+def needs_full_sync(since):
+    """True when deletions since `since` may no longer be on record."""
+    if since < timezone.now() - _retention():
+        return True
+    return CatalogTombstone.objects.filter(kind='wipe', deleted_at__gte=since).exists()
+
+
+def _rows(section, since):
+    qs = MODELS[section].objects.order_by('id')
+    if since is not None:
+        qs = qs.filter(updated_at__gte=since)
+    return {'columns': COLUMNS[section], 'rows': list(qs.values_list(*COLUMNS[section]))}
+
+
+def _deleted(since):
+    deleted = {section: [] for section in KINDS}
+    if since is not None:
+        sections = {kind: section for section, kind in KINDS.items()}
+        for kind, object_id in (
+            CatalogTombstone.objects.filter(deleted_at__gte=since, kind__in=list(sections))
+            .order_by('id').values_list('kind', 'object_id')
+        ):
+            deleted[sections[kind]].append(object_id)
+    return deleted
+
+
+def _start(token):
+    """(payload header, `since` for the queries: None for a full sync)."""
+    now = timezone.now()
+    since = decode_token(token) if token else None
+    full = since is None or needs_full_sync(since)
+    return {'token': encode_token(now - _overlap()), 'full': full}, None if full else since
+
+
+def changes(token=None):
+    """Payload for GET /api/catalog/sync/?since=`token`."""
+    payload, since = _start(token)
+    for section in MODELS:
+        payload[section] = _rows(section, since)
+    payload['deleted'] = _deleted(since)
+    return payload
+
+
+async def achanges(token=None):
+    """changes(), with the sections read concurrently."""
+    payload, since = await sync_to_async(_start)(token)
+    *sections, deleted = await parallel(
+        *(partial(_rows, section, since) for section in MODELS),
+        partial(_deleted, since),
+    )
+    payload.update(zip(MODELS, sections))
+    payload['deleted'] = deleted
+    return payload
+
+
+def record_deletion(kind, object_id):
+    CatalogTombstone.objects.create(kind=kind, object_id=object_id)
+    # Keep the table bounded; deletions are rare so this is cheap enough here
+    CatalogTombstone.objects.filter(deleted_at__lt=timezone.now() - _retention()).delete()
+
+
+def record_wipe():
+    """The whole catalog was dropped: every terminal must start over."""
+    CatalogTombstone.objects.all().delete()
+    CatalogTombstone.objects.create(kind='wipe')
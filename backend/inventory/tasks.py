@@ -0,0 +1,39 @@
+"""
+Background jobs for inventory (jobs.queue): the data reset and supplier
+sheet imports, queued by their endpoints with ?background=1, and the daily
+sales-velocity refresh, queued by the low-stock endpoint.
+"""
+import io
+
+from jobs.queue import task
+from sales import purge
+
+from . import importer, reorder
+
+
+def reset_database():
+    """Wipe every sale, return and catalog row (sales.purge); the response / job result."""
+    return {"message": "Database reset successfully!", **purge.reset()}
+
+
+@task('inventory.reset_database')
+def reset_database_job(job):
+    return reset_database()
+
+
+@task(reorder.REFRESH_TASK)
+def refresh_stock_velocity(job):
+    return {'variants': reorder.refresh()}
+
+
+@task('inventory.import_variants')
+def import_variants(job, filename, dry_run=False):
+    """The uploaded sheet is the job's payload; its rows are streamed, a chunk at a time."""
+    extension = importer.format_for(filename)
+    total = importer.count_rows(io.BytesIO(job.payload), extension)
+    job.set_progress(0, total)
+    report = importer.import_variants(
+        importer.READERS[extension](io.BytesIO(job.payload)), dry_run=dry_run,
+        progress=lambda done: job.set_progress(done, message=f'{done} of {total} rows' if total else f'{done} rows'),
+    )
+    return report.as_dict()
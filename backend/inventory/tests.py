@@ -1,3 +1,559 @@
-from django.test import TestCase
+import io
+import json
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from jobs.models import Job
+from sales.tests import SalesFixtureMixin
+from . import importer, ledger, reorder, search
+from .cache import variant_cache
+from .models import (
+    Category, InventoryMovement, Product, ProductVariant, StockSnapshot, VariantSalesDay, VelocityRefresh,
+)
+
+
+class BarcodeLookupTests(TestCase):
+    def setUp(self):
+        variant_cache.clear()
+        self.client = APIClient()
+        category = Category.objects.create(name='Sarees')
+        self.product = Product.objects.create(category=category, name='Pure Silk Saree')
+        self.variant = ProductVariant.objects.create(
+            product=self.product, size='Free Size', color='Red', barcode='CLT100001',
+            price_retail=2500, gst_rate=5, stock_quantity=4,
+        )
+
+    def test_lookup_returns_variant(self):
+        response = self.client.get('/api/variants/by-barcode/CLT100001/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['id'], self.variant.id)
+        self.assertEqual(response.data['product_name'], 'Pure Silk Saree')
+
+    def test_unknown_barcode_is_404(self):
+        response = self.client.get('/api/variants/by-barcode/NOPE/')
+        self.assertEqual(response.status_code, 404)
+
+    @override_settings(DATA_GENERATION_RECHECK=60)  # no generation read on the hit
+    def test_repeat_scan_is_served_from_cache(self):
+        self.client.get('/api/variants/by-barcode/CLT100001/')
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/variants/by-barcode/CLT100001/')
+        self.assertEqual(response.data['stock_quantity'], 4)
+
+    def test_stock_change_invalidates_cache(self):
+        self.client.get('/api/variants/by-barcode/CLT100001/')
+        self.variant.stock_quantity = 3
+        self.variant.save()
+        response = self.client.get('/api/variants/by-barcode/CLT100001/')
+        self.assertEqual(response.data['stock_quantity'], 3)
+
+    def test_product_rename_invalidates_cache(self):
+        self.client.get('/api/variants/by-barcode/CLT100001/')
+        self.product.name = 'Banarasi Silk Saree'
+        self.product.save()
+        response = self.client.get('/api/variants/by-barcode/CLT100001/')
+        self.assertEqual(response.data['product_name'], 'Banarasi Silk Saree')
+
+    def test_barcode_edit_drops_old_code(self):
+        self.client.get('/api/variants/by-barcode/CLT100001/')
+        self.variant.barcode = 'CLT100002'
+        self.variant.save()
+        self.assertEqual(self.client.get('/api/variants/by-barcode/CLT100001/').status_code, 404)
+        self.assertEqual(self.client.get('/api/variants/by-barcode/CLT100002/').status_code, 200)
+
+    def test_cache_is_bounded(self):
+        cache = type(variant_cache)(max_size=2)
+        for i in range(3):
+            cache.set(f'B{i}', {'id': i})
+        self.assertEqual(len(cache), 2)
+        self.assertIsNone(cache.get('B0'))
+
+
+@override_settings(SYNC_TOKEN_OVERLAP=0)
+class CatalogSyncTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.category = Category.objects.create(name='Kurtas')
+        self.product = Product.objects.create(category=self.category, name='Cotton Kurta')
+        self.variants = [
+            ProductVariant.objects.create(
+                product=self.product, size=size, color='White', barcode=f'KRT{size}',
+                price_retail=899, gst_rate=5, stock_quantity=10,
+            )
+            for size in ('S', 'M', 'L')
+        ]
+
+    def sync(self, token=None, **headers):
+        return self.client.get('/api/catalog/sync/', {'since': token} if token else {}, **headers)
+
+    def rows(self, response, section):
+        columns = response.data[section]['columns']
+        return [dict(zip(columns, row)) for row in response.data[section]['rows']]
+
+    def test_full_sync_is_columnar(self):
+        response = self.sync()
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data['full'])
+        variants = self.rows(response, 'variants')
+        self.assertEqual([v['barcode'] for v in variants], ['KRTS', 'KRTM', 'KRTL'])
+        self.assertEqual(variants[0]['product'], self.product.id)
+        self.assertEqual(self.rows(response, 'products')[0]['category'], self.category.id)
+
+    def test_delta_returns_only_changes_and_tombstones(self):
+        token = self.sync().data['token']
+        self.variants[0].stock_quantity = 9
+        self.variants[0].save()
+        deleted_id = self.variants[2].id
+        self.variants[2].delete()
+
+        response = self.sync(token)
+        self.assertFalse(response.data['full'])
+        self.assertEqual([v['id'] for v in self.rows(response, 'variants')], [self.variants[0].id])
+        self.assertEqual(response.data['products']['rows'], [])
+        self.assertEqual(response.data['deleted']['variants'], [deleted_id])
+
+    def test_up_to_date_terminal_gets_304(self):
+        first = self.sync()
+        etag = self.sync(first.data['token'])['ETag']
+        response = self.sync(first.data['token'], HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        self.product.name = 'Cotton Kurta (Slim)'
+        self.product.save()
+        response = self.sync(first.data['token'], HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['products']['rows']), 1)
+
+    def test_reset_forces_full_sync(self):
+        token = self.sync().data['token']
+        self.client.post('/api/reset-database/')
+        response = self.sync(token)
+        self.assertTrue(response.data['full'])
+        self.assertEqual(response.data['variants']['rows'], [])
+
+    def test_bad_token_is_400(self):
+        self.assertEqual(self.sync('yesterday').status_code, 400)
+
+
+class AsyncReadPathTests(TransactionTestCase):
+    """ASGI variants of the barcode and catalog sync reads."""
+
+    def setUp(self):
+        variant_cache.clear()
+        self.client = APIClient()
+        category = Category.objects.create(name='Kurtas')
+        self.product = Product.objects.create(category=category, name='Cotton Kurta')
+        self.variants = [
+            ProductVariant.objects.create(
+                product=self.product, size=size, color='White', barcode=f'KRT{size}',
+                price_retail=899, gst_rate=5, stock_quantity=10,
+            )
+            for size in ('S', 'M', 'L')
+        ]
+
+    @override_settings(DATA_GENERATION_RECHECK=60)  # no generation read on the hit
+    def test_barcode_lookup_matches_sync_view(self):
+        expected = json.loads(self.client.get('/api/variants/by-barcode/KRTM/').content)
+        variant_cache.clear()
+        response = self.client.get('/api/async/variants/by-barcode/KRTM/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), expected)
+        with self.assertNumQueries(0):
+            self.client.get('/api/async/variants/by-barcode/KRTM/')
+        self.assertEqual(self.client.get('/api/async/variants/by-barcode/NOPE/').status_code, 404)
+
+    @override_settings(SYNC_TOKEN_OVERLAP=0)
+    def test_catalog_sync_matches_sync_view(self):
+        expected = json.loads(self.client.get('/api/catalog/sync/').content)
+        full = self.client.get('/api/async/catalog/sync/').json()
+        # Tokens are the time of the read
+        self.assertEqual({**full, 'token': None}, {**expected, 'token': None})
+
+        token = full['token']
+        self.variants[0].stock_quantity = 9
+        self.variants[0].save()
+        delta = self.client.get('/api/async/catalog/sync/', {'since': token})
+        expected = json.loads(self.client.get('/api/catalog/sync/', {'since': token}).content)
+        self.assertEqual({**delta.json(), 'token': None}, {**expected, 'token': None})
+        self.assertEqual(len(delta.json()['variants']['rows']), 1)
+
+        token = delta.json()['token']
+        etag = self.client.get('/api/async/catalog/sync/', {'since': token})['ETag']
+        response = self.client.get('/api/async/catalog/sync/', {'since': token}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(self.client.get('/api/async/catalog/sync/', {'since': 'yesterday'}).status_code, 400)
+
+
+class CatalogSearchTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        ethnic = Category.objects.create(name='Ethnic Wear')
+        self.kurti = Product.objects.create(category=ethnic, name='Anarkali Kurti', brand='Biba')
+        self.saree = Product.objects.create(category=ethnic, name='Cotton Saree', brand='Fabindia')
+        self.red_kurti = ProductVariant.objects.create(
+            product=self.kurti, size='M', color='Red', barcode='KUR001', price_retail=1299, gst_rate=5,
+        )
+        self.blue_kurti = ProductVariant.objects.create(
+            product=self.kurti, size='L', color='Blue', barcode='KUR002', price_retail=1299, gst_rate=5,
+        )
+        self.saree_variant = ProductVariant.objects.create(
+            product=self.saree, size='Free Size', color='Red', barcode='SAR001', price_retail=2499, gst_rate=5,
+        )
+
+    def ids(self, response):
+        return [row['id'] for row in response.data]
+
+    def test_prefix_and_attribute_match(self):
+        self.assertTrue(search.available())
+        response = self.client.get('/api/variants/search/', {'q': 'kur red'})
+        self.assertEqual(self.ids(response), [self.red_kurti.id])
+
+    def test_name_outranks_other_columns(self):
+        response = self.client.get('/api/variants/search/', {'q': 'red'})
+        self.assertEqual(set(self.ids(response)), {self.red_kurti.id, self.saree_variant.id})
+        response = self.client.get('/api/variants/search/', {'q': 'saree'})
+        self.assertEqual(self.ids(response)[0], self.saree_variant.id)
+
+    def test_typo_tolerance(self):
+        response = self.client.get('/api/variants/search/', {'q': 'kurthi'})
+        self.assertEqual(set(self.ids(response)), {self.red_kurti.id, self.blue_kurti.id})
+
+    def test_index_follows_edits_and_deletes(self):
+        self.kurti.name = 'Straight Kurta'
+        self.kurti.save()
+        self.assertEqual(self.ids(self.client.get('/api/variants/search/', {'q': 'anarkali'})), [])
+        self.assertEqual(len(self.ids(self.client.get('/api/variants/search/', {'q': 'straight'}))), 2)
+
+        self.saree.category.name = 'Festive'
+        self.saree.category.save()
+        self.assertEqual(len(self.ids(self.client.get('/api/variants/search/', {'q': 'festive'}))), 3)
+
+        self.blue_kurti.delete()
+        self.assertEqual(self.ids(self.client.get('/api/variants/search/', {'q': 'blue'})), [])
+
+    def test_search_param_is_complete(self):
+        # ?search= is not capped or windowed by the index, and finds barcode substrings
+        response = self.client.get('/api/products/', {'search': 'fabind'})
+        self.assertEqual([p['id'] for p in response.data['results']], [self.saree.id])
+        response = self.client.get('/api/variants/', {'search': 'UR00'})
+        self.assertEqual({v['id'] for v in response.data['results']}, {self.red_kurti.id, self.blue_kurti.id})
+
+    def test_rank_window_keeps_products_without_variants(self):
+        empty = Product.objects.create(category=self.kurti.category, name='Kurti Dupatta Set')
+        with mock.patch.object(search, 'RANK_WINDOW', 1):
+            self.assertEqual(set(search.search('kurti', kind='product')), {self.kurti.id, empty.id})
+
+    def test_rank_window_bounds_the_fts_scan(self):
+        with mock.patch.object(search, 'RANK_WINDOW', 1), CaptureQueriesContext(connection) as ctx:
+            self.assertTrue(search.search('kurti'))
+        ranked = ctx.captured_queries[-1]['sql']
+        self.assertIn('rowid >=', ranked)
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {ranked}')
+            plan = ' '.join(row[-1] for row in cursor.fetchall())
+        # FTS5 lists the rowid constraints it takes on after the MATCH (M)
+        self.assertRegex(plan, r'VIRTUAL TABLE INDEX \d+:M\d*>')
+
+    def test_rebuild(self):
+        self.assertEqual(search.rebuild(), 3 + 2)
+        self.assertEqual(len(search.search('kurti')), 2)
+
+
+class VariantImportTests(TestCase):
+    HEADER = 'Category,Product,Brand,Size,Colour,Barcode,MRP,GST,Stock\n'
+
+    def setUp(self):
+        self.client = APIClient()
+        category = Category.objects.create(name='Kurtis')
+        product = Product.objects.create(category=category, name='Single Long Kurti')
+        self.existing = ProductVariant.objects.create(
+            product=product, size='M', color='Red', barcode='CLT500001',
+            price_retail=799, gst_rate=5, stock_quantity=2,
+        )
+
+    def upload(self, body, name='sheet.csv', **data):
+        upload = SimpleUploadedFile(name, body.encode())
+        return self.client.post('/api/variants/import/', {'file': upload, **data}, format='multipart')
+
+    def test_upsert_by_barcode(self):
+        response = self.upload(self.HEADER + (
+            'Kurtis,single long kurti,,M,Red,CLT500001,849,5,6\n'
+            'Sarees,Pure Silk Saree,Nalli,Free Size,Maroon,CLT600001,4999,5,3\n'
+            'Sarees,Pure Silk Saree,Nalli,Free Size,Gold,CLT600002,5499,5,1\n'
+        ))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['created'], response.data['updated']), (2, 1))
+        self.existing.refresh_from_db()
+        self.assertEqual((self.existing.price_retail, self.existing.stock_quantity), (Decimal('849.00'), 6))
+        saree = Product.objects.get(name='Pure Silk Saree')
+        self.assertEqual((saree.category.name, saree.brand, saree.variants.count()), ('Sarees', 'Nalli', 2))
+        self.assertEqual(search.search('maroon silk'), [ProductVariant.objects.get(barcode='CLT600001').id])
+
+    def test_bad_rows_are_reported_and_skipped(self):
+        response = self.upload(self.HEADER + (
+            'Kurtis,Single Long Kurti,,L,Blue,CLT500002,abc,5,1\n'
+            'Kurtis,Single Long Kurti,,M,Red,CLT500099,799,5,1\n'
+            'Kurtis,Single Long Kurti,,XL,Blue,,799,5,1\n'
+            'Kurtis,Single Long Kurti,,S,Blue,CLT500003,799,5,1\n'
+        ))
+        self.assertEqual(response.data['created'], 1)
+        self.assertEqual([(e['row'], sorted(e['errors'])) for e in response.data['errors']],
+                         [(2, ['price_retail']), (4, ['barcode']), (3, ['barcode'])])
+        self.assertTrue(ProductVariant.objects.filter(barcode='CLT500003').exists())
+
+    def test_products_match_ignoring_case(self):
+        # As typed before names were title-cased
+        saree = Product.objects.create(category=self.existing.product.category, name='Cotton saree')
+        response = self.upload(self.HEADER + 'Sarees,COTTON SAREE,,Free Size,Blue,CLT700001,999,5,4\n')
+        self.assertEqual(response.data['created'], 1)
+        self.assertEqual(ProductVariant.objects.get(barcode='CLT700001').product_id, saree.id)
+        self.assertEqual(Product.objects.filter(name__iexact='cotton saree').count(), 1)
+
+    def test_overlong_cells_fail_their_row(self):
+        response = self.upload(self.HEADER + (
+            f"Sarees,{'Silk ' * 41},,Free Size,Blue,CLT700001,999,5,4\n"
+            f"{'Festive ' * 13},Cotton Saree,,Free Size,Blue,CLT700002,999,5,4\n"
+            f"Sarees,Cotton Saree,{'B' * 101},Free Size,Blue,CLT700003,999,5,4\n"
+            'Sarees,Cotton Saree,,Free Size,Blue,CLT700004,999,5,4\n'
+        ))
+        self.assertEqual([(e['row'], list(e['errors'])) for e in response.data['errors']],
+                         [(2, ['product']), (3, ['category']), (4, ['brand'])])
+        self.assertEqual(response.data['created'], 1)
+
+    def test_missing_stock_column_leaves_stock_alone(self):
+        self.upload('category,product,size,color,barcode,price_retail\n'
+                    'Kurtis,Single Long Kurti,M,Red,CLT500001,899\n')
+        self.existing.refresh_from_db()
+        self.assertEqual((self.existing.price_retail, self.existing.stock_quantity), (Decimal('899.00'), 2))
+
+    def test_dry_run_saves_nothing(self):
+        response = self.upload(self.HEADER + 'Sarees,Cotton Saree,,Free Size,Blue,CLT700001,999,5,4\n',
+                               dry_run='true')
+        self.assertEqual(response.data['created'], 1)
+        self.assertFalse(ProductVariant.objects.filter(barcode='CLT700001').exists())
+        self.assertFalse(Product.objects.filter(name='Cotton Saree').exists())
+
+    def test_queries_per_chunk_do_not_grow_with_rows(self):
+        def queries(count, offset):
+            # Each chunk of 20 rows brings its own category and products
+            sheet = self.HEADER + ''.join(
+                f'Range {n // 20},Saree {n // 20} {n % 5},,Free Size,Shade {n},CLT8{n:05d},999,5,1\n'
+                for n in range(offset, offset + count)
+            )
+            with CaptureQueriesContext(connection) as ctx:
+                importer.import_variants(importer.read_csv(io.StringIO(sheet)), chunk_size=20)
+            return len(ctx)
+        # A chunk's upsert and its ledger rows are one executemany each.
+        # One more per import starts the new catalog generation.
+        self.assertEqual(queries(80, 100) - 1, 4 * (queries(10, 0) - 1))
+
+    def test_unsupported_file_is_400(self):
+        self.assertEqual(self.upload('x', name='sheet.pdf').status_code, 400)
+        self.assertEqual(self.upload('barcode\nX1\n').status_code, 400)
+
+    def test_command_reads_xlsx(self):
+        from openpyxl import Workbook
+
+        workbook = Workbook()
+        workbook.active.append(['Category', 'Product', 'Size', 'Colour', 'Barcode', 'MRP', 'Stock'])
+        workbook.active.append(['Kurtis', 'Single Long Kurti', 'L', 'Green', 'CLT900001', 1099, 12])
+        with tempfile.NamedTemporaryFile(suffix='.xlsx') as sheet:
+            workbook.save(sheet.name)
+            call_command('import_variants', sheet.name, stdout=io.StringIO(), stderr=io.StringIO())
+            with open(sheet.name, 'rb') as stream:
+                self.assertEqual(importer.count_rows(stream, 'xlsx'), 1)
+        self.assertEqual(ProductVariant.objects.get(barcode='CLT900001').stock_quantity, 12)
+
+
+@override_settings(LOW_STOCK_THRESHOLD=5, LOW_STOCK_COVER_DAYS=7, REORDER_TARGET_DAYS=30)
+class ReorderTests(SalesFixtureMixin, TestCase):
+    def setUp(self):
+        # Its own catalog; only the mixin's checkout and return helpers are used
+        cache.clear()
+        self.client = APIClient()
+        product = Product.objects.create(category=Category.objects.create(name='Kurtis'), name='Anarkali Kurti')
+        self.fast, self.slow, self.idle = [
+            ProductVariant.objects.create(product=product, size=size, color='Teal', barcode=f'CLT6{n:05d}',
+                                          price_retail=1200, gst_rate=5, stock_quantity=stock)
+            for n, (size, stock) in enumerate([('M', 30), ('L', 3), ('XL', 100)])
+        ]
+
+    def figures(self, variant):
+        variant.refresh_from_db()
+        return variant.units_7d, variant.units_30d, variant.reorder_point
+
+    def test_stale_save_keeps_velocity(self):
+        stale = ProductVariant.objects.get(pk=self.fast.pk)
+        self.checkout([self.fast], 21)
+        stale.price_retail = Decimal('1100.00')
+        stale.save()
+        self.assertEqual(self.figures(self.fast), (21, 21, 21))
+        self.assertEqual(self.fast.price_retail, Decimal('1100.00'))
+
+    def test_checkout_and_return_update_velocity(self):
+        sale = self.checkout([self.fast], 21)
+        # 3 a day for 7 days of cover
+        self.assertEqual(self.figures(self.fast), (21, 21, 21))
+        self.process_return(sale, 7)
+        self.assertEqual(self.figures(self.fast), (14, 14, 14))
+        self.assertEqual(self.figures(self.idle), (0, 0, 0))
+        self.assertEqual(VariantSalesDay.objects.get(variant=self.fast).units, 14)
+
+    def test_low_stock_list(self):
+        self.checkout([self.fast], 21)  # 9 left, reorder point 21
+        response = self.client.get('/api/inventory/low-stock/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row['id'] for row in response.data], [self.fast.id, self.slow.id])
+        fast = response.data[0]
+        self.assertEqual((fast['stock_quantity'], fast['reorder_point']), (9, 21))
+        self.assertEqual((fast['daily_rate'], fast['days_of_cover']), (3.0, 3.0))
+        self.assertEqual(fast['suggested_order'], 81)  # 30 days at 3 a day
+        # No sales: topped up past the flat threshold
+        self.assertEqual((response.data[1]['days_of_cover'], response.data[1]['suggested_order']), (None, 3))
+
+        ProductVariant.objects.filter(pk=self.fast.pk).update(stock_quantity=50)
+        response = self.client.get('/api/inventory/low-stock/', {'threshold': 0})
+        self.assertEqual(response.data, [])
+        self.assertEqual(self.client.get('/api/inventory/low-stock/', {'limit': 'x'}).status_code, 400)
+
+    def test_windows_slide(self):
+        self.checkout([self.fast], 21)
+        today = timezone.localdate()
+        reorder.refresh(today + timedelta(days=7))
+        # Only the 30-day rate is left: 21 / 30 a day for 7 days, rounded up
+        self.assertEqual(self.figures(self.fast), (0, 21, 5))
+        self.assertEqual(reorder.refresh(today + timedelta(days=30)), 1)
+        self.assertEqual(self.figures(self.fast), (0, 0, 0))
+        self.assertFalse(VariantSalesDay.objects.exists())
+
+    def test_rebuild_matches_checkout_path(self):
+        self.checkout([self.fast], 4)
+        self.checkout([self.slow], 2)
+        before = [self.figures(variant) for variant in (self.fast, self.slow, self.idle)]
+        ProductVariant.objects.filter(pk=self.idle.pk).update(units_30d=9, reorder_point=3)
+        out = io.StringIO()
+        call_command('refresh_stock_velocity', '--rebuild', stdout=out)
+        self.assertIn('3 variants', out.getvalue())
+        self.assertEqual([self.figures(variant) for variant in (self.fast, self.slow, self.idle)], before)
+
+    def test_refresh_is_queued_once_a_day(self):
+        self.checkout([self.fast], 21)
+        VariantSalesDay.objects.update(date=timezone.localdate() - timedelta(days=10))
+        self.client.get('/api/inventory/low-stock/')
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get('/api/inventory/low-stock/')
+        self.assertEqual(len(ctx), 3)  # the day's refresh, the list and its products
+        # The request only queued it
+        self.assertEqual(Job.objects.get().name, reorder.REFRESH_TASK)
+        self.assertEqual(self.figures(self.fast), (21, 21, 21))
+
+        call_command('run_worker', processes=0, once=True, stdout=io.StringIO())
+        self.assertEqual(self.figures(self.fast), (0, 21, 5))
+        self.assertIsNotNone(VelocityRefresh.objects.get(date=timezone.localdate()).refreshed_at)
+        self.client.get('/api/inventory/low-stock/')
+        self.assertEqual(Job.objects.count(), 1)
+
+
+class StockLedgerTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        product = Product.objects.create(category=Category.objects.create(name='Sarees'), name='Chanderi Saree')
+        self.variant = ProductVariant.objects.create(
+            product=product, size='Free Size', color='Ivory', barcode='CLT300001',
+            price_retail=3200, gst_rate=5, stock_quantity=10,
+        )
+
+    def movements(self):
+        return list(self.variant.movements.order_by('id').values_list('kind', 'quantity', 'reference'))
+
+    def test_every_stock_change_is_recorded(self):
+        sale = self.client.post('/api/sales/', {
+            'payment_mode': 'CASH', 'items': [{'variant': self.variant.id, 'quantity': 3, 'unit_price': '0'}],
+        }, format='json').data
+        self.client.post('/api/returns/', {
+            'original_sale': sale['id'], 'items': [{'sale_item': sale['items'][0]['id'], 'quantity': 1}],
+        }, format='json')
+        self.client.patch(f'/api/variants/{self.variant.id}/', {'stock_quantity': 6}, format='json')
+        self.client.patch(f'/api/variants/{self.variant.id}/', {'price_retail': '3400.00'}, format='json')
+        return_number = self.variant.movements.get(kind='RETURN').reference
+        self.assertEqual(self.movements(), [
+            ('RECEIPT', 10, 'opening stock'),
+            ('SALE', -3, sale['invoice_number']),
+            ('RETURN', 1, return_number),
+            ('ADJUSTMENT', -2, 'edit'),
+        ])
+        self.assertEqual(ledger.reconcile(), [])
+
+    def test_import_records_receipts_and_adjustments(self):
+        upload = SimpleUploadedFile('sheet.csv', (
+            'Category,Product,Size,Colour,Barcode,MRP,Stock\n'
+            'Sarees,Chanderi Saree,Free Size,Ivory,CLT300001,3200,4\n'
+            'Sarees,Chanderi Saree,Free Size,Rust,CLT300002,3200,7\n'
+        ).encode())
+        self.client.post('/api/variants/import/', {'file': upload}, format='multipart')
+        self.assertEqual(self.movements()[-1], ('ADJUSTMENT', -6, 'import'))
+        self.assertEqual(list(InventoryMovement.objects.filter(variant__barcode='CLT300002')
+                              .values_list('kind', 'quantity')), [('RECEIPT', 7)])
+        self.assertEqual(ledger.reconcile(), [])
+
+    def test_stock_on_date_from_snapshots(self):
+        today = timezone.localdate()
+        ledger.record({self.variant.id: -4}, InventoryMovement.SALE, 'INV-1')
+        ledger.record({self.variant.id: 5}, InventoryMovement.RECEIPT, 'PO-1')
+        # Opening stock ten days ago, the sale five days ago, the receipt today
+        movements = list(self.variant.movements.order_by('id'))
+        for movement, days_ago in zip(movements, (10, 5, 0)):
+            InventoryMovement.objects.filter(pk=movement.pk).update(created_at=timezone.now() - timedelta(days=days_ago))
+
+        self.assertEqual(ledger.take_snapshots(today - timedelta(days=7)), 1)
+        self.assertEqual(ledger.take_snapshots(today - timedelta(days=7)), 0)  # already taken
+        self.assertEqual(ledger.take_snapshots(), 1)
+        self.assertEqual(list(self.variant.snapshots.order_by('date').values_list('quantity', 'movement_id')),
+                         [(10, movements[0].id), (6, movements[1].id)])
+        with self.assertRaises(ValueError):
+            ledger.take_snapshots(today)
+
+        with self.assertNumQueries(1):
+            self.assertEqual(ledger.stock_on(self.variant.id, today - timedelta(days=6)), 10)
+        self.assertEqual(ledger.stock_on(self.variant.id, today - timedelta(days=5)), 6)
+        self.assertEqual(ledger.stock_on(self.variant.id, today), 11)
+        self.assertEqual(ledger.stock_on(self.variant.id, today - timedelta(days=10)), 10)
+        response = self.client.get(f'/api/variants/{self.variant.id}/stock/', {'date': str(today - timedelta(days=1))})
+        self.assertEqual(response.data['stock_quantity'], 6)
+        self.assertEqual(self.client.get('/api/variants/999999/stock/').status_code, 404)
+
+    def test_dates_before_the_ledger_are_refused(self):
+        today = timezone.localdate()
+        # Opening snapshot three days ago, taken before the ledger recorded anything
+        self.variant.movements.all().delete()
+        StockSnapshot.objects.create(variant=self.variant, date=today - timedelta(days=3), quantity=10)
+        self.assertEqual(ledger.stock_on(self.variant.id, today - timedelta(days=3)), 10)
+        with self.assertRaisesMessage(ValueError, f'from {today - timedelta(days=3)} on'):
+            ledger.stock_on(self.variant.id, today - timedelta(days=4))
+        response = self.client.get(f'/api/variants/{self.variant.id}/stock/', {'date': str(today - timedelta(days=4))})
+        self.assertEqual(response.status_code, 400)
+
+        StockSnapshot.objects.all().delete()
+        self.assertEqual(self.client.get(f'/api/variants/{self.variant.id}/stock/').status_code, 400)
+
+    def test_reconcile_flags_untracked_changes(self):
+        StockSnapshot.objects.create(variant=self.variant, date=timezone.localdate() - timedelta(days=1),
+                                     quantity=10, movement_id=self.variant.movements.get().id)
+        ProductVariant.objects.filter(pk=self.variant.pk).update(stock_quantity=8)  # bypasses the ledger
+        with self.assertNumQueries(1):
+            self.assertEqual(ledger.reconcile(), [(self.variant.id, 'CLT300001', 8, 10)])
+        out = io.StringIO()
+        with self.assertRaisesMessage(CommandError, '1 variant(s) disagree'):
+            call_command('reconcile_stock', stdout=out)
+        self.assertIn('stock 8, ledger 10 (-2)', out.getvalue())
@@ -1,40 +1,108 @@
+from datetime import date
+
 from rest_framework import viewsets, filters, status
 from rest_framework.response import Response
-from django.db.models import ProtectedError
+from django.db.models import ProtectedError, Q
+from django.utils import timezone
 from .models import Category, Product, ProductVariant
 from rest_framework import viewsets, filters, status
 from rest_framework.response import Response
-from rest_framework.decorators import api_view
+from rest_framework.decorators import api_view, action
 from django.db.models import ProtectedError
 from .models import Category, Product, ProductVariant
-from sales.models import Sale, Return
 from .serializers import CategorySerializer, ProductSerializer, ProductVariantSerializer
+from .cache import variant_cache
+from . import importer, ledger, reorder, search, sync, tasks
+from rest_framework.parsers import MultiPartParser
+from django.http import JsonResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
+from django.views.decorators.http import condition, require_GET
+from rest_framework.exceptions import ValidationError
+from rest_framework.utils.encoders import JSONEncoder
+from backend_proj.pagination import IdCursorPagination
+from jobs.queue import enqueue
+from jobs.views import accepted, background_requested
 
 @api_view(['POST'])
 def reset_database(request):
     """
-    DANGEROUS: Wipes all data to start fresh.
+    DANGEROUS: Wipes all data to start fresh, with raw bulk deletes
+    (sales/purge.py); reports the rows removed per table and the time taken.
+    With ?background=1 the wipe is queued as a job (202; see /api/jobs/).
     """
+    if background_requested(request):
+        return accepted(request, enqueue('inventory.reset_database'))
     try:
-        # 1. Delete Returns (Dependent on Sales)
-        Return.objects.all().delete()
-        # 2. Delete Sales (Dependent on Products/Variants)
-        Sale.objects.all().delete()
-        # 3. Delete Inventory
-        ProductVariant.objects.all().delete()
-        Product.objects.all().delete()
-        Category.objects.all().delete()
-        
-        return Response({"message": "Database reset successfully!"}, status=status.HTTP_200_OK)
+        return Response(tasks.reset_database(), status=status.HTTP_200_OK)
     except Exception as e:
         return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+@api_view(['GET'])
+@condition(etag_func=lambda request: sync.etag(request.GET.get('since')))
+def catalog_sync(request):
+    """
+    Catalog changes since ?since=<token> (everything without it), in
+    columnar form, with tombstones for deleted rows. See inventory/sync.py.
+    """
+    return Response(sync.changes(request.query_params.get('since')))
+
+@api_view(['GET'])
+def low_stock(request):
+    """
+    Variants to reorder: at or below their reorder point (sales velocity
+    x LOW_STOCK_COVER_DAYS) or ?threshold= units (LOW_STOCK_THRESHOLD),
+    least cover first, up to ?limit= (default 100, max 500). Each comes with
+    its 7/30-day sales, days of cover and a suggested order. See
+    inventory/reorder.py.
+    """
+    try:
+        limit = min(max(int(request.query_params.get('limit', 100)), 1), 500)
+        threshold = request.query_params.get('threshold')
+        threshold = max(int(threshold), 0) if threshold not in (None, '') else None
+    except ValueError:
+        return Response({"detail": "limit and threshold must be whole numbers."}, status=status.HTTP_400_BAD_REQUEST)
+    reorder.schedule_refresh()
+    return Response([reorder.describe(variant) for variant in reorder.low_stock(threshold)[:limit]])
+
+@require_GET
+async def catalog_sync_async(request):
+    """/api/catalog/sync/ for ASGI deployments, with the sections read concurrently."""
+    token = request.GET.get('since')
+    try:
+        tag = await sync.aetag(token)
+        if tag is not None:
+            tag = quote_etag(tag)
+            not_modified = get_conditional_response(request, etag=tag)
+            if not_modified is not None:
+                return not_modified
+        response = JsonResponse(await sync.achanges(token), encoder=JSONEncoder)
+    except ValidationError as exc:
+        return JsonResponse(exc.detail, status=status.HTTP_400_BAD_REQUEST)
+    if tag is not None:
+        response['ETag'] = tag
+    return response
+
+
+@require_GET
+async def variant_by_barcode_async(request, code):
+    """/api/variants/by-barcode/<code>/ for ASGI deployments, through the async ORM."""
+    data = await variant_cache.aget(code)
+    if data is None:
+        variant = await ProductVariant.objects.select_related('product').filter(barcode=code).afirst()
+        if variant is None:
+            return JsonResponse({"detail": f"No variant with barcode '{code}'."}, status=status.HTTP_404_NOT_FOUND)
+        data = ProductVariantSerializer(variant).data
+        variant_cache.set(code, data)
+    return JsonResponse(data, encoder=JSONEncoder)
+
 class CategoryViewSet(viewsets.ModelViewSet):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
+    pagination_class = None # Small lookup table, the UI needs all of it for dropdowns
 
 class ProductViewSet(viewsets.ModelViewSet):
-    queryset = Product.objects.all()
+    queryset = Product.objects.select_related('category').prefetch_related('variants').order_by('-created_at')
     serializer_class = ProductSerializer
     filter_backends = [filters.SearchFilter]
     search_fields = ['name', 'brand']
@@ -49,11 +117,96 @@ class ProductViewSet(viewsets.ModelViewSet):
             )
 
 class ProductVariantViewSet(viewsets.ModelViewSet):
-    queryset = ProductVariant.objects.all()
+    queryset = ProductVariant.objects.select_related('product')
     serializer_class = ProductVariantSerializer
+    pagination_class = IdCursorPagination # created_at is NULL on older rows
     filter_backends = [filters.SearchFilter]
     search_fields = ['barcode', 'product__name'] # Allow scanning barcode to find item
 
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        """
+        Search-as-you-type: up to ?limit= (default 20, max 50) variants
+        matching ?q=, best match first.
+        """
+        query = request.query_params.get('q', '')
+        try:
+            limit = min(max(int(request.query_params.get('limit', 20)), 1), 50)
+        except ValueError:
+            limit = 20
+        if search.available():
+            ids = search.search(query, limit=limit)
+            variants = self.get_queryset().in_bulk(ids)
+            results = [variants[pk] for pk in ids if pk in variants]
+        else:
+            # No index on this database: unranked icontains, as ?search= does
+            matches = Q()
+            for word in query.split():
+                matches &= Q(barcode__icontains=word) | Q(product__name__icontains=word)
+            results = list(self.get_queryset().filter(matches)[:limit]) if query.strip() else []
+        return Response(self.get_serializer(results, many=True).data)
+
+    @action(detail=False, methods=['get'], url_path=r'by-barcode/(?P<code>[^/]+)')
+    def by_barcode(self, request, code=None):
+        """
+        Exact barcode lookup for the till scanner. Uses the unique barcode
+        index and serves repeat scans from the in-process variant cache.
+        """
+        data = variant_cache.get(code)
+        if data is None:
+            variant = ProductVariant.objects.select_related('product').filter(barcode=code).first()
+            if variant is None:
+                return Response({"detail": f"No variant with barcode '{code}'."}, status=status.HTTP_404_NOT_FOUND)
+            # Serialized without the request so ?fields= never leaks into the cache
+            data = ProductVariantSerializer(variant).data
+            variant_cache.set(code, data)
+        return Response(data)
+
+    @action(detail=True, methods=['get'])
+    def stock(self, request, pk=None):
+        """
+        Stock at the end of ?date=YYYY-MM-DD (today by default), from the
+        movement ledger: the latest snapshot plus the movements after it.
+        400 for a date before the variant's ledger starts.
+        """
+        try:
+            day = date.fromisoformat(request.query_params['date']) if request.query_params.get('date') else timezone.localdate()
+        except ValueError:
+            return Response({"date": ["Use YYYY-MM-DD."]}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            quantity = ledger.stock_on(pk, day)
+        except ValueError as exc:
+            return Response({"date": [str(exc)]}, status=status.HTTP_400_BAD_REQUEST)
+        if quantity is None:
+            return Response({"detail": "Not found."}, status=status.HTTP_404_NOT_FOUND)
+        return Response({'id': int(pk), 'date': day, 'stock_quantity': quantity})
+
+    @action(detail=False, methods=['post'], url_path='import', parser_classes=[MultiPartParser])
+    def import_sheet(self, request):
+        """
+        Upload a supplier sheet (multipart `file`, .csv or .xlsx) to create or
+        update variants by barcode. `dry_run=true` validates without saving.
+        Same rules as `manage.py import_variants`. With ?background=1 the
+        sheet is imported by a job (202; the report is its result).
+        """
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({"file": ["No file was submitted."]}, status=status.HTTP_400_BAD_REQUEST)
+        dry_run = request.data.get('dry_run', '').lower() in ('1', 'true', 'yes')
+        if background_requested(request):
+            try:
+                importer.format_for(upload.name)
+            except importer.ImportFormatError as exc:
+                return Response({"file": [str(exc)]}, status=status.HTTP_400_BAD_REQUEST)
+            job = enqueue('inventory.import_variants', payload=upload.read(), filename=upload.name, dry_run=dry_run)
+            return accepted(request, job)
+        try:
+            rows = importer.READERS[importer.format_for(upload.name)](upload)
+            report = importer.import_variants(rows, dry_run=dry_run)
+        except importer.ImportFormatError as exc:
+            return Response({"file": [str(exc)]}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(report.as_dict())
+
     def destroy(self, request, *args, **kwargs):
         try:
             return super().destroy(request, *args, **kwargs)
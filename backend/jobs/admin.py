@@ -0,0 +1,14 @@
+from django.contrib import admin
+from .models import Job
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'name', 'status', 'done', 'total', 'created_at', 'finished_at')
+    list_filter = ('status', 'name')
+    exclude = ('payload',)
+    readonly_fields = ('name', 'params', 'status', 'done', 'total', 'message', 'result', 'error', 'worker',
+                       'created_at', 'started_at', 'finished_at')
+
+    def has_add_permission(self, request):
+        return False
@@ -0,0 +1,78 @@
+"""
+Generations of cached data shared by every process.
+
+Each web process caches analytics responses, GST days and scanned
+variants, and drops them when it changes the data itself. Bulk changes
+mostly happen in another process: a job in `run_worker`, or a command run
+from cron. They call bump(), which writes a new value for the named
+generation to the database:
+
+* catalog  variants in bulk (reset, sheet import): the variant LRU
+* sales    sales history in bulk (reset, rollup rebuild): analytics
+           responses and GST days
+* purge    the retention cutoff (sales.purge): the GST report's cutoff
+
+Readers put current(name) in their cache keys, or drop their entries when
+it changes. Each process trusts what it last read for
+DATA_GENERATION_RECHECK seconds, so a cache hit costs no query. A bump
+takes effect at once in the process that made it, and everywhere else
+within that interval.
+"""
+import threading
+import time
+from time import time_ns
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from .models import Generation
+
+NAMES = ('catalog', 'sales', 'purge')
+
+_lock = threading.Lock()
+_values = {}
+_read_at = None
+
+
+def _recheck():
+    return getattr(settings, 'DATA_GENERATION_RECHECK', 1.0)
+
+
+def _fresh():
+    return _read_at is not None and time.monotonic() - _read_at < _recheck()
+
+
+def current(name):
+    """The generation `name` as of at most DATA_GENERATION_RECHECK seconds ago."""
+    global _read_at
+    if not _fresh():
+        values = dict(Generation.objects.filter(name__in=NAMES).values_list('name', 'value'))
+        with _lock:
+            _values.clear()
+            _values.update(values)
+            _read_at = time.monotonic()
+    return _values.get(name, 0)
+
+
+async def acurrent(name):
+    if _fresh():
+        return _values.get(name, 0)
+    return await sync_to_async(current)(name)
+
+
+def bump(*names):
+    """Start new generations of `names` in every process. Call once the change has committed."""
+    value = time_ns()
+    Generation.objects.bulk_create(
+        [Generation(name=name, value=value) for name in names],
+        update_conflicts=True, unique_fields=['name'], update_fields=['value'],
+    )
+    with _lock:
+        _values.update(dict.fromkeys(names, value))
+
+
+def forget():
+    """Read the generations afresh on next use (tests)."""
+    global _read_at
+    with _lock:
+        _read_at = None
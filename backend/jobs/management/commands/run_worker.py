@@ -0,0 +1,73 @@
+import multiprocessing
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from jobs import queue, worker
+from jobs.models import Job
+
+
+class Command(BaseCommand):
+    help = 'Run queued background jobs (reset, imports, reports, rebuilds) in a pool of processes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=getattr(settings, 'JOB_WORKER_PROCESSES', 2),
+                            help='Jobs run at once, each in its own process; 0 runs them in this process')
+        parser.add_argument('--poll', type=float, default=getattr(settings, 'JOB_POLL_INTERVAL', 1.0),
+                            help='Seconds between looks at an empty queue')
+        parser.add_argument('--once', action='store_true', help='Exit once the queue is empty')
+
+    def handle(self, *args, **options):
+        self.identity = queue.identity()
+        recovered = queue.recover()
+        if recovered:
+            self.stdout.write(self.style.WARNING(f'Failed {recovered} job(s) left running by a stopped worker.'))
+        if options['processes'] > 0:
+            self.pooled(options['processes'], options['poll'], options['once'])
+        else:
+            self.inline(options['poll'], options['once'])
+
+    def inline(self, poll, once):
+        while True:
+            job_id = queue.claim(self.identity)
+            if job_id is not None:
+                self.report(job_id, queue.run(job_id))
+            elif once:
+                return
+            else:
+                time.sleep(poll)
+
+    def pooled(self, processes, poll, once):
+        # spawn: pool processes share no connections or locks with this one
+        context = multiprocessing.get_context('spawn')
+        while True:
+            with ProcessPoolExecutor(processes, mp_context=context, initializer=worker.setup,
+                                     initargs=(worker.databases(),)) as pool:
+                running = {}
+                try:
+                    while True:
+                        while len(running) < processes:
+                            job_id = queue.claim(self.identity)
+                            if job_id is None:
+                                break
+                            running[pool.submit(worker.execute, job_id)] = job_id
+                        if not running:
+                            if once:
+                                return
+                            time.sleep(poll)
+                            continue
+                        finished, _ = wait(running, timeout=poll, return_when=FIRST_COMPLETED)
+                        for future in finished:
+                            self.report(running.pop(future), future.result())
+                except BrokenProcessPool:
+                    # A pool process died (killed, out of memory): fail what it was running and start afresh
+                    queue.abandon(list(running.values()), 'The worker process exited before the job finished.')
+                    for job_id in running.values():
+                        self.report(job_id, Job.objects.get(pk=job_id).status)
+
+    def report(self, job_id, status):
+        style = self.style.SUCCESS if status == Job.SUCCEEDED else self.style.ERROR
+        self.stdout.write(style(f'Job {job_id}: {status}'))
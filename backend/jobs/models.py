@@ -0,0 +1,62 @@
+from django.db import models
+from django.utils import timezone
+from rest_framework.utils.encoders import JSONEncoder
+
+
+class Job(models.Model):
+    """A unit of background work, run by `manage.py run_worker` (jobs.queue)."""
+    QUEUED = 'QUEUED'
+    RUNNING = 'RUNNING'
+    SUCCEEDED = 'SUCCEEDED'
+    FAILED = 'FAILED'
+    STATUS_CHOICES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (SUCCEEDED, 'Succeeded'),
+        (FAILED, 'Failed'),
+    ]
+
+    name = models.CharField(max_length=100, help_text="Registered task, e.g. inventory.reset_database")
+    params = models.JSONField(default=dict, blank=True)
+    # Uploaded file for the task (e.g. a supplier sheet); never sent back over the API
+    payload = models.BinaryField(null=True, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    done = models.PositiveIntegerField(default=0)
+    total = models.PositiveIntegerField(null=True, blank=True)
+    message = models.CharField(max_length=255, blank=True)
+    # Encoded as the API renders it, so a job's result reads like the endpoint's response
+    result = models.JSONField(null=True, blank=True, encoder=JSONEncoder)
+    error = models.TextField(blank=True)
+    worker = models.CharField(max_length=100, blank=True, help_text="host:pid of the run_worker that claimed it")
+    created_at = models.DateTimeField(default=timezone.now)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # run_worker claims the oldest queued job
+            models.Index(fields=['status', 'id'], name='jobs_job_status_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} #{self.pk} ({self.status})"
+
+    @property
+    def finished(self):
+        return self.status in (self.SUCCEEDED, self.FAILED)
+
+    def set_progress(self, done, total=None, message=''):
+        """Record progress; visible to status requests once any transaction around the call commits."""
+        self.done, self.message = done, message[:255]
+        if total is not None:
+            self.total = total
+        Job.objects.filter(pk=self.pk).update(done=self.done, total=self.total, message=self.message)
+
+
+class Generation(models.Model):
+    """A shared generation of cached data (jobs.generation), bumped by bulk changes from any process."""
+    name = models.CharField(max_length=20, unique=True)
+    value = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.name} {self.value}"
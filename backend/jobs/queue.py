@@ -0,0 +1,119 @@
+"""
+Database-backed job queue: no broker, so it runs on a single box.
+
+Heavy operations (data reset, supplier sheet imports, GST reports, rollup
+rebuilds) are registered as tasks in each app's tasks.py:
+
+    @task('sales.rebuild_rollups')
+    def rebuild_rollups(job, start=None, end=None):
+        ...
+        return {'sales_rows': ...}
+
+An endpoint enqueues one with enqueue() and answers 202 at once;
+`manage.py run_worker` claims queued jobs oldest first and runs them in a
+pool of processes, each with its own database connection. A task gets its
+Job (for job.set_progress()) and the job's params as keyword arguments,
+and returns a JSON-serialisable result; an exception fails the job with
+its message. Status, progress and the result are read from /api/jobs/.
+
+Claiming is a conditional UPDATE, so several run_worker processes can share
+the queue. A job left RUNNING by a worker that died is failed by the next
+run_worker started on the same host (recover()), not retried: a task may
+have done part of its work.
+
+Jobs run in other processes, so clearing a cache there would not reach
+the web workers. Tasks that change data in bulk (reset, imports, rollup
+rebuilds) start a new generation in the database instead (jobs.generation),
+which every process's caches follow within DATA_GENERATION_RECHECK seconds.
+"""
+import logging
+import os
+import socket
+
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+TASKS = {}
+
+CLAIM_CANDIDATES = 10
+
+
+def task(name):
+    """Register the decorated function as the task `name`."""
+    def register(function):
+        TASKS[name] = function
+        return function
+    return register
+
+
+def enqueue(name, payload=None, **params):
+    """Queue task `name` with JSON-serialisable `params` (and bytes `payload`); returns the Job."""
+    if name not in TASKS:
+        raise LookupError(f"No task named '{name}'.")
+    return Job.objects.create(name=name, params=params, payload=payload)
+
+
+def identity():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def claim(worker):
+    """Mark the oldest queued job RUNNING for `worker`; its id, or None when the queue is empty."""
+    candidates = Job.objects.filter(status=Job.QUEUED).order_by('id').values_list('id', flat=True)
+    for job_id in candidates[:CLAIM_CANDIDATES]:
+        # Another worker may have taken it since the read
+        if Job.objects.filter(pk=job_id, status=Job.QUEUED).update(
+                status=Job.RUNNING, worker=worker, started_at=timezone.now()):
+            return job_id
+    return None
+
+
+def finish(job_id, status, result=None, error=''):
+    Job.objects.filter(pk=job_id).update(status=status, result=result, error=error, finished_at=timezone.now())
+
+
+def run(job_id):
+    """Run a claimed job in this process and record how it ended; returns its final status."""
+    job = Job.objects.get(pk=job_id)
+    try:
+        function = TASKS.get(job.name)
+        if function is None:
+            raise LookupError(f"No task named '{job.name}'.")
+        result = function(job, **job.params)
+    except Exception as exc:
+        logger.exception('Job %s (%s) failed', job_id, job.name)
+        finish(job_id, Job.FAILED, error=f'{type(exc).__name__}: {exc}')
+        return Job.FAILED
+    finish(job_id, Job.SUCCEEDED, result=result)
+    return Job.SUCCEEDED
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def recover(host=None):
+    """Fail jobs left RUNNING by run_worker processes on `host` (this one) that no longer exist."""
+    host = host or socket.gethostname()
+    orphaned = [
+        job_id for job_id, worker in Job.objects.filter(status=Job.RUNNING, worker__startswith=f'{host}:')
+        .values_list('id', 'worker')
+        if not _alive(int(worker.rsplit(':', 1)[1]))
+    ]
+    return abandon(orphaned, 'The worker stopped before the job finished.')
+
+
+def abandon(job_ids, error):
+    """Fail those of `job_ids` still RUNNING (their process is gone); returns how many."""
+    return Job.objects.filter(pk__in=job_ids, status=Job.RUNNING).update(
+        status=Job.FAILED, error=error, finished_at=timezone.now(),
+    )
@@ -0,0 +1,17 @@
+from rest_framework import serializers
+from .models import Job
+
+class JobSerializer(serializers.ModelSerializer):
+    percent = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Job
+        fields = ['id', 'name', 'status', 'done', 'total', 'percent', 'message', 'error',
+                  'created_at', 'started_at', 'finished_at']
+
+    def get_percent(self, job):
+        if job.status == Job.SUCCEEDED:
+            return 100
+        if not job.total:
+            return None
+        return min(100, job.done * 100 // job.total)
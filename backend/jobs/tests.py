@@ -0,0 +1,176 @@
+import io
+import json
+import os
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+from decimal import Decimal
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from rest_framework.test import APIClient
+
+from inventory.models import Category, Product, ProductVariant
+from sales.models import DailySalesRollup, Sale, SaleItem
+from . import queue
+from .models import Job
+
+
+class JobQueueTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        category = Category.objects.create(name='Kurtis')
+        product = Product.objects.create(category=category, name='Single Long Kurti')
+        self.variant = ProductVariant.objects.create(
+            product=product, size='M', color='Red', barcode='CLT500001',
+            price_retail=Decimal('500.00'), gst_rate=Decimal('5.00'), stock_quantity=10,
+        )
+
+    def work(self):
+        """Run everything queued, in this process."""
+        out = io.StringIO()
+        call_command('run_worker', processes=0, once=True, stdout=out)
+        return out.getvalue()
+
+    def job(self, response):
+        self.assertEqual(response.status_code, 202)
+        self.assertTrue(response['Location'].endswith(f"/api/jobs/{response.data['id']}/"))
+        self.assertEqual(response.data['status'], Job.QUEUED)
+        return response.data['id']
+
+    def test_reset_in_background(self):
+        job_id = self.job(self.client.post('/api/reset-database/?background=1'))
+        # Nothing happens until a worker picks it up
+        self.assertTrue(ProductVariant.objects.exists())
+        self.assertEqual(self.client.get(f'/api/jobs/{job_id}/result/').status_code, 202)
+
+        self.assertIn(f'Job {job_id}: SUCCEEDED', self.work())
+        self.assertFalse(ProductVariant.objects.exists())
+        status = self.client.get(f'/api/jobs/{job_id}/').data
+        self.assertEqual((status['status'], status['percent']), (Job.SUCCEEDED, 100))
+        result = self.client.get(f'/api/jobs/{job_id}/result/').data
+        self.assertEqual((result['message'], result['tables']['inventory_productvariant']), ("Database reset successfully!", 1))
+
+    def test_import_reports_progress(self):
+        rows = ''.join(f'Sarees,Cotton Saree,,Free Size,Colour {i},CLT70{i:04d},999,5,4\n' for i in range(5))
+        upload = SimpleUploadedFile('sheet.csv', ('Category,Product,Brand,Size,Colour,Barcode,MRP,GST,Stock\n' + rows).encode())
+        job_id = self.job(self.client.post('/api/variants/import/?background=1', {'file': upload}, format='multipart'))
+        self.work()
+
+        job = Job.objects.get(pk=job_id)
+        self.assertEqual((job.done, job.total, job.message), (5, 5, '5 of 5 rows'))
+        result = self.client.get(f'/api/jobs/{job_id}/result/').data
+        self.assertEqual((result['rows'], result['created']), (5, 5))
+        self.assertEqual(ProductVariant.objects.filter(product__name='Cotton Saree').count(), 5)
+
+    def test_unsupported_sheet_is_rejected_up_front(self):
+        upload = SimpleUploadedFile('sheet.pdf', b'%PDF')
+        response = self.client.post('/api/variants/import/?background=1', {'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Job.objects.exists())
+
+    def test_gst_report_result_matches_endpoint(self):
+        sale = Sale.objects.create(payment_mode='CASH', total_amount=Decimal('525.00'), gst_total=Decimal('25.00'))
+        SaleItem.objects.create(sale=sale, variant=self.variant, quantity=1,
+                                unit_price=Decimal('500.00'), total_price=Decimal('500.00'))
+        expected = json.loads(self.client.get('/api/reports/gst/', {'days': 7}).content)
+        job_id = self.job(self.client.get('/api/reports/gst/', {'days': 7, 'background': '1'}))
+        self.work()
+        result = json.loads(self.client.get(f'/api/jobs/{job_id}/result/').content)
+        self.assertEqual(result['totals'], expected['totals'])
+        self.assertEqual(result['days'], expected['days'])
+
+    def test_rollup_rebuild(self):
+        Sale.objects.create(payment_mode='UPI', total_amount=Decimal('525.00'), gst_total=Decimal('25.00'))
+        self.assertEqual(self.client.post('/api/reports/rollups/rebuild/', {'start': '17/10/2026'}).status_code, 400)
+        job_id = self.job(self.client.post('/api/reports/rollups/rebuild/', {}, format='json'))
+        self.work()
+        self.assertEqual(self.client.get(f'/api/jobs/{job_id}/result/').data, {'sales_rollups': 1, 'return_rollups': 0})
+        self.assertEqual(DailySalesRollup.objects.get().payment_mode, 'UPI')
+
+    def test_failure_is_recorded(self):
+        job = queue.enqueue('sales.rebuild_rollups', start='not a date')
+        with self.assertLogs('jobs.queue', 'ERROR'):
+            self.assertIn(f'Job {job.id}: FAILED', self.work())
+        response = self.client.get(f'/api/jobs/{job.id}/result/')
+        self.assertEqual(response.status_code, 409)
+        self.assertTrue(response.data['detail'].startswith('ValueError'))
+        self.assertEqual([j['id'] for j in self.client.get('/api/jobs/', {'status': 'failed'}).data['results']], [job.id])
+
+    def test_unknown_task_is_refused(self):
+        with self.assertRaises(LookupError):
+            queue.enqueue('inventory.nothing')
+
+    def test_a_job_is_claimed_once(self):
+        job = queue.enqueue('inventory.reset_database')
+        self.assertEqual(queue.claim('a:1'), job.id)
+        self.assertIsNone(queue.claim('b:2'))
+        self.assertEqual(Job.objects.get(pk=job.id).worker, 'a:1')
+
+    def test_jobs_of_a_stopped_worker_are_failed(self):
+        finished = subprocess.Popen([sys.executable, '-c', 'pass'])
+        finished.wait()
+        host = socket.gethostname()
+        orphan = queue.enqueue('inventory.reset_database')
+        live = queue.enqueue('inventory.reset_database')
+        queue.claim(f'{host}:{finished.pid}')
+        queue.claim(queue.identity())
+
+        self.assertEqual(queue.recover(), 1)
+        self.assertEqual(Job.objects.get(pk=orphan.id).status, Job.FAILED)
+        self.assertEqual(Job.objects.get(pk=live.id).status, Job.RUNNING)
+
+
+class PooledWorkerTests(TransactionTestCase):
+    """Jobs in spawned pool processes, which need the database in a file they can open."""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        path = os.path.join(self.directory.name, 'db.sqlite3')
+        connection.ensure_connection()
+        with sqlite3.connect(path) as target:
+            connection.connection.backup(target)
+        target.close()
+        # Keep the in-memory test database open for after the test
+        self.memory, self.settings_dict = connection.connection, connection.settings_dict
+        connection.connection = None
+        connection.settings_dict = {**self.settings_dict, 'NAME': path}
+
+    def tearDown(self):
+        connection.close()
+        connection.connection, connection.settings_dict = self.memory, self.settings_dict
+        self.directory.cleanup()
+
+    def test_jobs_run_in_pool_processes(self):
+        category = Category.objects.create(name='Kurtis')
+        product = Product.objects.create(category=category, name='Single Long Kurti')
+        ProductVariant.objects.create(product=product, size='M', color='Red', barcode='CLT500001',
+                                      price_retail=Decimal('500.00'), stock_quantity=10)
+        job = queue.enqueue('inventory.reset_database')
+
+        out = io.StringIO()
+        call_command('run_worker', processes=1, once=True, stdout=out)
+        self.assertIn(f'Job {job.id}: SUCCEEDED', out.getvalue())
+        self.assertFalse(ProductVariant.objects.exists())
+        self.assertEqual(Job.objects.get(pk=job.id).result['tables']['inventory_productvariant'], 1)
+
+    @override_settings(DATA_GENERATION_RECHECK=0)
+    def test_pool_jobs_invalidate_this_process_caches(self):
+        category = Category.objects.create(name='Kurtis')
+        product = Product.objects.create(category=category, name='Single Long Kurti')
+        ProductVariant.objects.create(product=product, size='M', color='Red', barcode='CLT500001',
+                                      price_retail=Decimal('500.00'), stock_quantity=10)
+        client = APIClient()
+        self.assertEqual(client.get('/api/variants/by-barcode/CLT500001/').status_code, 200)
+        client.get('/api/sales/analytics/', {'days': 7})
+        self.assertEqual(client.get('/api/sales/analytics/', {'days': 7})['X-Analytics-Cache'], 'hit')
+
+        # The reset runs in another process: only the database tells this one
+        queue.enqueue('inventory.reset_database')
+        call_command('run_worker', processes=1, once=True, stdout=io.StringIO())
+        self.assertEqual(client.get('/api/variants/by-barcode/CLT500001/').status_code, 404)
+        self.assertEqual(client.get('/api/sales/analytics/', {'days': 7})['X-Analytics-Cache'], 'miss')
@@ -0,0 +1,47 @@
+from django.urls import reverse
+from rest_framework import status, viewsets
+from rest_framework.decorators import action
+from rest_framework.response import Response
+
+from .models import Job
+from .serializers import JobSerializer
+
+
+def background_requested(request):
+    """Whether the caller asked for ?background=1: queue the work and answer 202."""
+    return request.query_params.get('background', '').lower() in ('1', 'true', 'yes')
+
+
+def accepted(request, job):
+    """202 for a queued job, pointing at its status."""
+    location = request.build_absolute_uri(reverse('jobs-detail', args=[job.pk]))
+    return Response(JobSerializer(job).data, status=status.HTTP_202_ACCEPTED, headers={'Location': location})
+
+
+class JobViewSet(viewsets.ReadOnlyModelViewSet):
+    """Background jobs, newest first; ?status= filters. See jobs/queue.py."""
+    queryset = Job.objects.order_by('-created_at')
+    serializer_class = JobSerializer
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        # The result only on its own endpoint, the payload never
+        queryset = queryset.defer('payload') if self.action == 'result' else queryset.defer('payload', 'result')
+        if self.action == 'list':
+            value = self.request.query_params.get('status', '').strip().upper()
+            if value:
+                queryset = queryset.filter(status=value)
+        return queryset
+
+    @action(detail=True)
+    def result(self, request, pk=None):
+        """
+        The finished job's result. 202 with the job while it is queued or
+        running, 409 with its error if it failed.
+        """
+        job = self.get_object()
+        if job.status == Job.SUCCEEDED:
+            return Response(job.result)
+        if job.status == Job.FAILED:
+            return Response({"detail": job.error}, status=status.HTTP_409_CONFLICT)
+        return Response(JobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
@@ -0,0 +1,40 @@
+"""
+The process-pool side of `manage.py run_worker`.
+
+Pool processes are started with spawn rather than fork (no connection or
+lock inherited from the parent), so they load this module before Django
+is set up: it must not import models at the top.
+"""
+import django
+
+
+def setup(databases=None):
+    """
+    Pool initializer: set up Django (settings come from the inherited
+    environment) on the databases the parent uses, {alias: NAME}, should
+    they differ from settings, as under the test runner.
+    """
+    django.setup()
+    from django.db import connections
+
+    for alias, name in (databases or {}).items():
+        connections[alias].settings_dict['NAME'] = name
+
+
+def databases():
+    """This process's {alias: NAME}, for setup() in the pool."""
+    from django.db import connections
+
+    return {alias: str(connections[alias].settings_dict['NAME']) for alias in connections}
+
+
+def execute(job_id):
+    from django.db import close_old_connections
+
+    from .queue import run
+
+    try:
+        return run(job_id)
+    finally:
+        # Between jobs as between requests: don't hold a connection past CONN_MAX_AGE
+        close_old_connections()
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Sale, SaleItem
+from .models import Return, ReturnItem, Sale, SaleItem
 
 class SaleItemInline(admin.TabularInline):
     model = SaleItem
@@ -13,3 +13,20 @@ class SaleAdmin(admin.ModelAdmin):
     list_display = ('invoice_number', 'total_amount', 'payment_mode', 'created_at')
     readonly_fields = ('invoice_number', 'total_amount', 'gst_total', 'created_at')
     search_fields = ('invoice_number',)
+
+class ReturnItemInline(admin.TabularInline):
+    model = ReturnItem
+    extra = 0
+    readonly_fields = ('sale_item', 'quantity', 'refund_price', 'tax_amount')
+    can_delete = False
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('sale_item')
+
+@admin.register(Return)
+class ReturnAdmin(admin.ModelAdmin):
+    inlines = [ReturnItemInline]
+    list_display = ('return_number', 'original_sale', 'refund_amount', 'reason', 'created_at')
+    list_select_related = ('original_sale',)
+    readonly_fields = ('return_number', 'original_sale', 'refund_amount', 'refund_gst', 'created_at')
+    search_fields = ('return_number', 'original_sale__invoice_number')
@@ -0,0 +1,228 @@
+"""
+Helpers for the analytics endpoint: date ranges, time series and the
+result cache.
+
+A series is built from one grouped query per rollup table; buckets with no
+activity are filled in Python so the chart always has a point per period.
+Rollup dates are already local (store timezone) dates, so truncating them
+needs no further timezone handling.
+
+Finished responses are cached under the normalised request plus a global
+data version that is bumped whenever a sale or return commits, so a
+dashboard is recomputed only after the underlying numbers change. The
+cache alias is ANALYTICS_CACHE; the version lives in that cache too, so
+with several workers it should be a shared backend (database, Redis,
+Memcached) rather than the per-process local-memory default. Bulk changes
+made in another process (reset, rollup rebuild) start a new 'sales'
+generation (jobs.generation), which is part of the key as well, so they
+reach every worker whatever the cache backend.
+"""
+from datetime import date, datetime, time, timedelta
+from time import time_ns
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Sum
+from django.db.models.functions import TruncDay, TruncMonth, TruncWeek
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from jobs import generation
+
+from .models import DailyReturnRollup, DailySalesRollup
+
+GRANULARITIES = {
+    'day': TruncDay,
+    'week': TruncWeek,
+    'month': TruncMonth,
+}
+
+LABEL_FORMATS = {
+    'day': '%d %b %Y',
+    'week': 'Week of %d %b %Y',
+    'month': '%B %Y',
+}
+
+
+def parse_range(params, default_days=30):
+    """
+    Resolve start_date/end_date (ISO date or datetime) or `days` into an
+    aware datetime range covering whole local days.
+    """
+    start = _parse_bound(params.get('start_date'))
+    end = _parse_bound(params.get('end_date'))
+
+    if start is None or end is None:
+        end = timezone.localtime()
+        start = end - timedelta(days=default_days)
+
+    start = start.replace(hour=0, minute=0, second=0, microsecond=0)
+    end = end.replace(hour=23, minute=59, second=59, microsecond=999999)
+    return start, end
+
+
+def _parse_bound(value):
+    if not value:
+        return None
+    try:
+        parsed = parse_datetime(value)
+        if parsed is None:
+            day = parse_date(value)
+            parsed = datetime.combine(day, time.min) if day else None
+    except ValueError:
+        return None
+    if parsed is None:
+        return None
+    if timezone.is_naive(parsed):
+        return timezone.make_aware(parsed)
+    return timezone.localtime(parsed)
+
+
+def bucket_start(day, granularity):
+    if granularity == 'month':
+        return day.replace(day=1)
+    if granularity == 'week':
+        return day - timedelta(days=day.weekday())
+    return day
+
+
+def next_bucket(day, granularity):
+    if granularity == 'month':
+        return date(day.year + day.month // 12, day.month % 12 + 1, 1)
+    if granularity == 'week':
+        return day + timedelta(days=7)
+    return day + timedelta(days=1)
+
+
+def series(start_day, end_day, granularity='month'):
+    """
+    Revenue, refunds, net and invoice count per bucket between two local
+    dates (inclusive), oldest first. Costs one query per rollup table
+    regardless of how many buckets the range spans.
+    """
+    trunc = GRANULARITIES[granularity]
+
+    sales = {
+        row['period']: row
+        for row in DailySalesRollup.objects.filter(date__gte=start_day, date__lte=end_day)
+        .annotate(period=trunc('date'))
+        .values('period')
+        .annotate(revenue=Sum('revenue'), count=Sum('sales_count'))
+    }
+    refunds = {
+        row['period']: row['refunds']
+        for row in DailyReturnRollup.objects.filter(date__gte=start_day, date__lte=end_day)
+        .annotate(period=trunc('date'))
+        .values('period')
+        .annotate(refunds=Sum('refund_amount'))
+    }
+
+    points = []
+    period = bucket_start(start_day, granularity)
+    while period <= end_day:
+        row = sales.get(period, {})
+        revenue = float(row.get('revenue') or 0)
+        refunded = float(refunds.get(period) or 0)
+        points.append({
+            'period': period,
+            'label': period.strftime(LABEL_FORMATS[granularity]),
+            'revenue': revenue,
+            'refunds': refunded,
+            'net': revenue - refunded,
+            'count': row.get('count') or 0,
+        })
+        period = next_bucket(period, granularity)
+    return points
+
+
+def trailing_months(months=12):
+    """Local date range covering the last `months` calendar months, including this one."""
+    today = timezone.localdate()
+    start = today.replace(day=1)
+    for _ in range(months - 1):
+        start = (start - timedelta(days=1)).replace(day=1)
+    return start, today
+
+
+VERSION_KEY = 'analytics:data-version'
+HITS_KEY = 'analytics:hits'
+MISSES_KEY = 'analytics:misses'
+
+
+def _cache():
+    return caches[getattr(settings, 'ANALYTICS_CACHE', 'default')]
+
+
+def _incr(key, cache=None):
+    cache = cache or _cache()
+    try:
+        return cache.incr(key)
+    except ValueError:
+        # Missing (never set, or evicted). A fresh value derived from the
+        # clock can never match a version used by an older cached entry.
+        value = time_ns() if key == VERSION_KEY else 1
+        cache.set(key, value, None)
+        return value
+
+
+def data_version():
+    cache = _cache()
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        version = _incr(VERSION_KEY, cache)
+    return version
+
+
+def bump_data_version():
+    """Invalidate every cached analytics response. Call on commit."""
+    _incr(VERSION_KEY)
+
+
+def _lookup(key_parts):
+    cache = _cache()
+    key = 'analytics:{}:{}:{}'.format(
+        generation.current('sales'), data_version(), ':'.join(str(part) for part in key_parts))
+    payload = cache.get(key)
+    _incr(HITS_KEY if payload is not None else MISSES_KEY, cache)
+    return key, payload
+
+
+def _store(key, payload):
+    _cache().set(key, payload, getattr(settings, 'ANALYTICS_CACHE_TTL', 300))
+
+
+def cached(key_parts, compute):
+    """
+    Return (payload, hit) for the analytics response identified by
+    `key_parts`, computing and storing it on a miss.
+    """
+    key, payload = _lookup(key_parts)
+    if payload is not None:
+        return payload, True
+    payload = compute()
+    _store(key, payload)
+    return payload, False
+
+
+async def acached(key_parts, compute):
+    """cached() for async views: `compute` is a coroutine function."""
+    # Cache backends may block (database, Redis): talk to them from a thread
+    key, payload = await sync_to_async(_lookup)(key_parts)
+    if payload is not None:
+        return payload, True
+    payload = await compute()
+    await sync_to_async(_store)(key, payload)
+    return payload, False
+
+
+def cache_stats():
+    cache = _cache()
+    hits = cache.get(HITS_KEY) or 0
+    misses = cache.get(MISSES_KEY) or 0
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': hits / (hits + misses) if hits + misses else 0.0,
+        'data_version': data_version(),
+    }
@@ -0,0 +1,167 @@
+"""
+The /api/sales/analytics/ payload.
+
+Built from independent parts, each a query or two over the rollups or the
+sales tables. SaleViewSet.analytics runs them one after another; the
+async view (sales.views.analytics_async) runs them all at once, each on a
+connection of its own (backend_proj.concurrency), so a cold dashboard
+costs about as long as its slowest part rather than the sum of them.
+"""
+from collections import namedtuple
+
+from django.db.models import F, Prefetch, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from backend_proj.concurrency import parallel
+
+from .analytics import series, trailing_months
+from .models import DailyReturnRollup, DailySalesRollup, Return, Sale, SaleItem
+from .serializers import SaleSerializer
+
+Window = namedtuple('Window', 'start end start_day end_day days granularity')
+
+
+def window(start, end, days, granularity):
+    """`start`/`end` are aware datetimes covering whole local days."""
+    return Window(start, end, timezone.localdate(start), timezone.localdate(end), days, granularity)
+
+
+# Summary figures come from the daily rollups (one row per day x mode)
+# instead of scanning every invoice and line in the range.
+
+def _sales_rollups(w):
+    return DailySalesRollup.objects.filter(date__gte=w.start_day, date__lte=w.end_day)
+
+
+def sales_summary(w):
+    return _sales_rollups(w).aggregate(
+        total_revenue=Sum('revenue'),
+        total_sales_count=Coalesce(Sum('sales_count'), 0),
+        total_gst=Sum('gst'),
+        total_items=Sum('items_count')
+    )
+
+
+def returns_summary(w):
+    return DailyReturnRollup.objects.filter(date__gte=w.start_day, date__lte=w.end_day).aggregate(
+        total_refund_amount=Sum('refund_amount'),
+        total_returns_count=Coalesce(Sum('returns_count'), 0),
+        refund_gst=Sum('refund_gst'),
+        total_items_returned=Sum('items_count')
+    )
+
+
+def payment_breakdown(w):
+    return list(_sales_rollups(w).values('payment_mode').annotate(
+        count=Sum('sales_count'),
+        total=Sum('revenue')
+    ).order_by('-total'))
+
+
+def top_products(w):
+    # Grouped on the names snapshotted at sale time
+    return list(SaleItem.objects.filter(
+        sale__created_at__gte=w.start,
+        sale__created_at__lte=w.end
+    ).values(
+        'product_name',
+        variant_size=F('size'),
+        variant_color=F('color')
+    ).annotate(
+        total_quantity=Sum('quantity'),
+        total_revenue=Sum('total_price')
+    ).order_by('-total_quantity')[:10])
+
+
+def recent_sales(w):
+    sales = Sale.objects.prefetch_related(
+        Prefetch('items', queryset=SaleItem.objects.select_related('variant'))
+    ).filter(
+        created_at__gte=w.start,
+        created_at__lte=w.end
+    ).order_by('-created_at')[:10]
+    return list(SaleSerializer(sales, many=True).data)
+
+
+def recent_returns(w):
+    return list(Return.objects.filter(
+        created_at__gte=w.start,
+        created_at__lte=w.end
+    ).order_by('-created_at')[:5].values(
+        'id', 'return_number', 'original_sale__invoice_number',
+        'refund_amount', 'reason', 'created_at'
+    ))
+
+
+def monthly_data(w):
+    # The last 12 calendar months whatever the requested range
+    return [
+        {
+            'month': point['label'],
+            'revenue': point['revenue'],
+            'refunds': point['refunds'],
+            'net': point['net'],
+            'count': point['count']
+        }
+        for point in series(*trailing_months(12), granularity='month')
+    ]
+
+
+def period_data(w):
+    return series(w.start_day, w.end_day, granularity=w.granularity)
+
+
+PARTS = (sales_summary, returns_summary, payment_breakdown, top_products,
+         recent_sales, recent_returns, monthly_data, period_data)
+
+
+def build(w):
+    """The payload for `w`, one part after another."""
+    return _assemble(w, {part.__name__: part(w) for part in PARTS})
+
+
+async def abuild(w):
+    """The payload for `w`, every part at once."""
+    results = await parallel(*((lambda part=part: part(w)) for part in PARTS))
+    return _assemble(w, {part.__name__: result for part, result in zip(PARTS, results)})
+
+
+def _assemble(w, parts):
+    sales, returns = parts['sales_summary'], parts['returns_summary']
+
+    # Net totals: returns come off the gross figures
+    gross_revenue = float(sales['total_revenue'] or 0)
+    total_refunds = float(returns['total_refund_amount'] or 0)
+    net_revenue = gross_revenue - total_refunds
+
+    total_items_sold = (sales['total_items'] or 0) - (returns['total_items_returned'] or 0)
+    net_gst = float(sales['total_gst'] or 0) - float(returns['refund_gst'] or 0)
+
+    avg_sale = gross_revenue / sales['total_sales_count'] if sales['total_sales_count'] > 0 else 0
+
+    return {
+        'summary': {
+            'gross_revenue': gross_revenue,
+            'total_revenue': gross_revenue, # Alias for consistency
+            'total_refunds': total_refunds,
+            'net_revenue': net_revenue,
+            'total_sales': sales['total_sales_count'],
+            'total_items': total_items_sold,
+            'total_returns': returns['total_returns_count'],
+            'total_gst': net_gst,
+            'average_sale': float(avg_sale),
+            'period_days': w.days,
+            'start_date': w.start,
+            'end_date': w.end
+        },
+        'payment_breakdown': parts['payment_breakdown'],
+        'top_products': parts['top_products'],
+        'recent_sales': parts['recent_sales'],
+        'recent_returns': parts['recent_returns'],
+        'monthly_data': parts['monthly_data'],
+        'series': {
+            'granularity': w.granularity,
+            'points': parts['period_data']
+        }
+    }
@@ -0,0 +1,118 @@
+"""
+CSV exports of invoice and return lines for GST filing.
+
+Rows are read with values_list(...).iterator(), so the database hands them
+over a chunk at a time (a server-side cursor on PostgreSQL) and nothing
+holds the whole range in memory. The CSV is produced as a generator for
+StreamingHttpResponse: the header row is sent before the query is even
+run, and optional gzip output is flushed block by block so compressed
+bytes keep flowing too.
+"""
+import csv
+import zlib
+
+from django.utils import timezone
+
+from .models import ReturnItem, SaleItem, line_tax
+
+CHUNK_SIZE = 2000
+BLOCK_SIZE = 64 * 1024  # characters of CSV per yielded block
+
+SALE_COLUMNS = [
+    ('invoice_number', 'sale__invoice_number'),
+    ('invoice_date', 'sale__created_at'),
+    ('payment_mode', 'sale__payment_mode'),
+    ('customer_name', 'sale__customer_name'),
+    ('customer_phone', 'sale__customer_phone'),
+    ('barcode', 'variant__barcode'),
+    ('product', 'product_name'),
+    ('size', 'size'),
+    ('color', 'color'),
+    ('quantity', 'quantity'),
+    ('unit_price', 'unit_price'),
+    ('taxable_value', 'total_price'),
+    ('gst_rate', 'gst_rate'),
+]
+
+RETURN_COLUMNS = [
+    ('return_number', 'return_order__return_number'),
+    ('return_date', 'return_order__created_at'),
+    ('original_invoice', 'sale_item__sale__invoice_number'),
+    ('reason', 'return_order__reason'),
+    ('barcode', 'sale_item__variant__barcode'),
+    ('product', 'sale_item__product_name'),
+    ('size', 'sale_item__size'),
+    ('color', 'sale_item__color'),
+    ('quantity', 'quantity'),
+    ('taxable_value', 'refund_price'),
+    ('gst_rate', 'sale_item__gst_rate'),
+]
+
+# Computed columns appended to every row: GST on the taxable value, and the total
+EXTRA_COLUMNS = ['gst_amount', 'line_total']
+
+
+def _rows(queryset, columns, date_index):
+    """Header, then one list per line with the date made local and GST worked out."""
+    yield [name for name, _ in columns] + EXTRA_COLUMNS
+    value_index = len(columns) - 2
+    for row in queryset.values_list(*(lookup for _, lookup in columns)).iterator(chunk_size=CHUNK_SIZE):
+        row = list(row)
+        row[date_index] = timezone.localtime(row[date_index]).strftime('%Y-%m-%d %H:%M:%S')
+        value, rate = row[value_index], row[value_index + 1]
+        # Same rounding as checkout and returns, so sale lines match tax_amount
+        gst = line_tax(value, rate)
+        yield row + [gst, value + gst]
+
+
+def sale_rows(start, end):
+    queryset = SaleItem.objects.filter(sale__created_at__gte=start, sale__created_at__lte=end) \
+        .order_by('sale__created_at', 'sale_id', 'id')
+    return _rows(queryset, SALE_COLUMNS, date_index=1)
+
+
+def return_rows(start, end):
+    queryset = ReturnItem.objects.filter(return_order__created_at__gte=start, return_order__created_at__lte=end) \
+        .order_by('return_order__created_at', 'return_order_id', 'id')
+    return _rows(queryset, RETURN_COLUMNS, date_index=1)
+
+
+class _Buffer:
+    """File-like sink for csv.writer that keeps what was written until taken."""
+
+    def __init__(self):
+        self.parts = []
+        self.size = 0
+
+    def write(self, value):
+        self.parts.append(value)
+        self.size += len(value)
+
+    def take(self):
+        text = ''.join(self.parts)
+        self.parts = []
+        self.size = 0
+        return text
+
+
+def csv_stream(rows):
+    """Yield CSV text in blocks of about BLOCK_SIZE, the header on its own first."""
+    buffer = _Buffer()
+    writer = csv.writer(buffer)
+    rows = iter(rows)
+    writer.writerow(next(rows))
+    yield buffer.take()
+    for row in rows:
+        writer.writerow(row)
+        if buffer.size >= BLOCK_SIZE:
+            yield buffer.take()
+    if buffer.size:
+        yield buffer.take()
+
+
+def gzip_stream(blocks):
+    """Gzip a stream of text blocks, flushing after each so output is never held back."""
+    compressor = zlib.compressobj(wbits=31)  # 31: gzip container
+    for block in blocks:
+        yield compressor.compress(block.encode('utf-8')) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    yield compressor.flush()
@@ -0,0 +1,225 @@
+"""
+Rate-wise GST summary for GSTR-1 / GSTR-3B: taxable value, tax and
+document counts per GST rate and per day, net of returns.
+
+Figures come from grouped aggregates over the rate, value and tax that
+SaleItem snapshots at checkout and ReturnItem at refund, so no join
+reaches the catalog and the tax matches the invoices and credit notes
+issued to the paisa. Returns count on the day they were processed, at the
+rate of the line returned. Document counts come from the same lines, so a
+day's counts and values always agree.
+
+A day's figures cannot change once it is over (every sale and return is
+stamped with the time it was recorded), so each closed day is computed
+once and kept in the analytics cache; re-running a filed month costs one
+cache read. Days still open (today, and yesterday for CLOSE_GRACE after
+midnight to let in-flight checkouts commit) are always computed live.
+invalidate() drops every cached day in this process's cache; a new 'sales'
+generation (jobs.generation) drops them in every process, e.g. after a
+reset run by the job worker.
+
+Days before the latest retention purge's cutoff (sales.purge) are
+incomplete, so a report starting before it is refused (PurgedRange). A
+purge only touches those days, so it leaves the cached ones alone; it
+starts a new 'purge' generation so every process reads the new cutoff.
+"""
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from time import time_ns
+
+from django.conf import settings
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from jobs import generation
+
+from .analytics import _cache
+from .models import ReturnItem, SaleItem, SalesPurge
+
+CLOSE_GRACE = timedelta(hours=1)
+EPOCH_KEY = 'gst:epoch'
+PURGED_KEY = 'gst:purged-before'
+
+ZERO = Decimal('0.00')
+
+
+def _epoch(cache):
+    epoch = cache.get(EPOCH_KEY)
+    if epoch is None:
+        # Derived from the clock so it never matches entries from before an eviction
+        epoch = time_ns()
+        cache.set(EPOCH_KEY, epoch, None)
+    return epoch
+
+
+def invalidate():
+    """Forget every cached day."""
+    cache = _cache()
+    cache.set(EPOCH_KEY, time_ns(), None)
+    cache.delete(f"{PURGED_KEY}:{generation.current('purge')}")
+
+
+class PurgedRange(ValueError):
+    """The report would cover days whose sales have been purged."""
+
+
+def purged_before():
+    """The latest retention purge's cutoff date, or None if sales were never purged."""
+    cache = _cache()
+    key = f"{PURGED_KEY}:{generation.current('purge')}"
+    cutoff = cache.get(key)
+    if cutoff is None:
+        latest = SalesPurge.objects.order_by('-before').values_list('before', flat=True).first()
+        cutoff = latest.isoformat() if latest else ''
+        cache.set(key, cutoff, None)
+    return date.fromisoformat(cutoff) if cutoff else None
+
+
+def purged(before):
+    """Record a retention purge of the sales before `before`; from now on the report starts there."""
+    SalesPurge.objects.create(before=before)
+    generation.bump('purge')
+
+
+def check_range(start_day):
+    cutoff = purged_before()
+    if cutoff is not None and start_day < cutoff:
+        raise PurgedRange(f'Sales recorded before {cutoff} have been purged (retention); '
+                          f'start the report on or after that date.')
+
+
+def _ttl():
+    return getattr(settings, 'GST_REPORT_CACHE_TTL', 60 * 60 * 24 * 31)
+
+
+def is_closed(day, now=None):
+    now = now or timezone.localtime()
+    day_end = timezone.make_aware(datetime.combine(day + timedelta(days=1), time.min))
+    return now >= day_end + CLOSE_GRACE
+
+
+def _empty_rate():
+    return {
+        'taxable_value': ZERO, 'tax': ZERO, 'invoices': 0,
+        'returned_taxable_value': ZERO, 'returned_tax': ZERO, 'returns': 0,
+    }
+
+
+def compute_days(start_day, end_day):
+    """
+    {day: {'invoices', 'returns', 'rates': {rate: figures}}} for every local
+    day in the range, straight from the database. Four grouped queries.
+    """
+    tz = timezone.get_current_timezone()
+    # Filter on the raw timestamps (indexable), group on the local date
+    since = timezone.make_aware(datetime.combine(start_day, time.min))
+    until = timezone.make_aware(datetime.combine(end_day + timedelta(days=1), time.min))
+    days = {}
+    day = start_day
+    while day <= end_day:
+        days[day] = {'invoices': 0, 'returns': 0, 'rates': {}}
+        day += timedelta(days=1)
+
+    def rate(day, gst_rate):
+        return days[day]['rates'].setdefault(gst_rate, _empty_rate())
+
+    sold = SaleItem.objects.filter(sale__created_at__gte=since, sale__created_at__lt=until) \
+        .annotate(day=TruncDate('sale__created_at', tzinfo=tz))
+    for row in sold.values('day', 'gst_rate') \
+            .annotate(taxable=Sum('total_price'), tax=Sum('tax_amount'), documents=Count('sale_id', distinct=True)) \
+            .order_by():
+        figures = rate(row['day'], row['gst_rate'])
+        figures.update(taxable_value=row['taxable'], tax=row['tax'], invoices=row['documents'])
+
+    returned = ReturnItem.objects.filter(return_order__created_at__gte=since, return_order__created_at__lt=until) \
+        .annotate(day=TruncDate('return_order__created_at', tzinfo=tz))
+    for row in returned.values('day', gst_rate=F('sale_item__gst_rate')) \
+            .annotate(taxable=Sum('refund_price'), tax=Sum('tax_amount'),
+                      documents=Count('return_order_id', distinct=True)).order_by():
+        figures = rate(row['day'], row['gst_rate'])
+        figures.update(returned_taxable_value=row['taxable'], returned_tax=row['tax'], returns=row['documents'])
+
+    # Document counts across rates, from the same lines: an invoice with
+    # lines at two rates is still one invoice
+    for row in sold.values('day').annotate(documents=Count('sale_id', distinct=True)).order_by():
+        days[row['day']]['invoices'] = row['documents']
+    for row in returned.values('day').annotate(documents=Count('return_order_id', distinct=True)).order_by():
+        days[row['day']]['returns'] = row['documents']
+    return days
+
+
+def _ranges(days):
+    """Consecutive runs of `days` (sorted) as (first, last) pairs."""
+    runs = []
+    for day in days:
+        if runs and runs[-1][1] + timedelta(days=1) == day:
+            runs[-1][1] = day
+        else:
+            runs.append([day, day])
+    return runs
+
+
+def daily_figures(start_day, end_day):
+    """Per-day figures for the range, plus how many closed days came from cache."""
+    cache = _cache()
+    epoch = f"{generation.current('sales')}:{_epoch(cache)}"
+    now = timezone.localtime()
+
+    all_days = [start_day + timedelta(days=n) for n in range((end_day - start_day).days + 1)]
+    keys = {day: f'gst:{epoch}:{day.isoformat()}' for day in all_days if is_closed(day, now)}
+    found = cache.get_many(keys.values()) if keys else {}
+    cached = {day: found[key] for day, key in keys.items() if key in found}
+
+    missing = [day for day in all_days if day not in cached]
+    computed = {}
+    for first, last in _ranges(missing):
+        computed.update(compute_days(first, last))
+    cache.set_many({keys[day]: computed[day] for day in computed if day in keys}, _ttl())
+
+    return {**cached, **computed}, len(cached)
+
+
+def _net(figures):
+    return {
+        **figures,
+        'net_taxable_value': figures['taxable_value'] - figures['returned_taxable_value'],
+        'net_tax': figures['tax'] - figures['returned_tax'],
+    }
+
+
+def _add(total, figures):
+    for field, value in figures.items():
+        total[field] += value
+
+
+def report(start_day, end_day):
+    check_range(start_day)
+    days, from_cache = daily_figures(start_day, end_day)
+
+    rate_totals = {}
+    totals = {**_empty_rate()}
+    day_rows = []
+    for day in sorted(days):
+        entry = days[day]
+        if not entry['rates']:
+            continue
+        day_total = _empty_rate()
+        rates = []
+        for gst_rate in sorted(entry['rates']):
+            figures = entry['rates'][gst_rate]
+            _add(rate_totals.setdefault(gst_rate, _empty_rate()), figures)
+            _add(day_total, figures)
+            rates.append({'gst_rate': gst_rate, **_net(figures)})
+        day_total.update(invoices=entry['invoices'], returns=entry['returns'])
+        _add(totals, day_total)
+        day_rows.append({'date': day, **_net(day_total), 'rates': rates})
+
+    return {
+        'start_date': start_day,
+        'end_date': end_day,
+        'rates': [{'gst_rate': gst_rate, **_net(rate_totals[gst_rate])} for gst_rate in sorted(rate_totals)],
+        'days': day_rows,
+        'totals': _net(totals),
+        'cache': {'days': len(days), 'from_cache': from_cache},
+    }
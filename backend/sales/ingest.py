@@ -0,0 +1,95 @@
+"""
+Batch upload of sales queued by offline terminals.
+
+Each sale carries a client-generated idempotency key. Keys already on file
+are answered from one indexed lookup without touching stock, so re-sending
+a batch after a dropped connection is a cheap no-op. New sales go through
+SaleSerializer (same pricing and stock rules as a live checkout), one
+transaction per chunk, with a savepoint per sale so one short line does not
+reject the rest of the chunk.
+"""
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from rest_framework import serializers
+
+from .models import IdempotencyKey
+from .serializers import SaleSerializer
+
+KEY_LENGTH = IdempotencyKey._meta.get_field('key').max_length
+
+
+def _chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _duplicate(key, sale_id, invoice_number):
+    return {'idempotency_key': key, 'status': 'duplicate', 'id': sale_id, 'invoice_number': invoice_number}
+
+
+def _key_errors(key):
+    """Why `key` cannot be stored as an idempotency key, or None."""
+    if not key:
+        return ['This field is required.']
+    if not isinstance(key, str):
+        return ['Expected a string.']
+    if len(key) > KEY_LENGTH:
+        return [f'Ensure this field has no more than {KEY_LENGTH} characters.']
+    return None
+
+
+def ingest(entries, context=None):
+    """
+    Record `entries` (sale payloads, each with an 'idempotency_key') and
+    return one result per entry, in order.
+    """
+    keys = [entry.get('idempotency_key') for entry in entries]
+    # Checked before any query: an unusable key must not reach the database
+    key_errors = [_key_errors(key) for key in keys]
+    known = {
+        key: (sale_id, invoice_number)
+        for key, sale_id, invoice_number in IdempotencyKey.objects
+        .filter(key__in=[key for key, errors in zip(keys, key_errors) if errors is None])
+        .values_list('key', 'sale_id', 'sale__invoice_number')
+    }
+
+    results = [None] * len(entries)
+    pending = []
+    seen = set()
+    for index, (key, errors) in enumerate(zip(keys, key_errors)):
+        if errors is not None:
+            results[index] = {'idempotency_key': key, 'status': 'error', 'errors': {'idempotency_key': errors}}
+        elif key in known:
+            results[index] = _duplicate(key, *known[key])
+        elif key in seen:
+            results[index] = {'idempotency_key': key, 'status': 'error',
+                              'errors': {'idempotency_key': ['Repeated within this batch.']}}
+        else:
+            seen.add(key)
+            pending.append(index)
+
+    for chunk in _chunks(pending, getattr(settings, 'SALE_BATCH_CHUNK_SIZE', 50)):
+        with transaction.atomic():
+            for index in chunk:
+                results[index] = _ingest_one(keys[index], entries[index], context)
+    return results
+
+
+def _ingest_one(key, entry, context):
+    serializer = SaleSerializer(data=entry, context=context or {})
+    if not serializer.is_valid():
+        return {'idempotency_key': key, 'status': 'error', 'errors': serializer.errors}
+    try:
+        with transaction.atomic():
+            sale = serializer.save()
+            IdempotencyKey.objects.create(key=key, sale=sale)
+    except IntegrityError:
+        # Another upload of the same batch got there first
+        existing = IdempotencyKey.objects.select_related('sale').filter(key=key).first()
+        if existing is None:
+            raise
+        return _duplicate(key, existing.sale_id, existing.sale.invoice_number)
+    except serializers.ValidationError as exc:
+        return {'idempotency_key': key, 'status': 'error', 'errors': exc.detail}
+    return {'idempotency_key': key, 'status': 'created', 'id': sale.id,
+            'invoice_number': sale.invoice_number, 'total_amount': sale.total_amount}
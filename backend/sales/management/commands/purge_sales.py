@@ -0,0 +1,39 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from sales import purge
+
+
+class Command(BaseCommand):
+    help = 'Delete sales and returns older than the retention period, in batches (daily rollups are kept)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--before', help='Purge sales recorded before this local date (YYYY-MM-DD)')
+        parser.add_argument('--days', type=int, default=getattr(settings, 'SALES_RETENTION_DAYS', 8 * 365),
+                            help='Keep this many days of sales when --before is not given (SALES_RETENTION_DAYS)')
+        parser.add_argument('--batch-size', type=int, default=None, help='Sales per transaction (PURGE_BATCH_SIZE)')
+
+    def handle(self, *args, **options):
+        today = timezone.localdate()
+        if options['before']:
+            try:
+                before = parse_date(options['before'])
+            except ValueError:
+                before = None
+            if before is None:
+                raise CommandError(f"Invalid date '{options['before']}', expected YYYY-MM-DD")
+        else:
+            before = today - timedelta(days=options['days'])
+        if before > today:
+            raise CommandError('The cutoff cannot be in the future.')
+
+        report = purge.purge_sales(before, batch_size=options['batch_size'])
+        for table, rows in report['tables'].items():
+            self.stdout.write(f'{table}: {rows}')
+        self.stdout.write(self.style.SUCCESS(
+            f"Purged {report['rows']} rows recorded before {before} in {report['seconds']}s."
+        ))
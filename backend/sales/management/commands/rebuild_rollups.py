@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from sales import rollups
+
+
+class Command(BaseCommand):
+    help = 'Recompute the daily sales/return rollups from raw invoices (backfill or repair)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', help='First local date to rebuild (YYYY-MM-DD), default: beginning of history')
+        parser.add_argument('--end', help='Last local date to rebuild (YYYY-MM-DD), default: today')
+
+    def handle(self, *args, **options):
+        start = self._parse(options['start'])
+        end = self._parse(options['end'])
+
+        sales_rows, return_rows = rollups.rebuild(start=start, end=end)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt {sales_rows} daily sales rollups and {return_rows} daily return rollups.'
+        ))
+
+    def _parse(self, value):
+        if value is None:
+            return None
+        try:
+            parsed = parse_date(value)
+        except ValueError:
+            parsed = None
+        if parsed is None:
+            raise CommandError(f"Invalid date '{value}', expected YYYY-MM-DD")
+        return parsed
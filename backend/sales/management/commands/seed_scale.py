@@ -0,0 +1,40 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from sales import seeding
+
+
+class Command(BaseCommand):
+    help = 'Add a synthetic catalog and sales history at benchmark scale (adds to existing data, deletes nothing)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sales', default='1k', help=f"{', '.join(seeding.SCALES)} or a number of invoices")
+        parser.add_argument('--variants', type=int, default=50_000)
+        parser.add_argument('--days', type=int, default=365, help='Spread the sales over this many past days')
+        parser.add_argument('--batch-size', type=int, default=seeding.BATCH_SIZE)
+        parser.add_argument('--seed', type=int, help='Random seed, for a repeatable dataset')
+        parser.add_argument('--json', action='store_true', help='Print the counts and timings as JSON')
+
+    def handle(self, *args, **options):
+        try:
+            sales = seeding.parse_scale(options['sales'])
+        except ValueError as exc:
+            raise CommandError(str(exc))
+        if options['variants'] < 1 or options['days'] < 1 or options['batch_size'] < 1:
+            raise CommandError('--variants, --days and --batch-size must be at least 1')
+
+        result = seeding.seed(
+            sales,
+            variants=options['variants'],
+            days=options['days'],
+            batch_size=options['batch_size'],
+            random_seed=options['seed'],
+            log=None if options['json'] else self.stdout.write,
+        )
+        if options['json']:
+            self.stdout.write(json.dumps(result, indent=2))
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded {result['variants']} variants, {result['sales']} sales and {result['returns']} returns."
+        ))
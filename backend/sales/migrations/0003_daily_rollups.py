@@ -0,0 +1,86 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:51
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+
+def backfill(apps, schema_editor):
+    # The dashboard reads only the rollups: build them from the sales made so far
+    Sale = apps.get_model('sales', 'Sale')
+    SaleItem = apps.get_model('sales', 'SaleItem')
+    Return = apps.get_model('sales', 'Return')
+    ReturnItem = apps.get_model('sales', 'ReturnItem')
+    DailySalesRollup = apps.get_model('sales', 'DailySalesRollup')
+    DailyReturnRollup = apps.get_model('sales', 'DailyReturnRollup')
+    tz = timezone.get_current_timezone()
+
+    # Headers and lines separately: summing both across the join would
+    # count each header once per line
+    sale_items = {
+        (row['day'], row['sale__payment_mode']): row['qty']
+        for row in SaleItem.objects.annotate(day=TruncDate('sale__created_at', tzinfo=tz))
+        .values('day', 'sale__payment_mode').annotate(qty=Sum('quantity')).order_by()
+    }
+    DailySalesRollup.objects.bulk_create((
+        DailySalesRollup(
+            date=row['day'], payment_mode=row['payment_mode'], sales_count=row['sales_count'],
+            items_count=sale_items.get((row['day'], row['payment_mode'])) or 0,
+            revenue=row['revenue'] or 0, gst=row['gst'] or 0,
+        )
+        for row in Sale.objects.annotate(day=TruncDate('created_at', tzinfo=tz)).values('day', 'payment_mode')
+        .annotate(sales_count=Count('id'), revenue=Sum('total_amount'), gst=Sum('gst_total')).order_by()
+    ), batch_size=1000)
+
+    return_items = {
+        row['day']: row['qty']
+        for row in ReturnItem.objects.annotate(day=TruncDate('return_order__created_at', tzinfo=tz))
+        .values('day').annotate(qty=Sum('quantity')).order_by()
+    }
+    DailyReturnRollup.objects.bulk_create((
+        DailyReturnRollup(
+            date=row['day'], returns_count=row['returns_count'], items_count=return_items.get(row['day']) or 0,
+            refund_amount=row['refund_amount'] or 0, refund_gst=row['refund_gst'] or 0,
+        )
+        for row in Return.objects.annotate(day=TruncDate('created_at', tzinfo=tz)).values('day')
+        .annotate(returns_count=Count('id'), refund_amount=Sum('refund_amount'), refund_gst=Sum('refund_gst'))
+        .order_by()
+    ), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0002_return_returnitem'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyReturnRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(unique=True)),
+                ('returns_count', models.PositiveIntegerField(default=0)),
+                ('items_count', models.PositiveIntegerField(default=0)),
+                ('refund_amount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('refund_gst', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DailySalesRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('payment_mode', models.CharField(choices=[('CASH', 'Cash'), ('CARD', 'Card'), ('UPI', 'UPI'), ('MIXED', 'Mixed')], max_length=10)),
+                ('sales_count', models.PositiveIntegerField(default=0)),
+                ('items_count', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('gst', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+            ],
+            options={
+                'unique_together': {('date', 'payment_mode')},
+            },
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
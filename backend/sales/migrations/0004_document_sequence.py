@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0003_daily_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('store', models.CharField(blank=True, default='', max_length=10)),
+                ('kind', models.CharField(help_text='INV or RET', max_length=3)),
+                ('financial_year', models.CharField(help_text='e.g. 2627 for April 2026 - March 2027', max_length=4)),
+                ('next_value', models.PositiveBigIntegerField(default=1)),
+            ],
+            options={
+                'unique_together': {('store', 'kind', 'financial_year')},
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 23:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0004_document_sequence'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IdempotencyKey',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=64, unique=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('sale', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='idempotency_key', to='sales.sale')),
+            ],
+        ),
+    ]
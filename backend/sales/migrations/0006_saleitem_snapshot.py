@@ -0,0 +1,73 @@
+# Generated by Django 5.2.18 on 2026-10-17 23:17
+
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def backfill(apps, schema_editor):
+    # Older lines only have the variant to go on, so they get its current
+    # name, rate and cost: the closest thing to what applied at the time.
+    SaleItem = apps.get_model('sales', 'SaleItem')
+    ProductVariant = apps.get_model('inventory', 'ProductVariant')
+    variant = ProductVariant.objects.filter(pk=OuterRef('variant_id'))
+    SaleItem.objects.filter(product_name='').update(
+        product_name=Subquery(variant.values('product__name')[:1]),
+        size=Subquery(variant.values('size')[:1]),
+        color=Subquery(variant.values('color')[:1]),
+        gst_rate=Subquery(variant.values('gst_rate')[:1]),
+        cost_price=Subquery(variant.values('price_cost')[:1]),
+    )
+
+    # Tax in Python rather than SQL: SQLite would do integer division on
+    # whole-rupee amounts, and this matches line_tax's rounding exactly
+    batch = []
+    for item in SaleItem.objects.only('id', 'total_price', 'gst_rate').iterator(chunk_size=2000):
+        item.tax_amount = (item.total_price * item.gst_rate / 100).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+        batch.append(item)
+        if len(batch) == 2000:
+            SaleItem.objects.bulk_update(batch, ['tax_amount'])
+            batch = []
+    SaleItem.objects.bulk_update(batch, ['tax_amount'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0005_idempotency_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='saleitem',
+            name='color',
+            field=models.CharField(blank=True, default='', max_length=100),
+        ),
+        migrations.AddField(
+            model_name='saleitem',
+            name='cost_price',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10),
+        ),
+        migrations.AddField(
+            model_name='saleitem',
+            name='gst_rate',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=5),
+        ),
+        migrations.AddField(
+            model_name='saleitem',
+            name='product_name',
+            field=models.CharField(blank=True, default='', max_length=200),
+        ),
+        migrations.AddField(
+            model_name='saleitem',
+            name='size',
+            field=models.CharField(blank=True, default='', max_length=100),
+        ),
+        migrations.AddField(
+            model_name='saleitem',
+            name='tax_amount',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
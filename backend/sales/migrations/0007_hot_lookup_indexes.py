@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-17 23:21
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0005_catalog_search'),
+        ('sales', '0006_saleitem_snapshot'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='return',
+            index=models.Index(fields=['created_at', 'id'], name='sales_return_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sale',
+            index=models.Index(fields=['created_at', 'id'], name='sales_sale_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sale',
+            index=models.Index(fields=['customer_phone', 'created_at'], name='sales_sale_phone_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='saleitem',
+            index=models.Index(fields=['sale', 'variant'], name='sales_saleitem_sale_var_idx'),
+        ),
+    ]
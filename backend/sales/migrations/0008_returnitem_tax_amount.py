@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:05
+
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.db import migrations, models
+
+
+def backfill(apps, schema_editor):
+    # What ReturnSerializer.create refunded: line_tax on each line's refund
+    # at the rate it was sold at, rounded per line
+    ReturnItem = apps.get_model('sales', 'ReturnItem')
+    batch = []
+    lines = ReturnItem.objects.only('id', 'refund_price').annotate(rate=models.F('sale_item__gst_rate'))
+    for item in lines.iterator(chunk_size=2000):
+        item.tax_amount = (item.refund_price * item.rate / 100).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+        batch.append(item)
+        if len(batch) == 2000:
+            ReturnItem.objects.bulk_update(batch, ['tax_amount'])
+            batch = []
+    ReturnItem.objects.bulk_update(batch, ['tax_amount'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0007_hot_lookup_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='returnitem',
+            name='tax_amount',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
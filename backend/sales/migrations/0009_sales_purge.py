@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0008_returnitem_tax_amount'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SalesPurge',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('before', models.DateField(db_index=True)),
+                ('started_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
@@ -1,7 +1,15 @@
+from decimal import ROUND_HALF_UP, Decimal
+
 from django.db import models
 from django.contrib.auth.models import User
 from inventory.models import ProductVariant
-import uuid
+from .sequences import next_number
+
+
+def line_tax(taxable_value, gst_rate):
+    """GST on one line, rounded to the paisa."""
+    return (Decimal(taxable_value) * Decimal(gst_rate) / 100).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+
 
 class Sale(models.Model):
     PAYMENT_MODES = [
@@ -22,11 +30,18 @@ class Sale(models.Model):
     
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # Date-range filters, and the (-created_at, -id) keyset list order
+            models.Index(fields=['created_at', 'id'], name='sales_sale_created_idx'),
+            # A customer's past invoices, newest first
+            models.Index(fields=['customer_phone', 'created_at'], name='sales_sale_phone_idx'),
+        ]
+
     def save(self, *args, **kwargs):
         if not self.invoice_number:
-            # Simple Invoice Number Logic: INV-UUID-First 8 chars
-            # In production, use a sequence table or Redis counter
-            self.invoice_number = f"INV-{uuid.uuid4().hex[:8].upper()}"
+            # Consecutive per store and financial year, e.g. INV-2627-00042
+            self.invoice_number = next_number('INV')
         super().save(*args, **kwargs)
 
     def __str__(self):
@@ -41,12 +56,38 @@ class SaleItem(models.Model):
     unit_price = models.DecimalField(max_digits=10, decimal_places=2)
     total_price = models.DecimalField(max_digits=12, decimal_places=2)
 
+    # Snapshot of the variant and its tax at time of sale, so reports and
+    # returns are unaffected by later edits to the catalog
+    product_name = models.CharField(max_length=200, blank=True, default='')
+    size = models.CharField(max_length=100, blank=True, default='')
+    color = models.CharField(max_length=100, blank=True, default='')
+    gst_rate = models.DecimalField(max_digits=5, decimal_places=2, default=0)
+    tax_amount = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    cost_price = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+
+    class Meta:
+        indexes = [
+            # Finding the line for a scanned item on a given invoice (returns)
+            models.Index(fields=['sale', 'variant'], name='sales_saleitem_sale_var_idx'),
+        ]
+
+    def snapshot(self, variant):
+        """Copy the variant's current name, attributes, GST rate and cost onto this line."""
+        self.product_name = variant.product.name
+        self.size = variant.size
+        self.color = variant.color
+        self.gst_rate = variant.gst_rate
+        self.cost_price = variant.price_cost
+        self.tax_amount = line_tax(self.total_price, self.gst_rate)
+
     def save(self, *args, **kwargs):
         self.total_price = self.quantity * self.unit_price
+        if not self.product_name:
+            self.snapshot(self.variant)
         super().save(*args, **kwargs)
 
     def __str__(self):
-        return f"{self.quantity} x {self.variant.product.name}"
+        return f"{self.quantity} x {self.product_name}"
 
 
 class Return(models.Model):
@@ -69,10 +110,15 @@ class Return(models.Model):
     refund_gst = models.DecimalField(max_digits=12, decimal_places=2, default=0)
     
     created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='sales_return_created_idx'),
+        ]
     
     def save(self, *args, **kwargs):
         if not self.return_number:
-            self.return_number = f"RET-{uuid.uuid4().hex[:8].upper()}"
+            self.return_number = next_number('RET')
         super().save(*args, **kwargs)
     
     def __str__(self):
@@ -85,6 +131,71 @@ class ReturnItem(models.Model):
     sale_item = models.ForeignKey(SaleItem, on_delete=models.CASCADE)
     quantity = models.PositiveIntegerField(default=1)
     refund_price = models.DecimalField(max_digits=12, decimal_places=2)
+    # GST refunded on this line, as rounded on the credit note
+    tax_amount = models.DecimalField(max_digits=12, decimal_places=2, default=0)
     
     def __str__(self):
-        return f"{self.quantity} x {self.sale_item.variant.product.name} returned"
+        return f"{self.quantity} x {self.sale_item.product_name} returned"
+
+
+class DailySalesRollup(models.Model):
+    """Per-day, per-payment-mode sales totals kept in step with each checkout"""
+    date = models.DateField()
+    payment_mode = models.CharField(max_length=10, choices=Sale.PAYMENT_MODES)
+
+    sales_count = models.PositiveIntegerField(default=0)
+    items_count = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    gst = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        unique_together = ('date', 'payment_mode')
+
+    def __str__(self):
+        return f"{self.date} {self.payment_mode} - {self.revenue}"
+
+
+class DailyReturnRollup(models.Model):
+    """Per-day return totals kept in step with each processed return"""
+    date = models.DateField(unique=True)
+
+    returns_count = models.PositiveIntegerField(default=0)
+    items_count = models.PositiveIntegerField(default=0)
+    refund_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    refund_gst = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    def __str__(self):
+        return f"{self.date} - ₹{self.refund_amount}"
+
+
+class DocumentSequence(models.Model):
+    """Next free invoice/return serial per store and financial year"""
+    store = models.CharField(max_length=10, blank=True, default='')
+    kind = models.CharField(max_length=3, help_text="INV or RET")
+    financial_year = models.CharField(max_length=4, help_text="e.g. 2627 for April 2026 - March 2027")
+    next_value = models.PositiveBigIntegerField(default=1)
+
+    class Meta:
+        unique_together = ('store', 'kind', 'financial_year')
+
+    def __str__(self):
+        return f"{self.store}{self.kind}-{self.financial_year} next {self.next_value}"
+
+
+class IdempotencyKey(models.Model):
+    """Client-generated key of a sale uploaded by a terminal, so retries are no-ops"""
+    key = models.CharField(max_length=64, unique=True)
+    sale = models.OneToOneField(Sale, related_name='idempotency_key', on_delete=models.CASCADE)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.key} -> {self.sale_id}"
+
+
+class SalesPurge(models.Model):
+    """A retention run (sales.purge): sales recorded before `before` were deleted"""
+    before = models.DateField(db_index=True)
+    started_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Sales before {self.before} purged on {self.started_at:%Y-%m-%d}"
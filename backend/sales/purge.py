@@ -0,0 +1,146 @@
+"""
+Bulk deletes that bypass the ORM's deletion collector.
+
+queryset.delete() loads every row it deletes, and every row related to
+it, to send signals and resolve CASCADE / PROTECT in Python: minutes and
+gigabytes on a large database. Here the dependency order is written down
+once (RESET_ORDER, children before parents) and each table is emptied
+with one statement, and whatever the skipped signals would have kept in
+step (search index, sync tombstones, caches) is reset directly.
+
+* reset()         everything behind /api/reset-database/: TRUNCATE of
+                  every table at once on PostgreSQL, an unqualified
+                  DELETE per table elsewhere (SQLite's truncate fast path),
+                  in one transaction so a failure leaves nothing half-wiped.
+* purge_sales()   retention: sales recorded before a date, with their
+                  lines, returns and idempotency keys, in batches of
+                  PURGE_BATCH_SIZE sales, each its own short transaction,
+                  so tills keep checking out while it runs. A sale with a
+                  return on or after the cutoff is kept, returns included.
+                  The daily rollups are kept, so dashboards still cover
+                  purged days; the GST report refuses them (sales.gst).
+                  `manage.py purge_sales` runs it.
+
+Both return the rows removed per table and the time taken.
+"""
+import time
+from datetime import datetime, time as dt_time
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from inventory import search, sync
+from inventory.cache import variant_cache
+from inventory.models import (
+    CatalogTombstone, Category, InventoryMovement, Product, ProductVariant, StockSnapshot, VariantSalesDay,
+)
+from jobs import generation
+
+from . import gst
+from .analytics import bump_data_version
+from .models import (
+    DailyReturnRollup, DailySalesRollup, IdempotencyKey, Return, ReturnItem, Sale, SaleItem, SalesPurge,
+)
+
+# Every table a reset empties, each before any table it references
+RESET_ORDER = (
+    ReturnItem, Return, IdempotencyKey, SaleItem, Sale,
+    DailySalesRollup, DailyReturnRollup, SalesPurge,
+    VariantSalesDay, StockSnapshot, InventoryMovement, ProductVariant, Product, Category,
+    CatalogTombstone,
+)
+
+
+def _batch_size():
+    return getattr(settings, 'PURGE_BATCH_SIZE', 500)
+
+
+def _report(removed, started):
+    return {
+        'tables': dict(removed),
+        'rows': sum(removed.values()),
+        'seconds': round(time.perf_counter() - started, 3),
+    }
+
+
+def reset():
+    """Empty every sales and catalog table; invoice / return numbering carries on."""
+    started = time.perf_counter()
+    tables = [model._meta.db_table for model in RESET_ORDER]
+    removed = {}
+    quote = connection.ops.quote_name
+    with transaction.atomic(), connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            for table in tables:
+                cursor.execute(f'SELECT COUNT(*) FROM {quote(table)}')
+                removed[table] = cursor.fetchone()[0]
+            # The search index goes with the catalog rather than row by row afterwards
+            extra = [search.TABLE] if search.available() else []
+            cursor.execute(f"TRUNCATE {', '.join(quote(table) for table in tables + extra)}")
+        else:
+            for table in tables:
+                cursor.execute(f'DELETE FROM {quote(table)}')
+                removed[table] = cursor.rowcount
+        search.rebuild()
+        sync.record_wipe()
+    variant_cache.clear()
+    bump_data_version()
+    gst.invalidate()
+    generation.bump('catalog', 'sales', 'purge')
+    return _report(removed, started)
+
+
+def _delete_sales(cursor, sale_ids):
+    """Delete `sale_ids` and everything that references them; rows removed per table."""
+    placeholders = ', '.join(['%s'] * len(sale_ids))
+    sales = f'({placeholders})'
+    returns = f'(SELECT id FROM {Return._meta.db_table} WHERE original_sale_id IN {sales})'
+    items = f'(SELECT id FROM {SaleItem._meta.db_table} WHERE sale_id IN {sales})'
+    statements = (
+        (ReturnItem, f'return_order_id IN {returns}'),
+        (ReturnItem, f'sale_item_id IN {items}'),
+        (Return, f'original_sale_id IN {sales}'),
+        (IdempotencyKey, f'sale_id IN {sales}'),
+        (SaleItem, f'sale_id IN {sales}'),
+        (Sale, f'id IN {sales}'),
+    )
+    removed = {}
+    for model, condition in statements:
+        table = model._meta.db_table
+        cursor.execute(f'DELETE FROM {table} WHERE {condition}', sale_ids)
+        removed[table] = removed.get(table, 0) + cursor.rowcount
+    return removed
+
+
+def purge_sales(before, batch_size=None, progress=None):
+    """
+    Delete the sales recorded before the local date `before`, and their
+    returns, in batches of `batch_size`. `progress` is called with the
+    sales removed so far after each batch.
+    """
+    started = time.perf_counter()
+    batch_size = batch_size or _batch_size()
+    cutoff = timezone.make_aware(datetime.combine(before, dt_time.min))
+    returned_since = Return.objects.filter(original_sale=OuterRef('pk'), created_at__gte=cutoff)
+    # Oldest first along sales_sale_created_idx; purged rows drop out of the next read
+    candidates = Sale.objects.filter(created_at__lt=cutoff).exclude(Exists(returned_since)) \
+        .order_by('created_at', 'id').values_list('id', flat=True)
+    # Recorded first: days before the cutoff are incomplete as soon as a batch goes
+    gst.purged(before)
+
+    removed = {}
+    while True:
+        with transaction.atomic():
+            sale_ids = list(candidates[:batch_size])
+            if not sale_ids:
+                break
+            with connection.cursor() as cursor:
+                for table, count in _delete_sales(cursor, sale_ids).items():
+                    removed[table] = removed.get(table, 0) + count
+        if progress is not None:
+            progress(removed[Sale._meta.db_table])
+    if removed:
+        bump_data_version()
+    return {'before': before, **_report(removed, started)}
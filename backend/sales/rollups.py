@@ -0,0 +1,139 @@
+"""
+Daily rollups behind the analytics dashboard.
+
+SaleSerializer.create / ReturnSerializer.create call record_sale /
+record_return inside their checkout transaction, so a rollup row never
+disagrees with the invoices it summarises. `manage.py rebuild_rollups`
+recomputes them from the raw tables for backfill or repair.
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from jobs import generation
+
+from .models import DailyReturnRollup, DailySalesRollup, Return, ReturnItem, Sale, SaleItem
+
+
+def _increment(model, lookup, **deltas):
+    """Add `deltas` to the row matching `lookup`, creating it on first use."""
+    updates = {field: F(field) + value for field, value in deltas.items()}
+    if model.objects.filter(**lookup).update(**updates):
+        return
+    try:
+        # Savepoint so a lost creation race does not poison the outer transaction
+        with transaction.atomic():
+            model.objects.create(**lookup, **deltas)
+    except IntegrityError:
+        model.objects.filter(**lookup).update(**updates)
+
+
+def _bump_analytics_on_commit():
+    # Deferred import: analytics imports the rollup models from this app
+    from .analytics import bump_data_version
+    transaction.on_commit(bump_data_version)
+
+
+def record_sale(sale, items_count):
+    _bump_analytics_on_commit()
+    _increment(
+        DailySalesRollup,
+        {'date': timezone.localdate(sale.created_at), 'payment_mode': sale.payment_mode},
+        sales_count=1,
+        items_count=items_count,
+        revenue=sale.total_amount,
+        gst=sale.gst_total,
+    )
+
+
+def record_return(return_order, items_count):
+    _bump_analytics_on_commit()
+    _increment(
+        DailyReturnRollup,
+        {'date': timezone.localdate(return_order.created_at)},
+        returns_count=1,
+        items_count=items_count,
+        refund_amount=return_order.refund_amount,
+        refund_gst=return_order.refund_gst,
+    )
+
+
+def rebuild(start=None, end=None):
+    """
+    Recompute rollups for local dates start..end (inclusive, either side
+    optional) from Sale/SaleItem/Return/ReturnItem. Returns the number of
+    sales and return rollup rows written.
+    """
+    tz = timezone.get_current_timezone()
+
+    def date_filter(qs, field):
+        qs = qs.annotate(day=TruncDate(field, tzinfo=tz))
+        if start:
+            qs = qs.filter(day__gte=start)
+        if end:
+            qs = qs.filter(day__lte=end)
+        return qs
+
+    # Headers and lines are aggregated separately: summing both across the
+    # join would count each header once per line.
+    sale_rows = {
+        (row['day'], row['payment_mode']): row
+        for row in date_filter(Sale.objects.all(), 'created_at')
+        .values('day', 'payment_mode')
+        .annotate(sales_count=Count('id'), revenue=Sum('total_amount'), gst=Sum('gst_total'))
+    }
+    sale_items = {
+        (row['day'], row['sale__payment_mode']): row['qty']
+        for row in date_filter(SaleItem.objects.all(), 'sale__created_at')
+        .values('day', 'sale__payment_mode')
+        .annotate(qty=Sum('quantity'))
+    }
+    return_rows = {
+        row['day']: row
+        for row in date_filter(Return.objects.all(), 'created_at')
+        .values('day')
+        .annotate(returns_count=Count('id'), refund_amount=Sum('refund_amount'), refund_gst=Sum('refund_gst'))
+    }
+    return_items = {
+        row['day']: row['qty']
+        for row in date_filter(ReturnItem.objects.all(), 'return_order__created_at')
+        .values('day')
+        .annotate(qty=Sum('quantity'))
+    }
+
+    with transaction.atomic():
+        for model in (DailySalesRollup, DailyReturnRollup):
+            stale = model.objects.all()
+            if start:
+                stale = stale.filter(date__gte=start)
+            if end:
+                stale = stale.filter(date__lte=end)
+            stale.delete()
+
+        DailySalesRollup.objects.bulk_create([
+            DailySalesRollup(
+                date=day,
+                payment_mode=payment_mode,
+                sales_count=row['sales_count'],
+                items_count=sale_items.get((day, payment_mode)) or 0,
+                revenue=row['revenue'] or 0,
+                gst=row['gst'] or 0,
+            )
+            for (day, payment_mode), row in sale_rows.items()
+        ], batch_size=1000)
+        DailyReturnRollup.objects.bulk_create([
+            DailyReturnRollup(
+                date=day,
+                returns_count=row['returns_count'],
+                items_count=return_items.get(day) or 0,
+                refund_amount=row['refund_amount'] or 0,
+                refund_gst=row['refund_gst'] or 0,
+            )
+            for day, row in return_rows.items()
+        ], batch_size=1000)
+        _bump_analytics_on_commit()
+        # Rebuilds run as jobs: let the web processes know too
+        transaction.on_commit(lambda: generation.bump('sales'))
+
+    return len(sale_rows), len(return_rows)
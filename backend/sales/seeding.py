@@ -0,0 +1,245 @@
+"""
+Synthetic scale data: a clothing catalog and a history of sales and
+returns, written with bulk_create in batches so even a million invoices
+seed in minutes with flat memory.
+
+Used by `manage.py seed_scale` and the benchmarks. Everything is added to
+what is already there (barcodes and invoice numbers carry a per-run tag,
+so seeding twice never collides); nothing is deleted. Sale lines carry the
+same snapshots checkout writes, and the rollups, search index and caches
+are rebuilt at the end, so every endpoint sees a consistent store.
+"""
+import random
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.utils import timezone
+
+from inventory import ledger, reorder, search
+from inventory.cache import variant_cache
+from inventory.models import Category, InventoryMovement, Product, ProductVariant
+from jobs import generation
+
+from . import gst, rollups
+from .analytics import bump_data_version
+from .models import Return, ReturnItem, Sale, SaleItem, line_tax
+
+# Named scales for --sales
+SCALES = {
+    '1k': 1_000,
+    '100k': 100_000,
+    '1m': 1_000_000,
+}
+
+CATEGORIES = ['Ethnic Wear', 'Western Wear', 'Menswear', 'Kidswear', 'Winter Wear', 'Accessories']
+GARMENTS = ['Kurti', 'Kurta', 'Saree', 'Lehenga', 'Shirt', 'Jeans', 'Dupatta', 'Jacket', 'Palazzo', 'Sherwani']
+BRANDS = ['Biba', 'Fabindia', 'W', 'Manyavar', 'Levis', 'Raymond', 'Aurelia', 'Global Desi']
+SIZES = ['XS', 'S', 'M', 'L', 'XL', 'XXL']
+COLORS = ['Red', 'Maroon', 'Navy Blue', 'Black', 'White', 'Mustard', 'Peach', 'Olive Green', 'Pink', 'Grey']
+GST_RATES = [Decimal('5.00'), Decimal('12.00'), Decimal('18.00')]
+PAYMENT_MODES = ['CASH', 'CASH', 'UPI', 'UPI', 'CARD']
+
+VARIANTS_PER_PRODUCT = len(SIZES) * 2
+MAX_LINES = 4
+RETURN_RATE = 0.03
+OPENING_STOCK = 10 ** 6  # seeded sales leave stock alone
+BATCH_SIZE = 5000
+
+
+def parse_scale(value):
+    """'1k' / '100k' / '1m' or a plain number of sales."""
+    value = str(value).strip().lower()
+    if value in SCALES:
+        return SCALES[value]
+    try:
+        number = int(value.replace('_', ''))
+    except ValueError:
+        raise ValueError(f"Unknown scale '{value}', expected one of {', '.join(SCALES)} or a number")
+    if number < 0:
+        raise ValueError('The number of sales cannot be negative')
+    return number
+
+
+@contextmanager
+def _backdating(*models):
+    """Let created_at be set explicitly: auto_now_add would stamp every row with now."""
+    fields = [model._meta.get_field('created_at') for model in models]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+def _batches(total, size):
+    for start in range(0, total, size):
+        yield start, min(size, total - start)
+
+
+def _ids(objects, model, field):
+    """Primary keys for freshly bulk-created rows, on backends that do not return them."""
+    if objects and objects[0].pk is None:
+        ids = dict(model.objects.filter(**{f'{field}__in': [getattr(obj, field) for obj in objects]})
+                   .values_list(field, 'id'))
+        for obj in objects:
+            obj.pk = ids[getattr(obj, field)]
+    return objects
+
+
+def seed_catalog(variants, tag, rng, batch_size=BATCH_SIZE):
+    """Create `variants` variants (and products to hold them); returns their sale snapshots."""
+    categories = []
+    for name in CATEGORIES:
+        category, _ = Category.objects.get_or_create(name=name)
+        categories.append(category)
+
+    product_count = -(-variants // VARIANTS_PER_PRODUCT)
+    products = []
+    for start, count in _batches(product_count, batch_size):
+        batch = [
+            Product(category=rng.choice(categories),
+                    name=f'{rng.choice(BRANDS)} {rng.choice(GARMENTS)} {tag}-{n}',
+                    brand=rng.choice(BRANDS))
+            for n in range(start, start + count)
+        ]
+        products.extend(_ids(Product.objects.bulk_create(batch), Product, 'name'))
+
+    for start, count in _batches(variants, batch_size):
+        batch = []
+        for n in range(start, start + count):
+            product = products[n // VARIANTS_PER_PRODUCT]
+            slot = n % VARIANTS_PER_PRODUCT
+            price = Decimal(rng.randrange(300, 5000, 50))
+            batch.append(ProductVariant(
+                product=product, size=SIZES[slot % len(SIZES)], color=COLORS[slot // len(SIZES)],
+                barcode=f'SEED{tag}{n:07d}', price_retail=price, price_cost=(price * Decimal('0.55')).quantize(Decimal('1')),
+                gst_rate=rng.choice(GST_RATES), stock_quantity=OPENING_STOCK,
+            ))
+        ProductVariant.objects.bulk_create(batch)
+
+    catalog = list(
+        ProductVariant.objects.filter(barcode__startswith=f'SEED{tag}').order_by('id')
+        .values_list('id', 'product__name', 'size', 'color', 'price_retail', 'gst_rate', 'price_cost')
+    )
+    # Opening stock, so the movement ledger reconciles
+    ledger.record({variant[0]: OPENING_STOCK for variant in catalog}, InventoryMovement.RECEIPT, 'seed')
+    return catalog
+
+
+def seed_sales(sales, catalog, tag, rng, days=365, batch_size=BATCH_SIZE):
+    """
+    Create `sales` invoices of 1-MAX_LINES lines spread over the last `days`
+    days, and return about RETURN_RATE of them within a week. Returns the
+    number of returns.
+    """
+    now = timezone.now()
+    span = days * 24 * 3600
+    returns = 0
+    with _backdating(Sale, Return):
+        for start, count in _batches(sales, batch_size):
+            with transaction.atomic():
+                headers = []
+                lines = []
+                for n in range(start, start + count):
+                    sale = Sale(
+                        invoice_number=f'SEED{tag}-{n:07d}',
+                        payment_mode=rng.choice(PAYMENT_MODES),
+                        customer_phone=f'9{rng.randrange(10 ** 8, 10 ** 9)}' if rng.random() < 0.4 else None,
+                        created_at=now - timedelta(seconds=rng.randrange(span)),
+                    )
+                    sale_lines = []
+                    for _ in range(rng.randint(1, MAX_LINES)):
+                        variant_id, name, size, color, price, rate, cost = rng.choice(catalog)
+                        quantity = 1 if rng.random() < 0.85 else 2
+                        total = price * quantity
+                        sale_lines.append(SaleItem(
+                            variant_id=variant_id, quantity=quantity, unit_price=price, total_price=total,
+                            product_name=name, size=size, color=color, gst_rate=rate,
+                            tax_amount=line_tax(total, rate), cost_price=cost,
+                        ))
+                    sale.gst_total = sum(line.tax_amount for line in sale_lines)
+                    sale.total_amount = sum(line.total_price for line in sale_lines) + sale.gst_total
+                    headers.append(sale)
+                    lines.append(sale_lines)
+
+                _ids(Sale.objects.bulk_create(headers), Sale, 'invoice_number')
+                for sale, sale_lines in zip(headers, lines):
+                    for line in sale_lines:
+                        line.sale_id = sale.pk
+                items = SaleItem.objects.bulk_create([line for sale_lines in lines for line in sale_lines])
+                if items and items[0].pk is None:
+                    _line_ids(headers, lines)
+
+                returned = [(sale, sale_lines[0]) for sale, sale_lines in zip(headers, lines)
+                            if rng.random() < RETURN_RATE]
+                orders = [
+                    Return(
+                        return_number=f'SEED{tag}-R{start + n:07d}', original_sale=sale, reason='WRONG_SIZE',
+                        refund_amount=line.total_price + line.tax_amount, refund_gst=line.tax_amount,
+                        created_at=min(sale.created_at + timedelta(hours=rng.randrange(1, 24 * 7)), now),
+                    )
+                    for n, (sale, line) in enumerate(returned)
+                ]
+                _ids(Return.objects.bulk_create(orders), Return, 'return_number')
+                ReturnItem.objects.bulk_create([
+                    ReturnItem(return_order=order, sale_item_id=line.pk, quantity=line.quantity,
+                               refund_price=line.total_price, tax_amount=line.tax_amount)
+                    for order, (_, line) in zip(orders, returned)
+                ])
+                returns += len(orders)
+    return returns
+
+
+def _line_ids(headers, lines):
+    """Fill in line ids by (sale, position) where bulk_create did not return them."""
+    by_sale = {}
+    for sale_id, line_id in SaleItem.objects.filter(sale_id__in=[sale.pk for sale in headers]) \
+            .order_by('sale_id', 'id').values_list('sale_id', 'id'):
+        by_sale.setdefault(sale_id, []).append(line_id)
+    for sale, sale_lines in zip(headers, lines):
+        for line, line_id in zip(sale_lines, by_sale[sale.pk]):
+            line.pk = line_id
+
+
+def refresh_derived():
+    """Rebuild what bulk_create skipped: rollups, sales velocity, the search index and the caches."""
+    rollups.rebuild()
+    reorder.rebuild()
+    search.rebuild()
+    variant_cache.clear()
+    bump_data_version()
+    gst.invalidate()
+    generation.bump('catalog', 'sales')
+
+
+def seed(sales, variants=50_000, days=365, batch_size=BATCH_SIZE, random_seed=None, log=None):
+    """Seed a catalog of `variants` and `sales` invoices. Returns counts and timings."""
+    rng = random.Random(random_seed)
+    tag = format(int(time.time() * 1000) % 16 ** 8, 'X')
+    log = log or (lambda message: None)
+
+    started = time.perf_counter()
+    catalog = seed_catalog(variants, tag, rng, batch_size)
+    catalog_seconds = time.perf_counter() - started
+    log(f'{len(catalog)} variants in {catalog_seconds:.1f}s')
+
+    started = time.perf_counter()
+    returns = seed_sales(sales, catalog, tag, rng, days, batch_size) if catalog else 0
+    sales_seconds = time.perf_counter() - started
+    log(f'{sales} sales and {returns} returns in {sales_seconds:.1f}s')
+
+    started = time.perf_counter()
+    refresh_derived()
+    log(f'Rollups, velocity, search index and caches rebuilt in {time.perf_counter() - started:.1f}s')
+
+    return {
+        'variants': len(catalog),
+        'sales': sales if catalog else 0,
+        'returns': returns,
+        'seconds': {'catalog': round(catalog_seconds, 2), 'sales': round(sales_seconds, 2)},
+    }
@@ -0,0 +1,104 @@
+"""
+Invoice and return number allocation.
+
+Numbers are consecutive per store and Indian financial year (April-March),
+e.g. INV-2627-00042, as GST invoicing expects, and come from the
+DocumentSequence counter table rather than random UUID fragments, so they
+can never collide.
+
+Two modes, chosen with INVOICE_NUMBER_BLOCK_SIZE:
+
+* 1 (default): gap-free. The number is taken inside the checkout
+  transaction and the counter row stays locked until it commits, so a
+  failed checkout gives its number back. On SQLite this costs nothing
+  extra, since IMMEDIATE transactions already serialise writers.
+* N > 1: each worker process reserves N numbers in one short committed
+  transaction and hands them out from memory, so sales take no shared lock
+  on the counter. Numbers stay unique and increase within a worker, but a
+  worker that exits with part of a block unused leaves a gap.
+"""
+import os
+import threading
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+_blocks = {}
+_lock = threading.Lock()
+
+
+def financial_year(day=None):
+    """'2627' for any date from 1 April 2026 to 31 March 2027."""
+    day = day or timezone.localdate()
+    start = day.year if day.month >= 4 else day.year - 1
+    return f"{start % 100:02d}{(start + 1) % 100:02d}"
+
+
+def _store():
+    return getattr(settings, 'STORE_CODE', '')
+
+
+def _block_size():
+    return getattr(settings, 'INVOICE_NUMBER_BLOCK_SIZE', 1)
+
+
+def _take(kind, fy, count):
+    """Advance the counter by `count` and return the first number taken."""
+    from .models import DocumentSequence
+
+    lookup = {'store': _store(), 'kind': kind, 'financial_year': fy}
+    with transaction.atomic():
+        sequence = DocumentSequence.objects.select_for_update().filter(**lookup).first()
+        if sequence is None:
+            try:
+                with transaction.atomic():
+                    sequence = DocumentSequence.objects.create(**lookup)
+            except IntegrityError:
+                # Another worker opened this year's sequence first
+                sequence = DocumentSequence.objects.select_for_update().get(**lookup)
+        DocumentSequence.objects.filter(pk=sequence.pk).update(next_value=F('next_value') + count)
+    return sequence.next_value
+
+
+def _from_block(key):
+    with _lock:
+        block = _blocks.get(key)
+        if block and block[0] <= block[1]:
+            block[0] += 1
+            return block[0] - 1
+    return None
+
+
+def reserve(kind):
+    """
+    Make sure this worker holds unused numbers for `kind`, reserving a new
+    block if needed. Call it before opening the checkout transaction: the
+    reservation has to commit on its own. A no-op in gap-free mode or when
+    already inside a transaction.
+    """
+    size = _block_size()
+    if size <= 1 or connection.in_atomic_block:
+        return
+    fy = financial_year()
+    key = (os.getpid(), kind, fy)
+    with _lock:
+        block = _blocks.get(key)
+        if block and block[0] <= block[1]:
+            return
+    # The DB round-trip happens outside _lock: a thread of this process may
+    # hold the counter row in an open transaction and need _lock to finish.
+    first = _take(kind, fy, size)
+    with _lock:
+        _blocks[key] = [first, first + size - 1]
+
+
+def next_number(kind):
+    """Next document number for `kind` ('INV' or 'RET')."""
+    fy = financial_year()
+    # Blocks are keyed by pid so a forked worker never reuses its parent's
+    value = _from_block((os.getpid(), kind, fy))
+    if value is None:
+        value = _take(kind, fy, 1)
+    return f"{_store()}{kind}-{fy}-{value:05d}"
@@ -1,70 +1,113 @@
+from collections import defaultdict
+
 from rest_framework import serializers
-from .models import Sale, SaleItem, Return, ReturnItem
-from inventory.models import ProductVariant
-from django.db import transaction
+from .models import Sale, SaleItem, Return, ReturnItem, line_tax
+from inventory.models import InventoryMovement, ProductVariant
+from inventory import ledger, reorder
+from inventory.stock import decrement_stock, increment_stock
+from django.db import connection, transaction
+from django.db.models import Prefetch, prefetch_related_objects
+from django.utils import timezone
+from backend_proj.serializers import SparseFieldsMixin
+from . import rollups, sequences
 
 class SaleItemSerializer(serializers.ModelSerializer):
-    variant_name = serializers.ReadOnlyField(source='variant.product.name')
-    variant_size = serializers.ReadOnlyField(source='variant.size')
-    variant_color = serializers.ReadOnlyField(source='variant.color')
-    variant_details = serializers.ReadOnlyField(source='variant.__str__')
+    # Plain id on input: SaleSerializer.create resolves every line's variant
+    # in one locking query instead of one lookup per line during validation.
+    variant = serializers.IntegerField(source='variant_id')
+    # Name and attributes as sold, not as the catalog reads today
+    variant_name = serializers.ReadOnlyField(source='product_name')
+    variant_size = serializers.ReadOnlyField(source='size')
+    variant_color = serializers.ReadOnlyField(source='color')
+    variant_details = serializers.SerializerMethodField()
 
     class Meta:
         model = SaleItem
-        fields = ['id', 'variant', 'variant_name', 'variant_size', 'variant_color', 'variant_details', 'quantity', 'unit_price', 'total_price']
-        read_only_fields = ['total_price']
+        fields = ['id', 'variant', 'variant_name', 'variant_size', 'variant_color', 'variant_details', 'quantity', 'unit_price', 'total_price', 'gst_rate', 'tax_amount']
+        read_only_fields = ['total_price', 'gst_rate', 'tax_amount']
+        extra_kwargs = {'quantity': {'min_value': 1}}
+
+    def get_variant_details(self, obj):
+        return f"{obj.product_name} ({obj.size}/{obj.color}) - {obj.variant.barcode}"
 
-class SaleSerializer(serializers.ModelSerializer):
+class SaleSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     items = SaleItemSerializer(many=True)
 
     class Meta:
         model = Sale
         fields = ['id', 'invoice_number', 'customer_name', 'customer_phone', 'total_amount', 'gst_total', 'payment_mode', 'created_at', 'items']
-        read_only_fields = ['invoice_number', 'created_at']
+        # Totals are always computed server-side from the locked variants
+        read_only_fields = ['invoice_number', 'total_amount', 'gst_total', 'created_at']
+
+    def validate_items(self, value):
+        if not value:
+            raise serializers.ValidationError("A sale needs at least one item.")
+        return value
 
     def create(self, validated_data):
+        """
+        Checkout in a constant number of queries however long the bill is:
+        lock the cart's variants (in id order, so two tills locking
+        overlapping carts cannot deadlock), decrement stock with one
+        conditional UPDATE (WHERE stock_quantity >= qty), insert the header once and the lines in bulk.
+        """
         items_data = validated_data.pop('items')
-        
+
+        wanted = defaultdict(int)
+        for item_data in items_data:
+            wanted[item_data['variant_id']] += item_data['quantity']
+
+        sequences.reserve('INV')
         with transaction.atomic():
-            sale = Sale.objects.create(**validated_data)
-            
+            locked = ProductVariant.objects.select_for_update(**self._lock_of()).select_related('product')
+            variants = {v.id: v for v in locked.filter(id__in=wanted).order_by('id')}
+
+            missing = sorted(set(wanted) - set(variants))
+            if missing:
+                raise serializers.ValidationError({'items': f"Unknown variant id(s): {missing}"})
+
+            # Deduct Stock (raises InsufficientStock listing every short line)
+            decrement_stock(wanted, variants)
+
+            # Calculate Price & GST
+            lines = []
             total_amount = 0
             gst_total_amount = 0
-
             for item_data in items_data:
-                variant = item_data['variant']
+                variant = variants[item_data['variant_id']]
                 quantity = item_data['quantity']
-                
-                # Check Stock
-                if variant.stock_quantity < quantity:
-                    raise serializers.ValidationError(f"Insufficient stock for {variant}")
-
-                # Deduct Stock
-                variant.stock_quantity -= quantity
-                variant.save()
-
-                # Calculate Price & GST
                 unit_price = variant.price_retail
-                total_line_price = unit_price * quantity
-                tax_amount = (total_line_price * variant.gst_rate) / 100
-                
-                SaleItem.objects.create(
-                    sale=sale,
+                line = SaleItem(
                     variant=variant,
                     quantity=quantity,
                     unit_price=unit_price,
-                    total_price=total_line_price
+                    total_price=unit_price * quantity
                 )
-                
-                total_amount += total_line_price + tax_amount
-                gst_total_amount += tax_amount
+                # Keep the rate, tax and names as sold; GST is rounded per
+                # line so the lines always add up to the invoice total
+                line.snapshot(variant)
+                lines.append(line)
+                total_amount += line.total_price + line.tax_amount
+                gst_total_amount += line.tax_amount
 
-            sale.total_amount = total_amount
-            sale.gst_total = gst_total_amount
-            sale.save()
-            
+            sale = Sale.objects.create(**validated_data, total_amount=total_amount, gst_total=gst_total_amount)
+            for line in lines:
+                line.sale = sale
+            SaleItem.objects.bulk_create(lines)
+
+            ledger.record({variant_id: -quantity for variant_id, quantity in wanted.items()},
+                          InventoryMovement.SALE, sale.invoice_number)
+            rollups.record_sale(sale, sum(wanted.values()))
+            reorder.record_units(wanted, timezone.localdate(sale.created_at))
+
+        prefetch_related_objects([sale], Prefetch('items', queryset=SaleItem.objects.select_related('variant')))
         return sale
 
+    @staticmethod
+    def _lock_of():
+        # Lock only the variant rows, not the joined product rows, where supported
+        return {'of': ('self',)} if connection.features.has_select_for_update_of else {}
+
 
 class ReturnItemSerializer(serializers.ModelSerializer):
     product_name = serializers.SerializerMethodField()
@@ -75,10 +118,10 @@ class ReturnItemSerializer(serializers.ModelSerializer):
         read_only_fields = ['refund_price']
     
     def get_product_name(self, obj):
-        return f"{obj.sale_item.variant.product.name} ({obj.sale_item.variant.size}/{obj.sale_item.variant.color})"
+        return f"{obj.sale_item.product_name} ({obj.sale_item.size}/{obj.sale_item.color})"
 
 
-class ReturnSerializer(serializers.ModelSerializer):
+class ReturnSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     items = ReturnItemSerializer(many=True)
     original_invoice = serializers.ReadOnlyField(source='original_sale.invoice_number')
     
@@ -91,36 +134,46 @@ class ReturnSerializer(serializers.ModelSerializer):
     def create(self, validated_data):
         items_data = validated_data.pop('items')
         
+        sequences.reserve('RET')
         with transaction.atomic():
             return_order = Return.objects.create(**validated_data)
             
             total_refund = 0
             total_gst_refund = 0
+            restock = defaultdict(int)
             
             for item_data in items_data:
                 sale_item = item_data['sale_item']
                 quantity = item_data['quantity']
                 
-                # Calculate refund
+                # Refund at the price and GST rate the line was sold at
                 refund_price = sale_item.unit_price * quantity
-                gst_refund = (refund_price * sale_item.variant.gst_rate) / 100
+                gst_refund = line_tax(refund_price, sale_item.gst_rate)
                 
-                # Restore stock
-                sale_item.variant.stock_quantity += quantity
-                sale_item.variant.save()
+                restock[sale_item.variant_id] += quantity
                 
                 ReturnItem.objects.create(
                     return_order=return_order,
                     sale_item=sale_item,
                     quantity=quantity,
-                    refund_price=refund_price
+                    refund_price=refund_price,
+                    tax_amount=gst_refund,
                 )
                 
                 total_refund += refund_price + gst_refund
                 total_gst_refund += gst_refund
+
+            # Restore stock with an in-database increment, not read-modify-write
+            increment_stock(restock)
+            ledger.record(restock, InventoryMovement.RETURN, return_order.return_number)
             
             return_order.refund_amount = total_refund
             return_order.refund_gst = total_gst_refund
             return_order.save()
+
+            rollups.record_return(return_order, sum(item['quantity'] for item in items_data))
+            # Returns count against the day they come back, netting velocity down
+            reorder.record_units({variant_id: -quantity for variant_id, quantity in restock.items()},
+                                 timezone.localdate(return_order.created_at))
         
         return return_order
@@ -0,0 +1,26 @@
+"""
+Background jobs for sales (jobs.queue): GST reports over long ranges and
+rollup rebuilds.
+"""
+from datetime import date
+
+from jobs.queue import task
+
+from . import gst, rollups
+
+
+def _date(value):
+    return date.fromisoformat(value) if value else None
+
+
+@task('sales.gst_report')
+def gst_report(job, start, end):
+    """Same payload as GET /api/reports/gst/ for local dates `start`..`end` (ISO)."""
+    return gst.report(_date(start), _date(end))
+
+
+@task('sales.rebuild_rollups')
+def rebuild_rollups(job, start=None, end=None):
+    """As `manage.py rebuild_rollups`: recompute the daily rollups for `start`..`end` (ISO, open-ended)."""
+    sales_rows, return_rows = rollups.rebuild(start=_date(start), end=_date(end))
+    return {'sales_rollups': sales_rows, 'return_rollups': return_rows}
@@ -1,3 +1,1008 @@
-from django.test import TestCase
+import csv
+import gzip
+import io
+import json
+import threading
+from datetime import date, timedelta
+from decimal import Decimal
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, iscoroutinefunction
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.models import Min, Sum
+from django.db import transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from backend_proj import concurrency, instrumentation, query_inspector, query_plans
+from inventory import ledger, reorder, search
+from inventory.models import CatalogTombstone, Category, Product, ProductVariant, StockSnapshot
+from inventory.stock import InsufficientStock, decrement_stock
+from . import analytics, gst, purge, rollups, seeding, sequences
+from .models import Sale, SaleItem, Return, ReturnItem, DailySalesRollup, DailyReturnRollup, DocumentSequence, IdempotencyKey
+
+
+class SalesFixtureMixin:
+    """Builds a small catalog and helpers to ring up sales and returns."""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        category = Category.objects.create(name='Kurtis')
+        self.variants = []
+        for i in range(3):
+            product = Product.objects.create(category=category, name=f'Kurti {i}')
+            self.variants.append(ProductVariant.objects.create(
+                product=product, size='M', color='Blue', barcode=f'KRT{i:03d}',
+                price_retail=Decimal('500.00'), gst_rate=Decimal('5.00'), stock_quantity=1000,
+            ))
+
+    def make_sale(self, lines=3, payment_mode='CASH'):
+        sale = Sale.objects.create(payment_mode=payment_mode)
+        for variant in self.variants[:lines]:
+            SaleItem.objects.create(
+                sale=sale, variant=variant, quantity=1,
+                unit_price=variant.price_retail, total_price=variant.price_retail,
+            )
+        sale.total_amount = Decimal('525.00') * lines
+        sale.gst_total = Decimal('25.00') * lines
+        sale.save()
+        return sale
+
+    def make_return(self, sale):
+        return_order = Return.objects.create(original_sale=sale, refund_amount=Decimal('525.00'))
+        for sale_item in sale.items.all():
+            ReturnItem.objects.create(
+                return_order=return_order, sale_item=sale_item,
+                quantity=1, refund_price=sale_item.unit_price, tax_amount=sale_item.tax_amount,
+            )
+        return return_order
+
+    def post_sale(self, variants=None, quantity=2, payment_mode='CASH'):
+        return self.client.post('/api/sales/', {
+            'payment_mode': payment_mode,
+            'items': [{'variant': variant.id, 'quantity': quantity, 'unit_price': str(variant.price_retail)}
+                      for variant in variants or self.variants[:1]],
+        }, format='json')
+
+    def checkout(self, variants=None, quantity=2, payment_mode='CASH'):
+        """Ring up a sale through the API, as a till does."""
+        response = self.post_sale(variants, quantity, payment_mode)
+        self.assertEqual(response.status_code, 201, response.data)
+        return Sale.objects.get(pk=response.data['id'])
+
+    def process_return(self, sale, quantity=1, items=None):
+        """Return `quantity` of each of `items` (the sale's first line by default) through the API."""
+        response = self.client.post('/api/returns/', {
+            'original_sale': sale.id,
+            'reason': 'WRONG_SIZE',
+            'items': [{'sale_item': item.id, 'quantity': quantity} for item in items or [sale.items.first()]],
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        return Return.objects.get(pk=response.data['id'])
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+
+class QueryBudgetTests(SalesFixtureMixin, TestCase):
+    """Serializing N invoices must not cost O(N) queries."""
+
+    def test_sales_list(self):
+        self.make_sale()
+        with self.assertNumQueries(2):
+            self.client.get('/api/sales/')
+        for _ in range(10):
+            self.make_sale()
+        with self.assertNumQueries(2):
+            self.client.get('/api/sales/')
+
+    def test_sale_detail(self):
+        sale = self.make_sale()
+        with self.assertNumQueries(2):
+            self.client.get(f'/api/sales/{sale.id}/')
+
+    def test_returns_list(self):
+        self.make_return(self.make_sale())
+        with self.assertNumQueries(2):
+            self.client.get('/api/returns/')
+        for _ in range(10):
+            self.make_return(self.make_sale())
+        with self.assertNumQueries(2):
+            self.client.get('/api/returns/')
+
+    def test_return_detail(self):
+        return_order = self.make_return(self.make_sale())
+        with self.assertNumQueries(2):
+            self.client.get(f'/api/returns/{return_order.id}/')
+
+    def test_analytics_is_constant(self):
+        self.make_sale()
+        baseline = self.count_queries('/api/sales/analytics/')
+        for _ in range(10):
+            self.make_sale()
+        cache.clear()  # make_sale bypasses the commit hook that invalidates it
+        self.assertEqual(self.count_queries('/api/sales/analytics/'), baseline)
+
+
+class PaginationTests(SalesFixtureMixin, TestCase):
+    def test_sales_list_is_cursor_paginated(self):
+        sales = [self.make_sale(lines=1) for _ in range(5)]
+        response = self.client.get('/api/sales/', {'page_size': 2})
+        self.assertEqual([s['id'] for s in response.data['results']], [sales[4].id, sales[3].id])
+        self.assertIsNotNone(response.data['next'])
+
+        # A sale rung up mid-pagination must not shift the next page
+        self.make_sale(lines=1)
+        response = self.client.get(response.data['next'])
+        self.assertEqual([s['id'] for s in response.data['results']], [sales[2].id, sales[1].id])
+
+    def test_sparse_fields(self):
+        self.make_sale()
+        response = self.client.get('/api/sales/', {'fields': 'id,invoice_number'})
+        self.assertEqual(set(response.data['results'][0]), {'id', 'invoice_number'})
+
+    def test_variants_paginate_by_id(self):
+        response = self.client.get('/api/variants/', {'page_size': 2})
+        self.assertEqual([v['id'] for v in response.data['results']], [self.variants[2].id, self.variants[1].id])
+
+
+class RollupTests(SalesFixtureMixin, TestCase):
+    def test_checkout_and_return_update_rollups(self):
+        sale = self.checkout()
+        self.checkout()
+        self.checkout(payment_mode='UPI', quantity=1)
+        self.process_return(sale)
+
+        cash = DailySalesRollup.objects.get(payment_mode='CASH')
+        self.assertEqual(cash.sales_count, 2)
+        self.assertEqual(cash.items_count, 4)
+        self.assertEqual(cash.revenue, Decimal('2100.00'))
+        self.assertEqual(cash.gst, Decimal('100.00'))
+        self.assertEqual(DailySalesRollup.objects.get(payment_mode='UPI').revenue, Decimal('525.00'))
+
+        returned = DailyReturnRollup.objects.get()
+        self.assertEqual((returned.returns_count, returned.items_count), (1, 1))
+        self.assertEqual(returned.refund_amount, Decimal('525.00'))
+
+    def test_rebuild_matches_incremental(self):
+        self.process_return(self.checkout(quantity=3))
+        self.checkout(payment_mode='CARD')
+        snapshot = lambda: (
+            list(DailySalesRollup.objects.order_by('payment_mode').values('date', 'payment_mode', 'sales_count', 'items_count', 'revenue', 'gst')),
+            list(DailyReturnRollup.objects.values('date', 'returns_count', 'items_count', 'refund_amount', 'refund_gst')),
+        )
+        incremental = snapshot()
+        rollups.rebuild()
+        self.assertEqual(snapshot(), incremental)
+
+    def test_analytics_reads_rollups(self):
+        self.process_return(self.checkout(quantity=3))
+        self.checkout(payment_mode='UPI')
+        summary = self.client.get('/api/sales/analytics/').data['summary']
+        self.assertEqual(summary['total_sales'], 2)
+        self.assertEqual(summary['total_items'], 4)
+        self.assertEqual(summary['gross_revenue'], 2625.0)
+        self.assertEqual(summary['total_refunds'], 525.0)
+        self.assertEqual(summary['total_returns'], 1)
+
+
+class SeriesTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        DailySalesRollup.objects.create(date=date(2026, 1, 30), payment_mode='CASH', sales_count=2, revenue=Decimal('100'))
+        DailySalesRollup.objects.create(date=date(2026, 1, 31), payment_mode='UPI', sales_count=1, revenue=Decimal('50'))
+        DailySalesRollup.objects.create(date=date(2026, 3, 2), payment_mode='CASH', sales_count=1, revenue=Decimal('70'))
+        DailyReturnRollup.objects.create(date=date(2026, 3, 3), returns_count=1, refund_amount=Decimal('20'))
+
+    def test_month_series_fills_gaps(self):
+        with self.assertNumQueries(2):
+            points = analytics.series(date(2026, 1, 15), date(2026, 3, 31), granularity='month')
+        self.assertEqual([p['label'] for p in points], ['January 2026', 'February 2026', 'March 2026'])
+        self.assertEqual([p['revenue'] for p in points], [150.0, 0.0, 70.0])
+        self.assertEqual([p['count'] for p in points], [3, 0, 1])
+        self.assertEqual(points[2]['net'], 50.0)
+
+    def test_week_series_starts_on_monday(self):
+        points = analytics.series(date(2026, 1, 28), date(2026, 2, 8), granularity='week')
+        self.assertEqual([p['period'] for p in points], [date(2026, 1, 26), date(2026, 2, 2)])
+        self.assertEqual([p['revenue'] for p in points], [150.0, 0.0])
+
+    def test_day_series(self):
+        points = analytics.series(date(2026, 3, 1), date(2026, 3, 3), granularity='day')
+        self.assertEqual([p['revenue'] for p in points], [0.0, 70.0, 0.0])
+        self.assertEqual([p['refunds'] for p in points], [0.0, 0.0, 20.0])
+
+    def test_endpoint_accepts_date_range_and_granularity(self):
+        response = APIClient().get('/api/sales/analytics/', {
+            'start_date': '2026-01-01', 'end_date': '2026-03-31', 'granularity': 'month',
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['series']['points']), 3)
+        self.assertEqual(response.data['summary']['total_sales'], 4)
+        self.assertEqual(len(response.data['monthly_data']), 12)
+
+    def test_endpoint_rejects_unknown_granularity(self):
+        response = APIClient().get('/api/sales/analytics/', {'granularity': 'hour'})
+        self.assertEqual(response.status_code, 400)
+
+
+class CheckoutTests(SalesFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        product = self.variants[0].product
+        for i in range(30):
+            self.variants.append(ProductVariant.objects.create(
+                product=product, size=f'W{i}', color='Gold', barcode=f'WED{i:03d}',
+                price_retail=Decimal('1000.00'), gst_rate=Decimal('12.00'), stock_quantity=5,
+            ))
+
+    def test_query_count_does_not_grow_with_lines(self):
+        self.checkout(quantity=1)  # creates today's rollup row
+        with CaptureQueriesContext(connection) as one_line:
+            self.assertEqual(self.post_sale(self.variants[3:4], quantity=1).status_code, 201)
+        with CaptureQueriesContext(connection) as thirty_lines:
+            response = self.post_sale(self.variants[3:], quantity=1)
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(len(thirty_lines), len(one_line))
+        self.assertEqual(len(response.data['items']), 30)
+
+    def test_totals_and_stock(self):
+        sale = self.checkout(self.variants[3:5], quantity=2)
+        self.assertEqual((sale.total_amount, sale.gst_total), (Decimal('4480.00'), Decimal('480.00')))
+        self.variants[3].refresh_from_db()
+        self.assertEqual(self.variants[3].stock_quantity, 3)
+
+    def test_repeated_variant_lines_share_stock(self):
+        response = self.post_sale([self.variants[3]] * 2, quantity=3)
+        self.assertEqual(response.status_code, 400)
+        self.variants[3].refresh_from_db()
+        self.assertEqual(self.variants[3].stock_quantity, 5)
+
+    def test_insufficient_stock_rolls_back_everything(self):
+        response = self.post_sale(self.variants[3:6], quantity=6)
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Sale.objects.exists())
+        self.variants[3].refresh_from_db()
+        self.assertEqual(self.variants[3].stock_quantity, 5)
+
+    def test_insufficient_stock_lists_every_short_line(self):
+        ProductVariant.objects.filter(pk=self.variants[4].pk).update(stock_quantity=1)
+        response = self.post_sale(self.variants[3:6], quantity=6)
+        self.assertEqual(response.status_code, 400)
+        short = response.data['short_lines']
+        self.assertEqual([line['variant'] for line in short], [v.id for v in self.variants[3:6]])
+        self.assertEqual([line['available'] for line in short], [5, 1, 5])
+        self.assertEqual(short[0]['requested'], 6)
+        self.assertIn('Insufficient stock for', response.data['error'])
+
+    def test_conditional_update_refuses_stale_stock(self):
+        variant = self.variants[3]
+        stale = {variant.id: variant}  # still believes 5 are on the shelf
+        ProductVariant.objects.filter(pk=variant.pk).update(stock_quantity=1)
+        with self.assertRaises(InsufficientStock):
+            decrement_stock({variant.id: 2}, stale)
+        variant.refresh_from_db()
+        self.assertEqual(variant.stock_quantity, 1)
+
+    def test_return_restocks(self):
+        self.process_return(self.checkout(self.variants[3:4], quantity=3), quantity=2)
+        self.variants[3].refresh_from_db()
+        self.assertEqual(self.variants[3].stock_quantity, 4)
+
+    def test_lines_snapshot_variant_and_tax(self):
+        variant = self.variants[3]
+        variant.price_cost = Decimal('600.00')
+        variant.save()
+        sale = self.checkout([variant], quantity=2)
+
+        # Later catalog edits must not rewrite history
+        variant.gst_rate = Decimal('18.00')
+        variant.size = 'W99'
+        variant.save()
+        variant.product.name = 'Renamed Kurti'
+        variant.product.save()
+
+        line = sale.items.get()
+        self.assertEqual((line.product_name, line.size, line.color), ('Kurti 0', 'W0', 'Gold'))
+        self.assertEqual((line.gst_rate, line.tax_amount, line.cost_price),
+                         (Decimal('12.00'), Decimal('240.00'), Decimal('600.00')))
+        self.assertEqual(sum(item.tax_amount for item in sale.items.all()), sale.gst_total)
+
+        response = self.client.post('/api/returns/', {
+            'original_sale': sale.id, 'items': [{'sale_item': line.id, 'quantity': 1}],
+        }, format='json')
+        self.assertEqual(Decimal(response.data['refund_gst']), Decimal('120.00'))
+        self.assertEqual(response.data['items'][0]['product_name'], 'Kurti 0 (W0/Gold)')
+
+        top = self.client.get('/api/sales/analytics/').data['top_products']
+        self.assertEqual((top[0]['product_name'], top[0]['variant_size']), ('Kurti 0', 'W0'))
+
+    def test_unknown_variant(self):
+        response = self.client.post('/api/sales/', {
+            'payment_mode': 'CASH', 'items': [{'variant': 999999, 'quantity': 1, 'unit_price': '1'}],
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class AnalyticsCacheTests(SalesFixtureMixin, TestCase):
+    @override_settings(DATA_GENERATION_RECHECK=60)  # no generation read on the hit
+    def test_repeat_request_is_served_from_cache(self):
+        first = self.client.get('/api/sales/analytics/', {'days': 7})
+        self.assertEqual(first['X-Analytics-Cache'], 'miss')
+        with self.assertNumQueries(0):
+            second = self.client.get('/api/sales/analytics/', {'days': 7})
+        self.assertEqual(second['X-Analytics-Cache'], 'hit')
+        self.assertEqual(second.data, first.data)
+
+        stats = self.client.get('/api/sales/analytics/cache/').data
+        self.assertEqual((stats['hits'], stats['misses']), (1, 1))
+
+    def test_committed_sale_invalidates(self):
+        self.assertEqual(self.client.get('/api/sales/analytics/').data['summary']['total_sales'], 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.checkout()
+        response = self.client.get('/api/sales/analytics/')
+        self.assertEqual(response['X-Analytics-Cache'], 'miss')
+        self.assertEqual(response.data['summary']['total_sales'], 1)
+
+    def test_different_ranges_are_cached_separately(self):
+        self.client.get('/api/sales/analytics/', {'days': 7})
+        response = self.client.get('/api/sales/analytics/', {'days': 30})
+        self.assertEqual(response['X-Analytics-Cache'], 'miss')
+
+
+class BatchIngestTests(SalesFixtureMixin, TestCase):
+    def entry(self, key, quantity=1, variant=None):
+        return {
+            'idempotency_key': key,
+            'payment_mode': 'UPI',
+            'items': [{'variant': (variant or self.variants[0]).id, 'quantity': quantity, 'unit_price': '500.00'}],
+        }
+
+    def upload(self, entries):
+        response = self.client.post('/api/sales/batch/', {'sales': entries}, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.data['results']
+
+    def test_batch_creates_sales_and_deducts_stock(self):
+        results = self.upload([self.entry(f'T1-{n}') for n in range(5)])
+        self.assertEqual([r['status'] for r in results], ['created'] * 5)
+        self.assertEqual(Sale.objects.count(), 5)
+        self.variants[0].refresh_from_db()
+        self.assertEqual(self.variants[0].stock_quantity, 995)
+
+    def test_resend_is_a_cheap_no_op(self):
+        entries = [self.entry(f'T1-{n}') for n in range(20)]
+        first = self.upload(entries)
+        with self.assertNumQueries(1):
+            again = self.upload(entries)
+        self.assertEqual([r['status'] for r in again], ['duplicate'] * 20)
+        self.assertEqual([r['invoice_number'] for r in again], [r['invoice_number'] for r in first])
+        self.variants[0].refresh_from_db()
+        self.assertEqual(self.variants[0].stock_quantity, 980)
+
+    def test_one_bad_sale_does_not_reject_the_rest(self):
+        ProductVariant.objects.filter(pk=self.variants[1].pk).update(stock_quantity=0)
+        results = self.upload([
+            self.entry('A'),
+            self.entry('B', variant=self.variants[1]),
+            {'idempotency_key': 'C', 'items': 'nope'},
+            self.entry('D'),
+            self.entry('A'),
+            {'payment_mode': 'CASH', 'items': []},
+            {'idempotency_key': 'E', 'payment_mode': 'CASH', 'items': []},
+        ])
+        self.assertEqual([r['status'] for r in results], ['created', 'error', 'error', 'created', 'error', 'error', 'error'])
+        self.assertIn('short_lines', results[1]['errors'])
+        self.assertEqual(Sale.objects.count(), 2)
+        self.assertEqual(IdempotencyKey.objects.count(), 2)
+
+    def test_unusable_keys_are_refused_before_the_database(self):
+        with self.assertNumQueries(0):
+            results = self.upload([self.entry('K' * 65), self.entry(['T1-1']), self.entry(7)])
+        self.assertEqual([r['status'] for r in results], ['error'] * 3)
+        self.assertEqual(results[0]['errors'], {'idempotency_key': ['Ensure this field has no more than 64 characters.']})
+        self.assertEqual(results[1]['errors'], {'idempotency_key': ['Expected a string.']})
+        self.assertEqual(self.upload([self.entry('K' * 64)])[0]['status'], 'created')
+        self.assertFalse(Sale.objects.exclude(idempotency_key__key='K' * 64).exists())
+
+    def test_rejects_malformed_body(self):
+        response = self.client.post('/api/sales/batch/', {'sales': 'x'}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class SequenceTests(TestCase):
+    def test_financial_year(self):
+        self.assertEqual(sequences.financial_year(date(2026, 4, 1)), '2627')
+        self.assertEqual(sequences.financial_year(date(2027, 3, 31)), '2627')
+        self.assertEqual(sequences.financial_year(date(2099, 12, 1)), '9900')
+
+    def test_invoice_numbers_are_consecutive(self):
+        fy = sequences.financial_year()
+        numbers = [Sale.objects.create().invoice_number for _ in range(3)]
+        self.assertEqual(numbers, [f'INV-{fy}-00001', f'INV-{fy}-00002', f'INV-{fy}-00003'])
+        self.assertEqual(Return.objects.create(original_sale=Sale.objects.first()).return_number, f'RET-{fy}-00001')
+
+    def test_rolled_back_sale_gives_its_number_back(self):
+        Sale.objects.create()
+        try:
+            with transaction.atomic():
+                Sale.objects.create()
+                raise RuntimeError
+        except RuntimeError:
+            pass
+        self.assertTrue(Sale.objects.create().invoice_number.endswith('-00002'))
+
+    @override_settings(STORE_CODE='S1')
+    def test_store_prefix(self):
+        self.assertTrue(Sale.objects.create().invoice_number.startswith('S1INV-'))
+
+
+@override_settings(INVOICE_NUMBER_BLOCK_SIZE=10)
+class SequenceBlockTests(TransactionTestCase):
+    def tearDown(self):
+        sequences._blocks.clear()
+
+    def test_block_is_reserved_once_per_worker(self):
+        sequences.reserve('INV')
+        counter = DocumentSequence.objects.get(kind='INV')
+        self.assertEqual(counter.next_value, 11)
+
+        numbers = [Sale.objects.create().invoice_number[-5:] for _ in range(10)]
+        self.assertEqual(numbers, [f'{n:05d}' for n in range(1, 11)])
+        counter.refresh_from_db()
+        self.assertEqual(counter.next_value, 11)
+
+        # Block used up: the next sale falls back to the counter
+        self.assertTrue(Sale.objects.create().invoice_number.endswith('-00011'))
+
+
+class ExportTests(SalesFixtureMixin, TestCase):
+    def read(self, response):
+        body = b''.join(response.streaming_content)
+        if response['Content-Type'] == 'application/gzip':
+            body = gzip.decompress(body)
+        return list(csv.DictReader(io.StringIO(body.decode())))
+
+    def test_sales_csv(self):
+        sale = self.make_sale(lines=2, payment_mode='UPI')
+        response = self.client.get('/api/exports/sales.csv')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        rows = self.read(response)
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[0]['invoice_number'], sale.invoice_number)
+        self.assertEqual(rows[0]['payment_mode'], 'UPI')
+        self.assertEqual(rows[0]['product'], 'Kurti 0')
+        self.assertEqual((rows[0]['taxable_value'], rows[0]['gst_rate']), ('500.00', '5.00'))
+        self.assertEqual((rows[0]['gst_amount'], rows[0]['line_total']), ('25.00', '525.00'))
+
+    def test_returns_csv_gzip(self):
+        sale = self.make_sale(lines=1)
+        return_order = self.make_return(sale)
+        response = self.client.get('/api/exports/returns.csv', {'gzip': '1'})
+        self.assertIn('.csv.gz', response['Content-Disposition'])
+        rows = self.read(response)
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]['return_number'], return_order.return_number)
+        self.assertEqual(rows[0]['original_invoice'], sale.invoice_number)
+
+    def test_range_filter(self):
+        self.make_sale()
+        tomorrow = timezone.localdate() + timedelta(days=1)
+        response = self.client.get('/api/exports/sales.csv', {'start': tomorrow, 'end': tomorrow})
+        self.assertEqual(self.read(response), [])
+
+    def test_bad_range_is_400(self):
+        response = self.client.get('/api/exports/sales.csv', {'start': '17/10/2026', 'end': '2026-10-18'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'start': ["Expected a date as YYYY-MM-DD."]})
+        response = self.client.get('/api/exports/returns.csv', {'start': '2026-10-18', 'end': '2026-10-01'})
+        self.assertEqual(response.json(), {'end': ["The range ends before it starts."]})
+
+    def test_half_open_range_is_400(self):
+        response = self.client.get('/api/exports/sales.csv', {'start': '2026-10-01'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'end': ["Give both start and end, or neither."]})
+
+    def test_header_comes_before_the_query(self):
+        self.make_sale()
+        response = self.client.get('/api/exports/sales.csv', HTTP_ACCEPT='text/csv')
+        with self.assertNumQueries(0):
+            header = next(iter(response.streaming_content))
+        self.assertTrue(header.startswith(b'invoice_number,invoice_date'))
+
+
+class GstReportTests(SalesFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.variants[1].gst_rate = Decimal('12.00')
+        self.variants[1].save()
+
+    def backdate(self, days):
+        moment = timezone.now() - timedelta(days=days)
+        Sale.objects.update(created_at=moment)
+        Return.objects.update(created_at=moment)
+        rollups.rebuild()
+        return timezone.localdate(moment)
+
+    def test_rate_wise_totals_net_of_returns(self):
+        self.make_sale(lines=2)
+        self.make_return(self.make_sale(lines=1))
+        rollups.rebuild()
+
+        data = self.client.get('/api/reports/gst/').data
+        rates = {row['gst_rate']: row for row in data['rates']}
+        self.assertEqual(set(rates), {Decimal('5.00'), Decimal('12.00')})
+        five = rates[Decimal('5.00')]
+        self.assertEqual((five['taxable_value'], five['tax'], five['invoices']), (Decimal('1000.00'), Decimal('50.00'), 2))
+        self.assertEqual((five['returned_tax'], five['returns']), (Decimal('25.00'), 1))
+        self.assertEqual((five['net_taxable_value'], five['net_tax']), (Decimal('500.00'), Decimal('25.00')))
+        self.assertEqual(rates[Decimal('12.00')]['tax'], Decimal('60.00'))
+
+        totals = data['totals']
+        # One invoice carries both rates but counts once
+        self.assertEqual((totals['invoices'], totals['returns']), (2, 1))
+        self.assertEqual(totals['net_tax'], Decimal('85.00'))
+        self.assertEqual(len(data['days']), 1)
+
+    def test_returned_tax_matches_the_credit_note(self):
+        # 5% of 10.10 is 0.505 a line: the refund rounds each line up to 0.51
+        ProductVariant.objects.filter(gst_rate=Decimal('5.00')).update(price_retail=Decimal('10.10'))
+        sale = self.checkout(self.variants[::2], quantity=1)
+        self.assertEqual(self.process_return(sale, items=sale.items.all()).refund_gst, Decimal('1.02'))
+
+        five = self.client.get('/api/reports/gst/').data['rates'][0]
+        self.assertEqual((five['tax'], five['returned_tax'], five['net_tax']),
+                         (Decimal('1.02'), Decimal('1.02'), Decimal('0.00')))
+
+    def test_counts_and_values_share_a_source(self):
+        self.make_return(self.make_sale(lines=2))
+        # Rollups out of step with the lines do not change the report
+        DailySalesRollup.objects.all().delete()
+        DailyReturnRollup.objects.update(returns_count=5)
+        totals = self.client.get('/api/reports/gst/').data['totals']
+        self.assertEqual((totals['invoices'], totals['returns']), (1, 1))
+        self.assertEqual(totals['taxable_value'], Decimal('1000.00'))
+
+    def test_bad_or_partial_range_is_400(self):
+        response = self.client.get('/api/reports/gst/', {'start': '2026-13-01', 'end': '2026-10-18'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data, {'start': ["Expected a date as YYYY-MM-DD."]})
+        response = self.client.get('/api/reports/gst/', {'end': '2026-10-18', 'background': '1'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data, {'start': ["Give both start and end, or neither."]})
+
+    @override_settings(DATA_GENERATION_RECHECK=60)  # no generation read on the hit
+    def test_closed_days_come_from_cache(self):
+        self.make_sale(lines=2)
+        day = self.backdate(3)
+        params = {'start': day - timedelta(days=2), 'end': day + timedelta(days=1)}
+
+        first = self.client.get('/api/reports/gst/', params).data
+        self.assertEqual(first['cache'], {'days': 4, 'from_cache': 0})
+        with self.assertNumQueries(0):
+            second = self.client.get('/api/reports/gst/', params).data
+        self.assertEqual(second['cache'], {'days': 4, 'from_cache': 4})
+        self.assertEqual(second['totals'], first['totals'])
+
+        gst.invalidate()
+        self.assertEqual(self.client.get('/api/reports/gst/', params).data['cache']['from_cache'], 0)
+
+    def test_open_day_is_computed_live(self):
+        today = timezone.localdate()
+        params = {'start': today, 'end': today}
+        self.make_sale()
+        rollups.rebuild()
+        self.assertEqual(self.client.get('/api/reports/gst/', params).data['totals']['invoices'], 1)
+        self.make_sale()
+        rollups.rebuild()
+        data = self.client.get('/api/reports/gst/', params).data
+        self.assertEqual(data['totals']['invoices'], 2)
+        self.assertEqual(data['cache']['from_cache'], 0)
+
+
+class QueryPlanTests(TestCase):
+    """
+    Every query behind the hot endpoints must be served by an index: a plan
+    that reads a whole sales or catalog table fails the test, naming the
+    statement and its plan. Seeded with a year of trading so the planner
+    sees realistic table sizes and statistics.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        categories = [Category.objects.create(name=f'Category {i}') for i in range(5)]
+        products = Product.objects.bulk_create([
+            Product(category=categories[i % 5], name=f'Product {i}') for i in range(100)
+        ])
+        ProductVariant.objects.bulk_create([
+            ProductVariant(product=products[i % 100], size=f'S{i // 100}', color='Blue', barcode=f'PLAN{i:05d}',
+                           price_retail=Decimal('800.00'), gst_rate=Decimal('5.00'), stock_quantity=10 ** 6)
+            for i in range(1000)
+        ])
+        cls.variants = list(ProductVariant.objects.order_by('id'))
+        # The ledger opened a year back
+        StockSnapshot.objects.bulk_create([
+            StockSnapshot(variant=variant, date=timezone.localdate() - timedelta(days=365), quantity=10 ** 6)
+            for variant in cls.variants
+        ])
+
+        now = timezone.now()
+        Sale.objects.bulk_create([
+            Sale(invoice_number=f'PLAN-{n:05d}', customer_phone=f'98{n % 500:08d}',
+                 total_amount=Decimal('1680.00'), gst_total=Decimal('80.00'))
+            for n in range(3000)
+        ])
+        cls.sales = list(Sale.objects.order_by('id'))
+        for n, sale in enumerate(cls.sales):
+            sale.created_at = now - timedelta(hours=3 * n)
+        Sale.objects.bulk_update(cls.sales, ['created_at'], batch_size=500)
+        SaleItem.objects.bulk_create([
+            SaleItem(sale=sale, variant=cls.variants[(n * 7 + line) % 1000], quantity=1,
+                     unit_price=Decimal('800.00'), total_price=Decimal('800.00'), product_name='Product',
+                     gst_rate=Decimal('5.00'), tax_amount=Decimal('40.00'))
+            for n, sale in enumerate(cls.sales) for line in range(2)
+        ], batch_size=500)
+        # One sale in ten comes back, a day after it was made
+        returned = cls.sales[::10]
+        Return.objects.bulk_create([
+            Return(return_number=f'PLAN-R{n:05d}', original_sale=sale, refund_amount=Decimal('840.00'))
+            for n, sale in enumerate(returned)
+        ])
+        return_orders = list(Return.objects.order_by('id'))
+        for return_order, sale in zip(return_orders, returned):
+            return_order.created_at = sale.created_at + timedelta(days=1)
+        Return.objects.bulk_update(return_orders, ['created_at'], batch_size=500)
+        first_lines = dict(SaleItem.objects.filter(sale__in=returned).values_list('sale_id').annotate(Min('id')))
+        ReturnItem.objects.bulk_create([
+            ReturnItem(return_order=return_order, sale_item_id=first_lines[sale.id],
+                       quantity=1, refund_price=Decimal('800.00'), tax_amount=Decimal('40.00'))
+            for return_order, sale in zip(return_orders, returned)
+        ])
+        rollups.rebuild()
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def assertIndexed(self, request):
+        """Run `request` and check the plan of every statement it issued."""
+        with CaptureQueriesContext(connection) as ctx:
+            response = request()
+        self.assertLess(response.status_code, 300, getattr(response, 'data', None))
+        statements = [query['sql'] for query in ctx.captured_queries if query_plans.explainable(query['sql'])]
+        self.assertTrue(statements)
+        for sql in statements:
+            self.assertPlanIndexed(sql)
+        return response
+
+    def assertPlanIndexed(self, sql):
+        plan = query_plans.explain(str(sql))
+        self.assertEqual(query_plans.full_scans(plan), [], '\n'.join([str(sql), *plan]))
+
+    def test_barcode_scan(self):
+        self.assertIndexed(lambda: self.client.get(f'/api/variants/by-barcode/{self.variants[500].barcode}/'))
+
+    def test_checkout(self):
+        self.assertIndexed(lambda: self.client.post('/api/sales/', {
+            'payment_mode': 'UPI',
+            'items': [{'variant': variant.id, 'quantity': 1, 'unit_price': '0'} for variant in self.variants[10:13]],
+        }, format='json'))
+
+    def test_sales_list(self):
+        first = self.assertIndexed(lambda: self.client.get('/api/sales/'))
+        self.assertIndexed(lambda: self.client.get(first.data['next']))
+        self.assertIndexed(lambda: self.client.get('/api/returns/'))
+
+    def test_analytics(self):
+        self.assertIndexed(lambda: self.client.get('/api/sales/analytics/', {'days': 30}))
+        self.assertIndexed(lambda: self.client.get('/api/reports/gst/', {'days': 30}))
+
+    def test_returns_lookup(self):
+        sale = self.sales[42]
+        response = self.assertIndexed(lambda: self.client.get('/api/sales/', {'invoice_number': sale.invoice_number}))
+        self.assertEqual([row['id'] for row in response.data['results']], [sale.id])
+        self.assertIndexed(lambda: self.client.get('/api/sales/', {'customer_phone': sale.customer_phone}))
+        self.assertIndexed(lambda: self.client.get(f'/api/sales/{sale.id}/'))
+        line = sale.items.first()
+        # The line on that invoice for a scanned item
+        self.assertPlanIndexed(SaleItem.objects.filter(sale=sale, variant_id=line.variant_id).query)
+        self.assertIndexed(lambda: self.client.post('/api/returns/', {
+            'original_sale': sale.id, 'reason': 'WRONG_SIZE',
+            'items': [{'sale_item': line.id, 'quantity': 1}],
+        }, format='json'))
+
+    def test_low_stock(self):
+        reorder.refresh()
+        response = self.assertIndexed(lambda: self.client.get('/api/inventory/low-stock/'))
+        self.assertEqual(response.data, [])
+
+    def test_stock_on_date(self):
+        ledger.take_snapshots()
+        day = timezone.localdate() - timedelta(days=30)
+        with CaptureQueriesContext(connection) as ctx:
+            ledger.stock_on(self.variants[7].pk, day)
+        self.assertPlanIndexed(ctx.captured_queries[0]['sql'])
+
+    def test_full_scan_is_reported(self):
+        plan = query_plans.explain(str(Sale.objects.filter(gst_total__gt=0).query))
+        self.assertEqual(query_plans.full_scans(plan), ['sales_sale'])
+
+
+class SeedScaleTests(TestCase):
+    def test_seeds_a_consistent_store(self):
+        out = io.StringIO()
+        call_command('seed_scale', sales='120', variants=30, batch_size=50, seed=7, json=True, stdout=out)
+        result = json.loads(out.getvalue())
+        self.assertEqual((result['sales'], result['variants']), (120, 30))
+        self.assertEqual(Sale.objects.count(), 120)
+        self.assertEqual(ReturnItem.objects.count(), result['returns'])
+        self.assertEqual(DailySalesRollup.objects.aggregate(n=Sum('sales_count'))['n'], 120)
+        # Headers agree with their snapshotted lines
+        sale = Sale.objects.order_by('?').first()
+        lines = sale.items.aggregate(value=Sum('total_price'), tax=Sum('tax_amount'))
+        self.assertEqual(sale.gst_total, lines['tax'])
+        self.assertEqual(sale.total_amount, lines['value'] + lines['tax'])
+        self.assertTrue(SaleItem.objects.exclude(product_name='').exists())
+        self.assertEqual(ledger.reconcile(), [])
+
+    def test_named_scales(self):
+        self.assertEqual(seeding.parse_scale('100K'), 100_000)
+        self.assertEqual(seeding.parse_scale('2500'), 2500)
+        with self.assertRaises(ValueError):
+            seeding.parse_scale('lots')
+
+
+class InstrumentationTests(SalesFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        instrumentation.registry.reset()
+
+    def timings(self, response):
+        return dict(part.split(';', 1) for part in response['Server-Timing'].split(', '))
+
+    def test_server_timing_header(self):
+        self.make_sale()
+        response = self.client.get('/api/sales/')
+        timings = self.timings(response)
+        self.assertEqual(set(timings), {'db', 'serialize', 'render', 'view', 'total'})
+        self.assertTrue(timings['db'].startswith('desc="2 queries";dur='))
+
+    def test_metrics_by_route(self):
+        self.client.get('/api/sales/')
+        self.client.get('/api/sales/')
+        self.client.get('/api/variants/by-barcode/KRT001/')
+        self.client.get('/no/such/page/')
+
+        response = self.client.get('/api/metrics')
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        body = response.content.decode()
+        self.assertIn('http_request_duration_seconds_count{route="sales-list",method="GET"} 2', body)
+        self.assertIn('http_request_duration_seconds_bucket{route="sales-list",method="GET",le="+Inf"} 2', body)
+        self.assertIn('http_request_db_queries_total{route="sales-list",method="GET"} 2', body)
+        self.assertIn('route="variants-by-barcode"', body)
+        self.assertIn('http_responses_total{route="unmatched",method="GET",status="404"} 1', body)
+
+    @override_settings(REQUEST_METRICS=False)
+    def test_can_be_switched_off(self):
+        self.assertNotIn('Server-Timing', self.client.get('/api/sales/'))
+
+    async def test_async_requests_stay_async(self):
+        async def view(request):
+            pass
+        self.assertTrue(iscoroutinefunction(instrumentation.RequestMetricsMiddleware(view)))
+        response = await self.async_client.get('/api/async/variants/by-barcode/NOPE/')
+        self.assertEqual(response.status_code, 404)
+        self.assertTrue(self.timings(response)['db'].startswith('desc="1 queries";dur='))
+        self.assertIn('view', self.timings(response))
+
+
+class AsyncAnalyticsTests(SalesFixtureMixin, TransactionTestCase):
+    """The async view's parts run on worker threads, which only see committed rows."""
+
+    def test_payload_matches_sync_view(self):
+        self.checkout(payment_mode='UPI')
+        self.make_return(self.make_sale(lines=1))
+        expected = json.loads(self.client.get('/api/sales/analytics/', {'days': 7}).content)
+        cache.clear()
+        response = self.client.get('/api/async/sales/analytics/', {'days': 7})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Analytics-Cache'], 'miss')
+        self.assertEqual(response.json(), expected)
+        self.assertEqual(len(response.json()['recent_sales']), 2)
+
+    @override_settings(DATA_GENERATION_RECHECK=60)  # no generation read on the hit
+    def test_shares_cache_with_sync_view(self):
+        self.client.get('/api/sales/analytics/')
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/async/sales/analytics/')
+        self.assertEqual(response['X-Analytics-Cache'], 'hit')
+
+    def test_bad_range_is_400(self):
+        self.assertEqual(self.client.get('/api/async/sales/analytics/', {'days': 'week'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/async/sales/analytics/', {'granularity': 'hour'}).status_code, 400)
+
+    def test_parts_run_at_once(self):
+        # Each call waits for the other: run one after another, the first would time out
+        barrier = threading.Barrier(2, timeout=5)
+        results = async_to_sync(concurrency.parallel)(barrier.wait, barrier.wait)
+        self.assertEqual(sorted(results), [0, 1])
+
+    def test_worker_queries_are_timed(self):
+        instrumentation.registry.reset()
+        sync_timing = self.client.get('/api/sales/analytics/')['Server-Timing']
+        cache.clear()
+        async_timing = self.client.get('/api/async/sales/analytics/')['Server-Timing']
+        db = dict(part.split(';', 1) for part in sync_timing.split(', '))['db']
+        self.assertIn(db.split(';')[0], async_timing)
+        self.assertIn('route="async-sales-analytics"', self.client.get('/api/metrics').content.decode())
+
+
+class QueryInspectorTests(SalesFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        for _ in range(6):
+            self.make_return(self.make_sale())
+
+    def test_fingerprint(self):
+        self.assertEqual(
+            query_inspector.fingerprint('SELECT * FROM t WHERE id IN (%s, %s) AND name = \'x\' LIMIT 21'),
+            'SELECT * FROM t WHERE id IN (...) AND name = ? LIMIT ?',
+        )
+
+    def test_flags_per_row_queries_with_their_origin(self):
+        with self.assertRaises(query_inspector.QueryPatternError) as raised:
+            with query_inspector.inspect(raise_errors=True):
+                for item in ReturnItem.objects.all():
+                    item.sale_item.sale.invoice_number
+        self.assertIn('18 x SELECT', str(raised.exception))  # 6 returns of 3 lines
+        self.assertIn('sales/tests.py', str(raised.exception))
+
+    def test_names_the_serializer_field(self):
+        from .serializers import ReturnItemSerializer
+        with self.assertRaises(query_inspector.QueryPatternError) as raised:
+            with query_inspector.inspect(raise_errors=True):
+                ReturnItemSerializer(ReturnItem.objects.all(), many=True).data
+        self.assertIn('ReturnItemSerializer.product_name', str(raised.exception))
+
+    def test_middleware_is_off_by_default(self):
+        from django.core.exceptions import MiddlewareNotUsed
+        with self.assertRaises(MiddlewareNotUsed):
+            query_inspector.QueryInspectorMiddleware(lambda request: None)
+
+    @override_settings(QUERY_INSPECTOR_ENABLED=True, QUERY_INSPECTOR_SLOW_MS=0)
+    async def test_middleware_inspects_async_views(self):
+        with self.assertLogs('backend_proj.queries', 'WARNING') as logs:
+            await self.async_client.get('/api/async/variants/by-barcode/NOPE/')
+        self.assertIn('slow query', logs.output[0])
+
+    def test_flags_slow_queries(self):
+        with self.assertLogs('backend_proj.queries', 'WARNING') as logs:
+            with query_inspector.inspect(slow_ms=0):
+                Sale.objects.count()
+        self.assertIn('slow query', logs.output[0])
+
+    @override_settings(QUERY_INSPECTOR_ENABLED=True, QUERY_INSPECTOR_RAISE=True)
+    def test_endpoints_issue_no_per_row_queries(self):
+        from django.contrib.auth.models import User
+        client = APIClient()
+        client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'x'))
+        sale = Sale.objects.first()
+        for url in [
+            '/api/categories/', '/api/products/', '/api/variants/', '/api/variants/search/?q=kurti',
+            '/api/sales/', '/api/returns/', f'/api/sales/{sale.id}/', '/api/sales/analytics/',
+            '/api/reports/gst/', '/api/catalog/sync/', '/api/exports/sales.csv', '/api/exports/returns.csv',
+            '/api/inventory/low-stock/', '/api/jobs/',
+            '/admin/inventory/product/', '/admin/inventory/productvariant/', '/admin/inventory/category/',
+            '/admin/inventory/inventorymovement/', '/admin/jobs/job/',
+            '/admin/sales/sale/', f'/admin/sales/sale/{sale.id}/change/', '/admin/sales/return/',
+            f'/admin/sales/return/{Return.objects.first().id}/change/',
+            f'/admin/inventory/product/{self.variants[0].product_id}/change/',
+        ]:
+            with self.subTest(url=url):
+                response = client.get(url)
+                self.assertEqual(response.status_code, 200)
+                if response.streaming:
+                    b''.join(response.streaming_content)
+
+
+class PurgeTests(SalesFixtureMixin, TestCase):
+    def backdate(self, obj, days):
+        type(obj).objects.filter(pk=obj.pk).update(created_at=timezone.now() - timedelta(days=days))
+
+    def test_reset_order_covers_every_reference(self):
+        # Each table must be emptied before any table it references
+        order = list(purge.RESET_ORDER)
+        for model in order:
+            for relation in model._meta.related_objects:
+                with self.subTest(model=model.__name__, referenced_by=relation.related_model.__name__):
+                    self.assertIn(relation.related_model, order)
+                    self.assertLess(order.index(relation.related_model), order.index(model))
+
+    def test_reset_deletes_without_loading_rows(self):
+        self.process_return(self.checkout())
+        IdempotencyKey.objects.create(key='till-1', sale=self.checkout())
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post('/api/reset-database/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['tables']['sales_sale'], 2)
+        self.assertEqual(response.data['tables']['inventory_productvariant'], 3)
+        self.assertGreater(response.data['tables']['inventory_inventorymovement'], 0)
+        # No per-row reads of what is being deleted, as the deletion collector would do
+        self.assertFalse([q['sql'] for q in ctx.captured_queries
+                          if q['sql'].startswith('SELECT') and 'sales_sale' in q['sql']])
+
+        for model in purge.RESET_ORDER:
+            if model is not CatalogTombstone:
+                self.assertFalse(model.objects.exists(), model.__name__)
+        self.assertEqual(DocumentSequence.objects.get(kind='INV').next_value, 3)
+        self.assertEqual(self.client.get('/api/sales/analytics/').data['summary']['total_sales'], 0)
+        self.assertEqual(search.search('kurti'), [])
+        self.assertEqual(self.client.get('/api/variants/by-barcode/KRT000/').status_code, 404)
+
+    def test_purge_keeps_recent_and_recently_returned_sales(self):
+        old = [self.checkout() for _ in range(3)]
+        IdempotencyKey.objects.create(key='till-1', sale=old[0])
+        self.process_return(old[1])
+        for sale in old:
+            self.backdate(sale, 400)
+        self.backdate(old[1].returns.get(), 399)
+        returned_late = self.checkout()
+        self.backdate(returned_late, 400)
+        self.process_return(returned_late)
+        recent = self.checkout()
+        rollups = list(DailySalesRollup.objects.values_list('date', 'sales_count'))
+
+        batches = []
+        report = purge.purge_sales(timezone.localdate() - timedelta(days=365), batch_size=2, progress=batches.append)
+        self.assertEqual(batches, [2, 3])
+        self.assertEqual(report['tables']['sales_sale'], 3)
+        self.assertEqual((report['tables']['sales_return'], report['tables']['sales_returnitem']), (1, 1))
+        self.assertEqual(report['tables']['sales_idempotencykey'], 1)
+        self.assertEqual(set(Sale.objects.values_list('id', flat=True)), {returned_late.id, recent.id})
+        self.assertEqual(Return.objects.get().original_sale_id, returned_late.id)
+        self.assertEqual(list(DailySalesRollup.objects.values_list('date', 'sales_count')), rollups)
+
+    def test_purge_command(self):
+        sale = self.checkout()
+        self.backdate(sale, 10)
+        out = io.StringIO()
+        call_command('purge_sales', before=str(timezone.localdate() - timedelta(days=5)), stdout=out)
+        self.assertIn('sales_sale: 1', out.getvalue())
+        self.assertFalse(Sale.objects.exists())
+        with self.assertRaises(CommandError):
+            call_command('purge_sales', before='last year')
+        with self.assertRaises(CommandError):
+            call_command('purge_sales', before=str(timezone.localdate() + timedelta(days=1)))
+
+    def test_gst_report_refuses_purged_days(self):
+        today = timezone.localdate()
+        self.backdate(self.checkout(), 10)
+        self.backdate(self.checkout(), 3)
+        recent = {'start': today - timedelta(days=4), 'end': today - timedelta(days=2)}
+        self.client.get('/api/reports/gst/', recent)
+
+        purge.purge_sales(today - timedelta(days=5))
+        # Days after the cutoff are untouched, so their cached figures stand
+        response = self.client.get('/api/reports/gst/', recent)
+        self.assertEqual(response.data['cache'], {'days': 3, 'from_cache': 3})
+        self.assertEqual(response.data['totals']['invoices'], 1)
+
+        for params in ({'start': today - timedelta(days=12), 'end': today}, {'days': 30, 'background': 1}):
+            with self.subTest(params=params):
+                response = self.client.get('/api/reports/gst/', params)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn(str(today - timedelta(days=5)), response.data['start'][0])
+        cache.clear()
+        with self.assertRaises(gst.PurgedRange):
+            gst.report(today - timedelta(days=6), today)
@@ -1,17 +1,69 @@
-from rest_framework import viewsets
-from rest_framework.decorators import action
+from rest_framework import viewsets, status
+from rest_framework.decorators import action, api_view, renderer_classes
+from rest_framework.exceptions import ValidationError
+from rest_framework.renderers import BaseRenderer
 from rest_framework.response import Response
-from django.db.models import Sum, Count, F, Q
+from rest_framework.utils.encoders import JSONEncoder
+from django.db.models import Prefetch
+from django.conf import settings
+from django.http import JsonResponse, StreamingHttpResponse
 from django.utils import timezone
-from datetime import timedelta
-from .models import Sale, SaleItem, Return
+from django.utils.dateparse import parse_date
+from django.views.decorators.http import require_GET
+from jobs.queue import enqueue
+from jobs.views import accepted, background_requested
+from .models import Sale, SaleItem, Return, ReturnItem
 from .serializers import SaleSerializer, ReturnSerializer
+from .ingest import ingest
+from . import dashboard, exports, gst
+from .analytics import GRANULARITIES, acached, cache_stats, cached as analytics_cache, parse_range
+
+# Everything SaleItemSerializer / ReturnItemSerializer read per line, fetched
+# up front so serializing a page of invoices costs a fixed number of queries.
+SALE_ITEMS_PREFETCH = Prefetch(
+    'items',
+    queryset=SaleItem.objects.select_related('variant'),
+)
+RETURN_ITEMS_PREFETCH = Prefetch(
+    'items',
+    queryset=ReturnItem.objects.select_related('sale_item'),
+)
 
 class SaleViewSet(viewsets.ModelViewSet):
-    queryset = Sale.objects.all().order_by('-created_at')
+    queryset = Sale.objects.prefetch_related(SALE_ITEMS_PREFETCH).order_by('-created_at')
     serializer_class = SaleSerializer
     http_method_names = ['get', 'post', 'head']
 
+    def get_queryset(self):
+        """Returns desk lookups: ?invoice_number= (exact) or ?customer_phone= (their invoices)."""
+        queryset = super().get_queryset()
+        if self.action == 'list':
+            for field in ('invoice_number', 'customer_phone'):
+                value = self.request.query_params.get(field, '').strip()
+                if value:
+                    queryset = queryset.filter(**{field: value})
+        return queryset
+
+    @action(detail=False, methods=['post'])
+    def batch(self, request):
+        """
+        Upload sales queued by an offline terminal:
+        {"sales": [{"idempotency_key": "...", <sale payload>}, ...]}
+        Returns one result per sale: created, duplicate (already uploaded) or error.
+        """
+        entries = request.data.get('sales') if isinstance(request.data, dict) else None
+        max_size = getattr(settings, 'SALE_BATCH_MAX_SIZE', 500)
+        if not isinstance(entries, list) or not all(isinstance(entry, dict) for entry in entries):
+            return Response({"detail": "Expected {\"sales\": [...]}"}, status=status.HTTP_400_BAD_REQUEST)
+        if len(entries) > max_size:
+            return Response(
+                {"detail": f"At most {max_size} sales per batch."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        results = ingest(entries, context=self.get_serializer_context())
+        return Response({'results': results})
+
     @action(detail=False, methods=['get'])
     def analytics(self, request):
         """
@@ -20,168 +72,181 @@ class SaleViewSet(viewsets.ModelViewSet):
         - Total returns
         - Top-selling products
         - Payment mode breakdown
+        - Revenue series over the range (?granularity=day|week|month)
         """
-        # Date filtering logic
-        start_date_str = request.query_params.get('start_date')
-        end_date_str = request.query_params.get('end_date')
-        days = int(request.query_params.get('days', 30))
+        try:
+            key, window = _analytics_request(request.query_params)
+        except ValueError as exc:
+            return Response({"detail": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
 
-        if start_date_str and end_date_str:
-            try:
-                from django.utils.dateparse import parse_datetime
-                start_date = parse_datetime(start_date_str)
-                end_date = parse_datetime(end_date_str)
-            except:
-                end_date = timezone.now()
-                start_date = end_date - timedelta(days=days)
-        else:
-            end_date = timezone.now()
-            start_date = end_date - timedelta(days=days)
-
-        # Ensure we cover the full day for the range
-        if end_date:
-            end_date = end_date.replace(hour=23, minute=59, second=59)
-        if start_date:
-            start_date = start_date.replace(hour=0, minute=0, second=0)
-
-        # Filter sales within date range
-        sales = Sale.objects.filter(created_at__gte=start_date, created_at__lte=end_date)
-        
-        # Sales Summary
-        sales_summary = sales.aggregate(
-            total_revenue=Sum('total_amount'),
-            total_sales_count=Count('id'),
-            total_gst=Sum('gst_total'),
-            total_items=Sum('items__quantity')
-        )
-        
-        # Returns Summary - subtract from revenue
-        returns = Return.objects.filter(created_at__gte=start_date, created_at__lte=end_date)
-        returns_summary = returns.aggregate(
-            total_refund_amount=Sum('refund_amount'),
-            total_returns_count=Count('id'),
-            refund_gst=Sum('refund_gst'),
-            total_items_returned=Sum('items__quantity')
-        )
-        
-        # Net Totals
-        gross_revenue = float(sales_summary['total_revenue'] or 0)
-        total_refunds = float(returns_summary['total_refund_amount'] or 0)
-        net_revenue = gross_revenue - total_refunds
-        
-        total_items_sold = (sales_summary['total_items'] or 0) - (returns_summary['total_items_returned'] or 0)
-        net_gst = float(sales_summary['total_gst'] or 0) - float(returns_summary['refund_gst'] or 0)
-        
-        # Calculate average sale amount
-        avg_sale = gross_revenue / sales_summary['total_sales_count'] if sales_summary['total_sales_count'] > 0 else 0
-        
-        # Payment Mode Breakdown
-        payment_breakdown = sales.values('payment_mode').annotate(
-            count=Count('id'),
-            total=Sum('total_amount')
-        ).order_by('-total')
-        
-        # Top Selling Products
-        top_products = SaleItem.objects.filter(
-            sale__created_at__gte=start_date,
-            sale__created_at__lte=end_date
-        ).values(
-            product_name=F('variant__product__name'),
-            variant_size=F('variant__size'),
-            variant_color=F('variant__color')
-        ).annotate(
-            total_quantity=Sum('quantity'),
-            total_revenue=Sum('total_price')
-        ).order_by('-total_quantity')[:10]
-        
-        # Recent Sales (last 10)
-        recent_sales_qs = Sale.objects.filter(
-            created_at__gte=start_date,
-            created_at__lte=end_date
-        ).order_by('-created_at')[:10]
-        recent_sales = SaleSerializer(recent_sales_qs, many=True).data
-        
-        # Recent Returns (last 5)
-        recent_returns = Return.objects.filter(
-            created_at__gte=start_date,
-            created_at__lte=end_date
-        ).order_by('-created_at')[:5].values(
-            'id', 'return_number', 'original_sale__invoice_number',
-            'refund_amount', 'reason', 'created_at'
-        )
-        
-        # Monthly breakdown (Calendar Months for last 6 months)
-        monthly_data = []
-        current_month_start = timezone.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        
-        for i in range(12):
-            # Calculate calendar month range
-            if i == 0:
-                target_month_start = current_month_start
-                month = current_month_start.month
-                year = current_month_start.year
-            else:
-                # Calculate correct year and month for previous months
-                year = current_month_start.year
-                month = current_month_start.month - i
-                while month < 1:
-                    month += 12
-                    year -= 1
-                target_month_start = current_month_start.replace(year=year, month=month, day=1)
-            
-            # End of target month
-            tmp_year = target_month_start.year
-            tmp_month = target_month_start.month
-            
-            if tmp_month == 12:
-                next_month_start = target_month_start.replace(year=tmp_year + 1, month=1, day=1)
-            else:
-                next_month_start = target_month_start.replace(month=tmp_month + 1, day=1)
-            target_month_end = next_month_start - timedelta(seconds=1)
-
-            month_sales = Sale.objects.filter(
-                created_at__gte=target_month_start,
-                created_at__lte=target_month_end
-            ).aggregate(revenue=Sum('total_amount'), count=Count('id'))
-            
-            month_returns = Return.objects.filter(
-                created_at__gte=target_month_start,
-                created_at__lte=target_month_end
-            ).aggregate(refunds=Sum('refund_amount'))
-            
-            monthly_data.append({
-                'month': target_month_start.strftime('%B %Y'),
-                'revenue': float(month_sales['revenue'] or 0),
-                'refunds': float(month_returns['refunds'] or 0),
-                'net': float(month_sales['revenue'] or 0) - float(month_returns['refunds'] or 0),
-                'count': month_sales['count']
-            })
-            if i == 11: break # Limit to 12 months
-        
-        return Response({
-            'summary': {
-                'gross_revenue': gross_revenue,
-                'total_revenue': gross_revenue, # Alias for consistency
-                'total_refunds': total_refunds,
-                'net_revenue': net_revenue,
-                'total_sales': sales_summary['total_sales_count'],
-                'total_items': total_items_sold,
-                'total_returns': returns_summary['total_returns_count'],
-                'total_gst': net_gst,
-                'average_sale': float(avg_sale),
-                'period_days': days,
-                'start_date': start_date,
-                'end_date': end_date
-            },
-            'payment_breakdown': list(payment_breakdown),
-            'top_products': list(top_products),
-            'recent_sales': list(recent_sales),
-            'recent_returns': list(recent_returns),
-            'monthly_data': monthly_data[::-1]
-        })
+        # Served from cache until a sale or return commits (or the day rolls
+        # over, which changes the trailing 12-month window)
+        payload, hit = analytics_cache(key, lambda: dashboard.build(window))
+        response = Response(payload)
+        response['X-Analytics-Cache'] = 'hit' if hit else 'miss'
+        return response
+
+    @action(detail=False, methods=['get'], url_path='analytics/cache')
+    def analytics_cache_stats(self, request):
+        """Hit/miss counters and current data version of the analytics cache."""
+        return Response(cache_stats())
+
+
+def _analytics_request(params):
+    """(cache key, dashboard window) for analytics query `params`; ValueError if they are invalid."""
+    try:
+        days = int(params.get('days', 30))
+    except ValueError:
+        raise ValueError("days must be a whole number.")
+    granularity = params.get('granularity', 'day')
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"granularity must be one of: {', '.join(GRANULARITIES)}")
+
+    # Whole local days, from start_date/end_date or the last `days` days
+    start_date, end_date = parse_range(params, default_days=days)
+    key = (start_date.isoformat(), end_date.isoformat(), days, granularity, timezone.localdate())
+    return key, dashboard.window(start_date, end_date, days, granularity)
+
+
+@require_GET
+async def analytics_async(request):
+    """
+    /api/sales/analytics/ for ASGI deployments: the same parameters, cache
+    and payload, with the dashboard's independent queries run concurrently.
+    """
+    try:
+        key, window = _analytics_request(request.GET)
+    except ValueError as exc:
+        return JsonResponse({"detail": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+    payload, hit = await acached(key, lambda: dashboard.abuild(window))
+    response = JsonResponse(payload, encoder=JSONEncoder)
+    response['X-Analytics-Cache'] = 'hit' if hit else 'miss'
+    return response
 
 
 class ReturnViewSet(viewsets.ModelViewSet):
-    queryset = Return.objects.all().order_by('-created_at')
+    queryset = Return.objects.select_related('original_sale').prefetch_related(
+        RETURN_ITEMS_PREFETCH
+    ).order_by('-created_at')
     serializer_class = ReturnSerializer
     http_method_names = ['get', 'post', 'head']
+
+
+class PassthroughRenderer(BaseRenderer):
+    """Lets file downloads through content negotiation whatever the Accept header says."""
+    media_type = '*/*'
+    format = ''
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return data
+
+
+def _report_range(params):
+    """
+    The range of an export or GST report: ?start= and ?end= (ISO dates,
+    both or neither) or the last ?days= days. A date that does not parse or
+    a half-open range raises ValidationError rather than falling back to
+    `days`: a filing must cover the period asked for.
+    """
+    try:
+        days = int(params.get('days', 30))
+    except ValueError:
+        days = 30
+    bounds = {field: params.get(field) for field in ('start', 'end')}
+    if not any(bounds.values()):
+        return parse_range({}, default_days=days)
+    errors = {}
+    for field, value in bounds.items():
+        if not value:
+            errors[field] = ["Give both start and end, or neither."]
+            continue
+        try:
+            day = parse_date(value)
+        except ValueError:
+            day = None
+        if day is None:
+            errors[field] = ["Expected a date as YYYY-MM-DD."]
+    if errors:
+        raise ValidationError(errors)
+    start, end = parse_range({'start_date': bounds['start'], 'end_date': bounds['end']})
+    if start > end:
+        raise ValidationError({'end': ["The range ends before it starts."]})
+    return start, end
+
+
+def _export(request, name, rows):
+    """
+    Stream `rows` as CSV, or as a .csv.gz file with ?gzip=1. Range as in
+    _report_range; 400 for a bad one.
+    """
+    try:
+        start, end = _report_range(request.query_params)
+    except ValidationError as exc:
+        # Plain JSON: the passthrough renderer only lets file bodies through
+        return JsonResponse(exc.detail, status=status.HTTP_400_BAD_REQUEST)
+    filename = f"{name}-{start:%Y%m%d}-{end:%Y%m%d}.csv"
+    stream = exports.csv_stream(rows(start, end))
+    if request.query_params.get('gzip') in ('1', 'true', 'yes'):
+        response = StreamingHttpResponse(exports.gzip_stream(stream), content_type='application/gzip')
+        filename += '.gz'
+    else:
+        response = StreamingHttpResponse(stream, content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+@api_view(['GET'])
+@renderer_classes([PassthroughRenderer])
+def export_sales(request):
+    """Every invoice line in the range with invoice, payment mode, variant and GST."""
+    return _export(request, 'sales', exports.sale_rows)
+
+
+@api_view(['GET'])
+@renderer_classes([PassthroughRenderer])
+def export_returns(request):
+    """Every returned line in the range with the original invoice and GST."""
+    return _export(request, 'returns', exports.return_rows)
+
+
+@api_view(['GET'])
+def gst_report(request):
+    """
+    Rate-wise GST summary (taxable value, tax, invoice and return counts,
+    net of returns) per day and for the whole range. Range as in exports;
+    400 for a bad one or one that starts before the last retention purge's
+    cutoff. With ?background=1 the report is built by a job (202; see /api/jobs/).
+    """
+    try:
+        start, end = _report_range(request.query_params)
+    except ValidationError as exc:
+        return Response(exc.detail, status=status.HTTP_400_BAD_REQUEST)
+    start_day, end_day = timezone.localdate(start), timezone.localdate(end)
+    try:
+        gst.check_range(start_day)
+    except gst.PurgedRange as exc:
+        return Response({"start": [str(exc)]}, status=status.HTTP_400_BAD_REQUEST)
+    if background_requested(request):
+        return accepted(request, enqueue('sales.gst_report', start=start_day.isoformat(), end=end_day.isoformat()))
+    return Response(gst.report(start_day, end_day))
+
+
+@api_view(['POST'])
+def rebuild_rollups(request):
+    """
+    Queue a rebuild of the daily rollups, as `manage.py rebuild_rollups`:
+    {"start": "YYYY-MM-DD", "end": "YYYY-MM-DD"}, both optional. Always
+    runs as a job (202; see /api/jobs/).
+    """
+    bounds = {}
+    for field in ('start', 'end'):
+        value = request.data.get(field)
+        if value:
+            try:
+                day = parse_date(value)
+            except ValueError:
+                day = None
+            if day is None:
+                return Response({field: ["Expected a date as YYYY-MM-DD."]}, status=status.HTTP_400_BAD_REQUEST)
+            bounds[field] = day.isoformat()
+    return accepted(request, enqueue('sales.rebuild_rollups', **bounds))
@@ -18,22 +18,65 @@ api.interceptors.request.use((config) => {
     return config
 })
 
+// List endpoints are cursor paginated; follow `next` to collect every page
+const fetchAllPages = async (url, params = {}) => {
+    let response = await api.get(url, { params })
+    const results = [...(response.data.results || response.data)]
+    while (response.data.next) {
+        response = await api.get(response.data.next)
+        results.push(...response.data.results)
+    }
+    return { ...response, data: results }
+}
+
 // Inventory APIs
 export const fetchCategories = () => api.get('/categories/')
 export const createCategory = (data) => api.post('/categories/', data)
 export const resetDatabase = () => api.post('/reset-database/')
-export const fetchProducts = () => api.get('/products/')
+export const fetchProducts = () => fetchAllPages('/products/')
 export const fetchVariants = (search = '') =>
-    api.get('/variants/', { params: { search } })
+    search ? api.get('/variants/', { params: { search } }) : fetchAllPages('/variants/')
+// Ranked, typo-tolerant search over name, brand, category, size and colour
+export const searchVariants = (q, limit = 20) => api.get('/variants/search/', { params: { q, limit } })
+export const fetchVariantByBarcode = (code) =>
+    api.get(`/variants/by-barcode/${encodeURIComponent(code)}/`)
 export const createProduct = (data) => api.post('/products/', data)
 export const createVariant = (data) => api.post('/variants/', data)
 export const updateVariant = (id, data) => api.put(`/variants/${id}/`, data)
 export const deleteVariant = (id) => api.delete(`/variants/${id}/`)
+// Reorder list, least cover first; params { limit, threshold }
+export const fetchLowStock = (params = {}) => api.get('/inventory/low-stock/', { params })
+// Supplier sheet (.csv / .xlsx) upsert by barcode; resolves to { rows, created, updated, error_count, errors }
+export const importVariantSheet = (file, dryRun = false) => {
+    const form = new FormData()
+    form.append('file', file)
+    form.append('dry_run', dryRun ? 'true' : 'false')
+    return api.post('/variants/import/', form)
+}
+// Delta catalog sync: pass the token (and ETag) from the previous call; a 304 means nothing changed
+export const syncCatalog = (since, etag) =>
+    api.get('/catalog/sync/', {
+        params: since ? { since } : {},
+        headers: etag ? { 'If-None-Match': etag } : {},
+        validateStatus: (status) => status === 200 || status === 304,
+    })
 
 // Sales APIs
 export const createSale = (data) => api.post('/sales/', data)
 export const fetchSales = () => api.get('/sales/')
+// Offline queue upload: [{ idempotency_key, ...sale }] -> per-sale results
+export const uploadSalesBatch = (sales) => api.post('/sales/batch/', { sales })
+// Streaming CSV downloads for GST filing; kind is 'sales' or 'returns', params { start, end, gzip }
+export const exportUrl = (kind, params = {}) =>
+    `${API_BASE_URL}/exports/${kind}.csv?${new URLSearchParams(params)}`
 export const fetchSalesAnalytics = (params = { days: 30 }) => api.get('/sales/analytics/', { params })
+export const fetchGstReport = (params = { days: 30 }) => api.get('/reports/gst/', { params })
+
+// Background jobs: endpoints called with ?background=1 answer 202 with a job to poll
+export const fetchJob = (id) => api.get(`/jobs/${id}/`)
+// 200 with the result when done, 202 while queued/running, 409 with the error if it failed
+export const fetchJobResult = (id) =>
+    api.get(`/jobs/${id}/result/`, { validateStatus: (status) => [200, 202, 409].includes(status) })
 
 // Returns APIs
 export const fetchReturns = () => api.get('/returns/')
@@ -1,5 +1,5 @@
 import { useState, useEffect, useRef } from 'react'
-import { fetchVariants, createSale, fetchSalesAnalytics, fetchProducts } from '../api'
+import { fetchVariants, fetchVariantByBarcode, searchVariants, createSale, fetchSalesAnalytics, fetchProducts } from '../api'
 
 export default function PointOfSale() {
     const [cart, setCart] = useState([])
@@ -148,8 +148,15 @@ export default function PointOfSale() {
         }
 
         try {
-            const response = await fetchVariants(barcode)
-            const variant = response.data.results?.[0] || response.data[0]
+            let variant
+            try {
+                variant = (await fetchVariantByBarcode(barcode.trim())).data
+            } catch (lookupError) {
+                if (lookupError.response?.status !== 404) throw lookupError
+                // Not a barcode - take the best name search match
+                const response = await searchVariants(barcode.trim(), 1)
+                variant = response.data[0]
+            }
 
             if (variant) {
                 addToCart(variant)